@@ -26,6 +26,47 @@ class Settings:
     FIREBASE_MESSAGING_SENDER_ID: str = os.getenv("FIREBASE_MESSAGING_SENDER_ID")
     FIREBASE_APP_ID: str = os.getenv("FIREBASE_APP_ID")
 
+    # Semantic Search
+    AI_WARMUP_IN_BACKGROUND: bool = os.getenv("AI_WARMUP_IN_BACKGROUND", "true").lower() in ('true', '1', 't')
+    EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")  # or 'onnx-int8'
+    ONNX_MODEL_DIR: str = os.getenv("ONNX_MODEL_DIR", "instance/onnx/all-MiniLM-L6-v2")
+    ONNX_NUM_THREADS: int = int(os.getenv("ONNX_NUM_THREADS", 0)) or None
+    EMBEDDING_INDEX_DIR: str = os.getenv("EMBEDDING_INDEX_DIR", "instance/embedding_index")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+    EMBEDDING_BATCH_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+    SPECIALIST_CACHE_SIZE: int = int(os.getenv("SPECIALIST_CACHE_SIZE", 2048))
+    SPECIALIST_CACHE_TTL: int = int(os.getenv("SPECIALIST_CACHE_TTL", 3600))  # seconds
+    SPECIALIST_FALLBACK_CACHE_TTL: int = int(os.getenv("SPECIALIST_FALLBACK_CACHE_TTL", 30))  # seconds; keyword answers given because semantic search failed, 0 = don't cache
+    LOCATION_GRAPH_MAX_AGE: int = int(os.getenv("LOCATION_GRAPH_MAX_AGE", 300))  # seconds between checks for location changes made by other workers, 0 = only local changes
+    AVAILABILITY_WINDOW_DAYS: int = int(os.getenv("AVAILABILITY_WINDOW_DAYS", 7))  # "available soon" ranking window
+    VECTOR_SEARCH_BACKEND: str = os.getenv("VECTOR_SEARCH_BACKEND", "auto")  # 'auto', 'exact' or 'ivf'
+    VECTOR_SEARCH_IVF_NPROBE: int = int(os.getenv("VECTOR_SEARCH_IVF_NPROBE", 16))
+
+    # Live chat updates. Open chats poll the JSON endpoint; the Server-Sent Events stream holds a
+    # worker for up to MESSAGE_STREAM_MAX_SECONDS, so only enable it with a gevent or gthread worker.
+    MESSAGE_POLL_SECONDS: float = float(os.getenv("MESSAGE_POLL_SECONDS", 5))  # how often an open chat asks for new messages
+    MESSAGE_STREAM_ENABLED: bool = os.getenv("MESSAGE_STREAM_ENABLED", "false").lower() in ('true', '1', 't')
+    MESSAGE_STREAM_POLL_SECONDS: float = float(os.getenv("MESSAGE_STREAM_POLL_SECONDS", 2))  # how often an open stream checks for new messages
+    MESSAGE_STREAM_MAX_SECONDS: int = int(os.getenv("MESSAGE_STREAM_MAX_SECONDS", 30))  # streams then close and the browser reconnects
+
+    # Outbound Notifications (OTP emails / SMS are queued and sent by background workers)
+    NOTIFICATION_TRANSPORT: str = os.getenv("NOTIFICATION_TRANSPORT", "live")  # 'live' (SMTP + Twilio) or 'stand-in' (log only, for local testing)
+    NOTIFICATION_WORKERS: int = int(os.getenv("NOTIFICATION_WORKERS", 2))  # worker threads per process
+    NOTIFICATION_MAX_ATTEMPTS: int = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 5))
+    NOTIFICATION_RETRY_BASE_SECONDS: float = float(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", 5))  # doubles with each failed attempt
+    NOTIFICATION_LEASE_SECONDS: int = int(os.getenv("NOTIFICATION_LEASE_SECONDS", 120))  # a claimed job is retried if not finished by then
+    NOTIFICATION_SMTP_POOL_SIZE: int = int(os.getenv("NOTIFICATION_SMTP_POOL_SIZE", 2))  # idle SMTP connections kept open per process
+    NOTIFICATION_SMTP_CHECK_AFTER_SECONDS: float = float(os.getenv("NOTIFICATION_SMTP_CHECK_AFTER_SECONDS", 30))  # NOOP-probe connections idle longer than this
+    NOTIFICATION_SMTP_TIMEOUT_SECONDS: float = float(os.getenv("NOTIFICATION_SMTP_TIMEOUT_SECONDS", 30))
+    NOTIFICATION_TWILIO_TIMEOUT_SECONDS: float = float(os.getenv("NOTIFICATION_TWILIO_TIMEOUT_SECONDS", 30))
+    NOTIFICATION_STANDIN_LATENCY_MS: int = int(os.getenv("NOTIFICATION_STANDIN_LATENCY_MS", 0))
+    NOTIFICATION_STANDIN_FAILURE_RATE: float = float(os.getenv("NOTIFICATION_STANDIN_FAILURE_RATE", 0))
+
+    # Password Hashing
+    PASSWORD_HASH_METHOD: str = os.getenv("PASSWORD_HASH_METHOD", "scrypt")  # Werkzeug method and cost, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'; older hashes are upgraded at login
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))  # hashing threads per app process (about one core each); 0 hashes on the request thread
+
     # File Uploads
     UPLOAD_FOLDER: str = os.getenv("UPLOAD_FOLDER", "app/static/uploads")
     MAX_CONTENT_LENGTH: int = 2 * 1024 * 1024  # 2 MB
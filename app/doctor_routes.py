@@ -1,19 +1,21 @@
-import os
 import json
 import random
-from flask import render_template, request, session, redirect, url_for, flash, current_app, g
+from flask import render_template, request, session, redirect, url_for, flash, current_app, jsonify, Response, stream_with_context, abort
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature 
-from flask_mail import Message as MailMessage  # Alias to avoid name conflict with model
-from twilio.rest import Client
-from twilio.base import exceptions
 from datetime import date, datetime, timedelta
-import smtplib
 from firebase_admin import auth
 from markupsafe import Markup
-from app.extension import db, mail, doctor_login_required, doctor_verified_required, check_gmail_app_password
+from app.extension import db, doctor_login_required, doctor_verified_required, check_gmail_app_password, get_current_doctor, wants_json_response
 from app.models import Doctor, Review, Appointment, Message, Patient, Prescription 
-from werkzeug.utils import secure_filename
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app.services.slot_service import replace_doctor_slots, claim_appointment_slot, release_appointment_slot
+from app.services.availability_service import get_weekly_slots
+from app.services.conversation_service import doctor_conversations, message_page, message_payload, fetch_new_messages, conversation_events
+from app.services.unread_service import mark_conversation_read
+from app.services.notification_service import enqueue_email, enqueue_sms
+from app.services.image_service import store_image, InvalidImageError
 
 def setup_doctor_routes(app):
     @app.route('/doctor')
@@ -24,20 +26,12 @@ def setup_doctor_routes(app):
 
     @app.context_processor
     def inject_doctor_data():
-        # Use Flask's 'g' object to store the doctor object for the duration of the request
-        # to avoid multiple database queries.
-        if 'doctor_id' in session:
-            if 'doctor' not in g:
-                g.doctor = Doctor.query.get(session['doctor_id'])
-            
-            if g.doctor:
-                unread_count = Message.query.filter_by(
-                    doctor_id=session['doctor_id'],
-                    sender_type='patient',
-                    is_read=False
-                ).count()
-                return {'doctor_details': g.doctor, 'unread_doctor_messages': unread_count}
-                
+        # get_current_doctor() is cached for the request, so this reuses the row the
+        # decorators and the view already loaded.
+        doctor = get_current_doctor()
+        if doctor:
+            return {'doctor_details': doctor, 'unread_doctor_messages': doctor.unread_messages}
+
         return {'doctor_details': None, 'unread_doctor_messages': 0}
 
 
@@ -73,7 +67,7 @@ def setup_doctor_routes(app):
             flash("Please login first", "warning")
             return redirect(url_for("doctor_login"))
         # Fetch from DB to get the most up-to-date info, including verification status
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor()
         if not doctor:
             flash("Doctor profile not found. Please log in again.", "danger")
             return redirect(url_for("doctor_login"))
@@ -160,6 +154,7 @@ def setup_doctor_routes(app):
             # The check_password method correctly handles hashed passwords.
             # For backward compatibility with unhashed passwords from initial data load,
             if doctor and doctor.check_password(password):
+                db.session.commit() # Saves the password if it was rehashed
                 session['doctor_id'] = doctor.id
                 flash("Login successful!", "success")
                 return redirect(url_for("doctor_home_page"))
@@ -200,21 +195,11 @@ def setup_doctor_routes(app):
                     if not check_gmail_app_password():
                         return redirect(url_for('doctor_forgot_password'))
 
-                    # Send a real email
+                    # Queue the reset email; it is sent in the background (see notification_service)
                     reset_url = url_for('doctor_reset_with_token', token=token, _external=True)
-                    msg = MailMessage('Password Reset Request',
-                                  sender=app.config['MAIL_USERNAME'],
-                                  recipients=[doctor.email_id])
-                    msg.body = f'''To reset your password, visit the following link:{reset_url}
-                    If you did not make this request then simply ignore this email and no changes will be made.'''
-                    try:
-                        mail.send(msg)
-                        flash(f"A password reset link has been sent to {doctor.email_id}.", "info")
-                    except smtplib.SMTPAuthenticationError as e:
-                        error_msg = Markup("Email sending failed due to an authentication error. If using Gmail, please use a 16-character <strong>App Password</strong>. <a href='https://myaccount.google.com/apppasswords' target='_blank' class='alert-link'>Generate one here</a>.")
-                        flash(error_msg, "danger")
-                        current_app.logger.error(f"SMTPAuthenticationError: {e}. Check MAIL_USERNAME and MAIL_PASSWORD.")
-                        return redirect(url_for('doctor_forgot_password'))
+                    enqueue_email(doctor.email_id, 'Password Reset Request', f'''To reset your password, visit the following link:{reset_url}
+                    If you did not make this request then simply ignore this email and no changes will be made.''')
+                    flash(f"A password reset link has been sent to {doctor.email_id}.", "info")
 
                 else:
                     # Generate a random 6-digit OTP
@@ -236,21 +221,9 @@ def setup_doctor_routes(app):
                         return redirect(url_for('doctor_forgot_password'))
                     # --- END REFACTOR ---
 
-                    # Send the OTP via Twilio
-                    try:
-                        client = Client(app.config['TWILIO_ACCOUNT_SID'], app.config['TWILIO_AUTH_TOKEN'])
-                        message = client.messages.create(
-                            body=f"Your password reset OTP for CareConnect is: {otp}",
-                            from_=app.config['TWILIO_PHONE_NUMBER'],
-                            to=doctor.mobile_no # Ensure this includes the country code, e.g., +1234567890
-                        )
-                        flash(f"An OTP has been sent to your mobile number.", "info")
-                    except Exception as e:
-                        flash("Failed to send OTP. Please check your mobile number or try again later.", "danger")
-                        # More detailed logging for debugging
-                        print(f"Twilio Error: {e}")
-                        app.logger.error(f"Twilio failed to send SMS: {e}")
-                        return redirect(url_for('doctor_forgot_password'))
+                    # Queue the OTP SMS; it is sent in the background via Twilio (see notification_service)
+                    enqueue_sms(doctor.mobile_no, f"Your password reset OTP for CareConnect is: {otp}") # mobile_no must include the country code, e.g., +1234567890
+                    flash(f"An OTP has been sent to your mobile number.", "info")
 
                     return redirect(url_for('doctor_verify_otp'))
             else:
@@ -325,7 +298,7 @@ def setup_doctor_routes(app):
             flash("Please log in as doctor to continue.", "danger")
             return redirect(url_for("doctor_login"))
         doctor_id = session["doctor_id"]
-        doctor = Doctor.query.get(doctor_id)
+        doctor = get_current_doctor()
 
         if not doctor:
             flash("Doctor database record not found.", "danger")
@@ -347,111 +320,36 @@ def setup_doctor_routes(app):
         ).count()
 
         # Fetch only upcoming pending appointments, sorted by the soonest first.
-        pending_appointments = Appointment.query.filter(
+        pending_appointments = Appointment.query.options(joinedload(Appointment.patient)).filter(
             Appointment.doctor_id == doctor_id,
             Appointment.status == 'Pending',
             Appointment.appointment_date > now
         ).order_by(Appointment.appointment_date.asc()).all()
 
         # Fetch only upcoming confirmed appointments, sorted by the soonest first.
-        confirmed_appointments = Appointment.query.filter(
+        confirmed_appointments = Appointment.query.options(
+            joinedload(Appointment.patient), joinedload(Appointment.prescription)
+        ).filter(
             Appointment.doctor_id == doctor_id,
             Appointment.status == 'Confirmed',
             Appointment.appointment_date > now
         ).order_by(Appointment.appointment_date.asc()).all()
 
         # Fetch all completed appointments, sorted by the most recent first.
-        completed_appointments = Appointment.query.filter_by(doctor_id=doctor_id, status='Completed').order_by(Appointment.appointment_date.desc()).all()
+        completed_appointments = Appointment.query.options(
+            joinedload(Appointment.patient), joinedload(Appointment.prescription)
+        ).filter_by(doctor_id=doctor_id, status='Completed').order_by(Appointment.appointment_date.desc()).all()
         # --- End Refactor ---
 
         # --- Start: Logic to get recent conversations for dashboard ---
-        # Subquery to get the last message for each patient conversation
-        subq = db.session.query(
-            Message.patient_id,
-            func.max(Message.timestamp).label('max_ts')
-        ).filter(Message.doctor_id == doctor_id).group_by(Message.patient_id).subquery()
-
-        # Join to get the full last message details, order by most recent, and limit
-        last_messages_q = db.session.query(Message).join(
-            subq,
-            db.and_(Message.patient_id == subq.c.patient_id, Message.timestamp == subq.c.max_ts)
-        ).order_by(subq.c.max_ts.desc()).limit(5)
-        
-        recent_conversations = []
-        for msg in last_messages_q.all():
-            patient = Patient.query.get(msg.patient_id)
-            # Count unread messages from this patient
-            unread_count = Message.query.filter_by(
-                doctor_id=doctor_id, 
-                patient_id=patient.id, 
-                is_read=False, 
-                sender_type='patient'
-            ).count()
-            can_message = patient.can_message_doctor(doctor_id)
-            recent_conversations.append({
-                'patient': patient,
-                'last_message': msg,
-                'unread_count': unread_count,
-                'can_message': can_message
-            })
+        recent_conversations = doctor_conversations(doctor_id, limit=5)
         # --- End: Logic for recent conversations ---
         
         # --- New: Get recent reviews ---
-        recent_reviews = Review.query.filter_by(doctor_id=doctor_id).order_by(Review.timestamp.desc()).limit(3).all()
+        recent_reviews = Review.query.options(joinedload(Review.patient)).filter_by(doctor_id=doctor_id).order_by(Review.timestamp.desc()).limit(3).all()
 
-        # --- New: Get slots for the next 7 days ---
-        today = date.today()
-        now = datetime.now()
-        weekly_slots = {}
-
-        current_slots = doctor.available_slots
-        if isinstance(current_slots, str):
-            try:
-                current_slots = json.loads(current_slots)
-            except json.JSONDecodeError:
-                current_slots = {}
-
-        # --- REFACTORED SLOT FILTERING LOGIC for new structure ---
-        # This logic now correctly handles the new {'online': {...}, 'in-person': {...}} structure,
-        # removes past slots, and filters out slots that are already booked.
-        if current_slots:
-            seven_days_from_now = today + timedelta(days=7)
-            
-            # Collect all relevant dates from both 'online' and 'in-person' slots
-            all_relevant_dates = set()
-            for consult_type in ['online', 'in-person']:
-                if isinstance(current_slots.get(consult_type), dict):
-                    for date_str in current_slots[consult_type].keys():
-                        try:
-                            slot_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                            if today <= slot_date < seven_days_from_now:
-                                all_relevant_dates.add(date_str)
-                        except ValueError:
-                            continue
-
-            if all_relevant_dates:
-                # Fetch all booked appointments for the relevant dates in one query
-                booked_appointments = Appointment.query.filter(
-                    Appointment.doctor_id == doctor_id,
-                    Appointment.appointment_date.cast(db.Date).in_(list(all_relevant_dates)),
-                    Appointment.status.in_(['Pending', 'Confirmed'])
-                ).all()
-                # Create a lookup set for booked slots: {'consultType_YYYY-MM-DD_HH:MM'}
-                booked_slot_keys = {f"{appt.consultation_type.lower()}_{appt.appointment_date.strftime('%Y-%m-%d')}_{appt.appointment_date.strftime('%H:%M')}" for appt in booked_appointments}
-
-                # Process and filter slots for each consultation type
-                for consult_type in ['online', 'in-person']:
-                    if consult_type in current_slots and isinstance(current_slots[consult_type], dict):
-                        for date_str in sorted(all_relevant_dates):
-                            if date_str in current_slots[consult_type]:
-                                available_times = [
-                                    time_str for time_str in current_slots[consult_type][date_str]
-                                    if datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M') > now and f"{consult_type}_{date_str}_{time_str}" not in booked_slot_keys
-                                ]
-                                if available_times:
-                                    weekly_slots.setdefault(date_str, {})[consult_type] = available_times
-
-        # --- END REFACTOR ---
+        # --- New: Get free slots for the next 7 days ---
+        weekly_slots = get_weekly_slots(doctor_id, days=7)
 
         return render_template("doctor_dashboard.html", doctor=doctor,
                                total_appointments=total_appointments,
@@ -485,7 +383,7 @@ def setup_doctor_routes(app):
 
         # Fetch the doctor from the database to get the most up-to-date info,
         # including verification status.
-        doctor_to_update = Doctor.query.get(session['doctor_id'])
+        doctor_to_update = get_current_doctor(full=True)
         if not doctor_to_update:
             flash("Could not find your profile in the database.", "danger")
             return redirect(url_for('doctor_login'))
@@ -516,10 +414,10 @@ def setup_doctor_routes(app):
             if "image" in request.files:
                 file = request.files["image"]
                 if file and file.filename != "":
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    file.save(filepath)
-                    doctor_to_update.image = f"uploads/{filename}"  # store relative path
+                    try:
+                        doctor_to_update.image, doctor_to_update.image_variants = store_image(app.config["UPLOAD_FOLDER"], file.stream)
+                    except InvalidImageError as e:
+                        flash(f"Profile image not updated: {e}", "danger")
 
             db.session.commit()
             
@@ -540,7 +438,19 @@ def setup_doctor_routes(app):
             return redirect(url_for('doctor_dashboard'))
 
         if status in ['Confirmed', 'Completed', 'Canceled']:
+            if appointment.status == 'Canceled' and status != 'Canceled':
+                # Reinstating a canceled appointment: its slot may have been booked since.
+                try:
+                    claimed = claim_appointment_slot(appointment, allow_unpublished=True)
+                except IntegrityError:
+                    claimed = False
+                if not claimed:
+                    db.session.rollback()
+                    flash("This appointment's time slot has been booked by another patient.", "danger")
+                    return redirect(url_for('doctor_dashboard'))
             appointment.status = status
+            if status == 'Canceled':
+                release_appointment_slot(appointment) # The slot becomes bookable again
             db.session.commit()
             flash(f"Appointment has been marked as {status}.", "success")
         else:
@@ -554,7 +464,7 @@ def setup_doctor_routes(app):
         if "doctor_id" not in session:
             return redirect(url_for('doctor_login'))
 
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor(full=True)
         if not doctor:
             flash("Doctor not found.", "danger")
             return redirect(url_for('doctor_login'))
@@ -578,6 +488,7 @@ def setup_doctor_routes(app):
                 slots_data = {}
             
             doctor.available_slots = slots_data
+            replace_doctor_slots(doctor, slots_data)
             db.session.commit()
 
             flash("Your available slots have been updated successfully.", "success")
@@ -652,7 +563,7 @@ def setup_doctor_routes(app):
         if not check_gmail_app_password():
             return redirect(url_for('my_profile'))
 
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor()
         if not doctor.email_id:
             flash('Please add an email address to your profile first.', 'warning')
             return redirect(url_for('edit_doctor_profile'))
@@ -666,21 +577,11 @@ def setup_doctor_routes(app):
         session['doctor_email_verification_otp'] = otp
         session['doctor_email_to_verify'] = doctor.email_id
 
-        # Send email with OTP
-        msg = MailMessage('Verify Your Email for CareConnect',
-                          sender=app.config['MAIL_USERNAME'],
-                          recipients=[doctor.email_id])
-        msg.body = f'Your CareConnect Doctor account email verification OTP is: {otp}'
-        try:
-            mail.send(msg)
-            flash(f'An OTP has been sent to {doctor.email_id}.', 'info')
-        except smtplib.SMTPAuthenticationError as e:
-            error_msg = Markup("Email sending failed due to an authentication error. If using Gmail, please use a 16-character <strong>App Password</strong>. <a href='https://myaccount.google.com/apppasswords' target='_blank' class='alert-link'>Generate one here</a>.")
-            flash(error_msg, "danger")
-            current_app.logger.error(f"SMTPAuthenticationError: {e}. Check MAIL_USERNAME and MAIL_PASSWORD.")
-            if current_app.debug:
-                flash(Markup(f"DEV MODE: Email sending failed. You can <a href='{url_for('dev_bypass_doctor_email_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
-            return redirect(url_for('my_profile'))
+        # Queue the email with the OTP; it is sent in the background (see notification_service)
+        enqueue_email(doctor.email_id, 'Verify Your Email for CareConnect', f'Your CareConnect Doctor account email verification OTP is: {otp}')
+        flash(f'An OTP has been sent to {doctor.email_id}.', 'info')
+        if current_app.debug:
+            flash(Markup(f"DEV MODE: If the email doesn't arrive, you can <a href='{url_for('dev_bypass_doctor_email_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
 
         return redirect(url_for('verify_doctor_email_otp'))
 
@@ -694,7 +595,7 @@ def setup_doctor_routes(app):
         if request.method == 'POST':
             submitted_otp = request.form.get('otp')
             if submitted_otp == session.get('doctor_email_verification_otp'):
-                doctor = Doctor.query.get(session['doctor_id'])
+                doctor = get_current_doctor()
                 if doctor.email_id == session.get('doctor_email_to_verify'):
                     doctor.email_verified = True
                     db.session.commit()
@@ -724,7 +625,7 @@ def setup_doctor_routes(app):
             decoded_token = auth.verify_id_token(id_token)
             firebase_phone_number = decoded_token.get('phone_number')
 
-            doctor = Doctor.query.get(session['doctor_id'])
+            doctor = get_current_doctor()
 
             if doctor.mobile_no == firebase_phone_number:
                 doctor.mobile_verified = True
@@ -750,7 +651,7 @@ def setup_doctor_routes(app):
         if not current_app.debug:
             return "This feature is only available in development mode.", 404
         
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor()
         doctor.mobile_verified = True
         db.session.commit()
         flash('DEV MODE: Mobile number verification bypassed.', 'success')
@@ -765,7 +666,7 @@ def setup_doctor_routes(app):
         if not current_app.debug:
             return "This feature is only available in development mode.", 404
         
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor()
         doctor.email_verified = True
         db.session.commit()
         flash('DEV MODE: Email verification bypassed.', 'success')
@@ -776,38 +677,8 @@ def setup_doctor_routes(app):
     def doctor_list_conversations():
         doctor_id = session['doctor_id']
         
-        # Subquery to get the last message for each patient conversation
-        subq = db.session.query(
-            Message.patient_id,
-            func.max(Message.timestamp).label('max_ts')
-        ).filter(Message.doctor_id == doctor_id).group_by(Message.patient_id).subquery()
-
-        # Join to get the full last message details
-        last_messages_q = db.session.query(Message).join(
-            subq,
-            db.and_(Message.patient_id == subq.c.patient_id, Message.timestamp == subq.c.max_ts)
-        )
-        
-        conversations = []
-        for msg in last_messages_q.all():
-            patient = Patient.query.get(msg.patient_id)
-            # Count unread messages from this patient
-            unread_count = Message.query.filter_by(
-                doctor_id=doctor_id, 
-                patient_id=patient.id, 
-                is_read=False, 
-                sender_type='patient'
-            ).count()
-            can_message = patient.can_message_doctor(doctor_id)
-            conversations.append({
-                'patient': patient,
-                'last_message': msg,
-                'unread_count': unread_count,
-                'can_message': can_message
-            })
-        
-        # Sort conversations by the timestamp of the last message
-        conversations.sort(key=lambda x: x['last_message'].timestamp, reverse=True)
+        # Last message, unread count and messaging eligibility for every conversation, in a few grouped queries.
+        conversations = doctor_conversations(doctor_id)
 
         return render_template('doctor_conversations.html', conversations=conversations)
 
@@ -820,8 +691,13 @@ def setup_doctor_routes(app):
         can_message = patient.can_message_doctor(doctor_id)
 
         if request.method == 'POST':
+            # The chat page posts with fetch() and asks for JSON; a plain form post gets the page.
+            as_json = wants_json_response()
             if not can_message:
-                flash("Messaging is disabled for this patient as their follow-up period has ended.", "warning")
+                warning = "Messaging is disabled for this patient as their follow-up period has ended."
+                if as_json:
+                    return jsonify({'error': warning}), 403
+                flash(warning, "warning")
                 return redirect(url_for('doctor_conversation', patient_id=patient_id))
 
             content = request.form.get('content')
@@ -829,19 +705,47 @@ def setup_doctor_routes(app):
                 message = Message(patient_id=patient_id, doctor_id=doctor_id, sender_type='doctor', content=content)
                 db.session.add(message)
                 db.session.commit()
+                if as_json:
+                    return jsonify(message_payload(message)), 201
+            if as_json:
+                return jsonify({'error': 'Message is empty.'}), 400
             return redirect(url_for('doctor_conversation', patient_id=patient_id))
 
         # Mark messages from this patient as read upon opening the chat
-        Message.query.filter_by(
-            doctor_id=doctor_id, 
-            patient_id=patient_id, 
-            sender_type='patient', 
-            is_read=False
-        ).update({Message.is_read: True})
-        db.session.commit()
+        if mark_conversation_read(patient_id, doctor_id, reader='doctor'):
+            db.session.commit()
+
+        messages, older_cursor = message_page(patient_id, doctor_id)
+        return render_template('doctor_conversation.html', patient=patient, messages=messages, older_cursor=older_cursor,
+                               can_message=can_message)
+
+    @app.route('/doctor/messages/<int:patient_id>/history')
+    @doctor_login_required
+    def doctor_conversation_history(patient_id):
+        """The page of messages before ?before=<cursor>, for the chat's "Load older messages" button."""
+        messages, older_cursor = message_page(patient_id, session['doctor_id'], before=request.args.get('before'))
+        return jsonify({'messages': [message_payload(msg) for msg in messages], 'older_cursor': older_cursor})
 
-        messages = Message.query.filter_by(patient_id=patient_id, doctor_id=doctor_id).order_by(Message.timestamp.asc()).all()
-        return render_template('doctor_conversation.html', patient=patient, messages=messages, can_message=can_message)
+    @app.route('/doctor/messages/<int:patient_id>/updates')
+    @doctor_login_required
+    def doctor_conversation_updates(patient_id):
+        """Messages newer than ?after=<id>, polled by open chats (unless MESSAGE_STREAM_ENABLED)."""
+        after_id = request.args.get('after', 0, type=int)
+        return jsonify({'messages': fetch_new_messages(patient_id, session['doctor_id'], 'doctor', after_id)})
+
+    @app.route('/doctor/messages/<int:patient_id>/stream')
+    @doctor_login_required
+    def doctor_conversation_stream(patient_id):
+        if not current_app.config.get('MESSAGE_STREAM_ENABLED', False):
+            abort(404) # Streams would tie up a sync worker; chats poll /updates instead
+        after_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', 0, type=int)
+        events = conversation_events(
+            patient_id, session['doctor_id'], 'doctor', after_id,
+            poll_seconds=current_app.config.get('MESSAGE_STREAM_POLL_SECONDS', 2),
+            max_seconds=current_app.config.get('MESSAGE_STREAM_MAX_SECONDS', 30)
+        )
+        return Response(stream_with_context(events), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     @app.route('/doctor/send_mobile_verification')
     @doctor_login_required
@@ -852,7 +756,7 @@ def setup_doctor_routes(app):
             flash("The SMS service is not configured. Please contact support.", "danger")
             return redirect(url_for('my_profile'))
 
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor()
         if not doctor.mobile_no:
             flash('Please add a mobile number to your profile first.', 'warning')
             return redirect(url_for('edit_doctor_profile'))
@@ -866,29 +770,12 @@ def setup_doctor_routes(app):
         session['doctor_mobile_verification_otp'] = otp
         session['doctor_mobile_to_verify'] = doctor.mobile_no
 
-        # Send SMS with OTP via Twilio
-        try:
-            current_app.logger.info(f"Attempting to send OTP to doctor number: {doctor.mobile_no}")
-            client = Client(current_app.config['TWILIO_ACCOUNT_SID'], current_app.config['TWILIO_AUTH_TOKEN'])
-            message = client.messages.create(
-                body=f"Your CareConnect Doctor account mobile verification OTP is: {otp}",
-                from_=current_app.config['TWILIO_PHONE_NUMBER'],
-                to=doctor.mobile_no
-            )
-            flash(f'An OTP has been sent to {doctor.mobile_no}.', 'info')
-        except exceptions.TwilioRestException as e:
-            # Log the specific error from Twilio for debugging
-            current_app.logger.error(f"Twilio API error for doctor verification: {e.msg} (Code: {e.code})")
-            flash("Failed to send OTP. Please check your mobile number or try again later.", "danger")
-            if current_app.debug:
-                # In debug mode, show the specific Twilio error to the developer
-                flash(Markup(f"<b>DEV MODE DEBUG:</b> Twilio Error Code {e.code} - {e.msg}. <a href='https://www.twilio.com/docs/api/errors/{e.code}' target='_blank' class='alert-link'>More info here.</a>"), "warning")
-        except Exception as e:
-            current_app.logger.error(f"Twilio failed to send SMS for doctor verification: {e}")
-            flash("Failed to send OTP. Please check your mobile number or try again later.", "danger")
-            if current_app.debug:
-                flash(Markup(f"DEV MODE: SMS sending failed. You can <a href='{url_for('dev_bypass_doctor_mobile_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
-            return redirect(url_for('my_profile'))
+        # Queue the SMS with the OTP; it is sent in the background via Twilio (see notification_service)
+        current_app.logger.info(f"Queueing OTP for doctor number: {doctor.mobile_no}")
+        enqueue_sms(doctor.mobile_no, f"Your CareConnect Doctor account mobile verification OTP is: {otp}")
+        flash(f'An OTP has been sent to {doctor.mobile_no}.', 'info')
+        if current_app.debug:
+            flash(Markup(f"DEV MODE: If the SMS doesn't arrive, you can <a href='{url_for('dev_bypass_doctor_mobile_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
 
         return redirect(url_for('verify_doctor_mobile'))
 
@@ -908,7 +795,7 @@ def setup_doctor_routes(app):
         if request.method == 'POST':
             submitted_otp = request.form.get('otp')
             if submitted_otp == session.get('doctor_mobile_verification_otp'):
-                doctor = Doctor.query.get(session['doctor_id'])
+                doctor = get_current_doctor()
                 if doctor.mobile_no == session.get('doctor_mobile_to_verify'):
                     doctor.mobile_verified = True
                     db.session.commit()
@@ -3,8 +3,10 @@ import os
 from flask import Flask, current_app
 from flask_mail import Mail
 from functools import wraps
-from flask import session, redirect, url_for, flash, request
+from flask import session, redirect, url_for, flash, request, g
 from markupsafe import Markup
+from sqlalchemy import inspect
+from sqlalchemy.orm import defer
 
 db = SQLAlchemy()
 mail = Mail()
@@ -24,6 +26,54 @@ def check_gmail_app_password():
     return True
 
 
+def wants_json_response():
+    """True when the client (e.g. a fetch() call) asked for JSON rather than an HTML page."""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+# --- Request-Scoped Identity ---
+# The logged-in patient or doctor is loaded at most once per request and shared by the
+# decorators, the context processors and the views. Large text/JSON columns that headers
+# and permission checks never read are deferred; views that show or edit the whole profile
+# ask for them with full=True, which loads them together in one more query.
+_DEFERRED_COLUMNS = {
+    'Patient': ('password', 'bio'),
+    'Doctor': ('password', 'bio', 'certifications', 'available_slots'),
+}
+
+
+def _get_current(model, session_key, full):
+    user_id = session.get(session_key)
+    if user_id is None:
+        return None
+    cache_key = f'_current_{session_key}'
+    cached = g.get(cache_key)
+    # Keyed on the id too, so a login or logout earlier in the same request is picked up.
+    if cached is None or cached[0] != user_id:
+        deferred = () if full else _DEFERRED_COLUMNS[model.__name__]
+        user = db.session.get(model, user_id, options=[defer(getattr(model, name)) for name in deferred])
+        setattr(g, cache_key, (user_id, user))
+        return user
+    user = cached[1]
+    if full and user is not None:
+        unloaded = [name for name in _DEFERRED_COLUMNS[model.__name__] if name in inspect(user).unloaded]
+        if unloaded:
+            db.session.refresh(user, attribute_names=unloaded)
+    return user
+
+
+def get_current_patient(full=False):
+    """The logged-in Patient (None if logged out or the row is gone), loaded once per request."""
+    from .models import Patient
+    return _get_current(Patient, 'patient_id', full)
+
+
+def get_current_doctor(full=False):
+    """The logged-in Doctor (None if logged out or the row is gone), loaded once per request."""
+    from .models import Doctor
+    return _get_current(Doctor, 'doctor_id', full)
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -49,14 +99,11 @@ def doctor_verified_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # Import here to avoid potential circular dependencies
-        from .models import Doctor
-
         if 'doctor_id' not in session:
             # This should be handled by doctor_login_required, but it's a good safeguard.
             return redirect(url_for('doctor_login'))
 
-        doctor = Doctor.query.get(session['doctor_id'])
+        doctor = get_current_doctor()
         if not doctor:
             flash("Doctor profile not found. Please log in again.", "danger")
             session.pop("doctor_id", None) # Clean up bad session
@@ -4,6 +4,7 @@ from app.extension import db, mail
 from app.config import settings
 import firebase_admin
 import json
+import click
 from datetime import datetime
 from flask_migrate import Migrate
 from firebase_admin import credentials
@@ -53,16 +54,71 @@ def create_app():
             return ''
     app.jinja_env.filters['month_name'] = month_name_filter
 
+    from app.services.image_service import image_variant
+    app.jinja_env.filters['image_variant'] = image_variant
+
     db.init_app(app)
     mail.init_app(app)
 
     # --- Load service data and AI models ---
     # This is done after db.init_app to ensure the app context and DB are available.
-    with app.app_context():
-        from app.services.doctor_service import load_service_data
-        load_service_data()
+    # By default the models load in a background thread so the worker starts serving
+    # immediately (search runs in keyword-fallback mode until /readyz reports ready).
+    from app.services.doctor_service import load_service_data, start_background_warmup
+    if app.config.get('AI_WARMUP_IN_BACKGROUND', True):
+        start_background_warmup(app)
+    else:
+        with app.app_context():
+            load_service_data()
 
     Migrate(app, db)
+
+    # Send queued notifications from this process without waiting for its first enqueue.
+    # Flask CLI commands (migrations, `flask send-notifications`, ...) don't start a pool.
+    if app.config.get('NOTIFICATION_WORKERS', 2) > 0 and os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        from app.services.notification_service import start_notification_workers
+        start_notification_workers(app)
+
+    @app.cli.command('sweep-availability')
+    def sweep_availability_command():
+        """Refreshes doctors' next_available_at / free_slots_7d. Run it from cron, e.g. every 5 minutes."""
+        from app.services.availability_service import sweep_doctor_availability
+        updated = sweep_doctor_availability()
+        print(f"✅ Availability refreshed for {updated} doctor(s).")
+
+    @app.cli.command('send-notifications')
+    @click.option('--once', is_flag=True, help="Send the jobs that are due now and exit.")
+    @click.option('--workers', type=int, default=None, help="Worker threads when running continuously. [default: NOTIFICATION_WORKERS]")
+    def send_notifications_command(once, workers):
+        """Sends queued OTP emails / SMS. Runs until stopped, as a dedicated notification worker."""
+        from app.services.notification_service import NotificationWorker, drain_due_jobs
+        if once:
+            outcomes = drain_due_jobs()
+            print(f"✅ Notifications processed: {outcomes or 'none due'}")
+            return
+        if workers is None:
+            workers = app.config.get('NOTIFICATION_WORKERS', 2)
+        if workers < 1:
+            raise click.UsageError("NOTIFICATION_WORKERS is 0 in this environment: pass --workers N to set the number of threads.")
+        print(f"📨 Sending notifications with {workers} worker thread(s). Press Ctrl+C to stop.")
+        NotificationWorker(app, workers).join()
+
+    @app.cli.command('build-image-variants')
+    def build_image_variants_command():
+        """Moves profile images uploaded before thumbnails existed into content-addressed storage and builds their thumbnails."""
+        from app.models import Doctor, Patient
+        from app.services.image_service import store_existing_image
+        updated = 0
+        for model in (Doctor, Patient):
+            for owner in model.query.filter(model.image.isnot(None), model.image_variants.is_(None)):
+                try:
+                    owner.image, owner.image_variants = store_existing_image(app.config["UPLOAD_FOLDER"], owner.image)
+                    updated += 1
+                except (OSError, ValueError) as e:
+                    print(f"⚠️  Skipped {model.__name__} {owner.id} ({owner.image}): {e}")
+        db.session.commit()
+        print(f"✅ Thumbnails built for {updated} profile image(s).")
+
     from app.routers import setup_routes
     from app.doctor_routes import setup_doctor_routes
     setup_routes(app)
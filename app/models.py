@@ -1,9 +1,16 @@
 from app.extension import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.password_service import hash_password, check_and_upgrade
+
+# Patients can keep messaging a doctor for this many days after a completed appointment.
+MESSAGING_FOLLOW_UP_DAYS = 7
 
 class Doctor(db.Model):
     __tablename__ = 'doctors'
+    __table_args__ = (
+        db.Index('ix_doctors_specialization_location', 'specialization', 'location'), # find_doctor by specialty (and area)
+        db.Index('ix_doctors_location', 'location'), # find_doctor by area only
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     NMR_ID = db.Column(db.String(50), unique=True, nullable=False)
@@ -24,7 +31,12 @@ class Doctor(db.Model):
     education = db.Column(db.String(255), nullable=True) # e.g., "MBBS, MD"
     certifications = db.Column(db.Text, nullable=True) # Comma-separated
     available_slots = db.Column(db.JSON, nullable=True) # Store available time slots
+    # Denormalized from the slots table (see availability_service) so search can order by availability in SQL.
+    next_available_at = db.Column(db.DateTime, nullable=True, index=True) # Start of the next free slot
+    free_slots_7d = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Free slot start times in the next 7 days
+    unread_messages = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Unread messages from patients (see unread_service)
     image = db.Column(db.String(200), nullable=True)  # Path to profile image
+    image_variants = db.Column(db.JSON(none_as_null=True), nullable=True)  # Thumbnail paths by size and format (see image_service)
     reviews = db.relationship('Review', backref='doctor', lazy=True, cascade="all, delete-orphan")
     email_verified = db.Column(db.Boolean, default=False, nullable=False)
     mobile_verified = db.Column(db.Boolean, default=False, nullable=False)
@@ -38,10 +50,11 @@ class Doctor(db.Model):
         return [review.text for review in self.reviews]
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        # Also rehashes the password if PASSWORD_HASH_METHOD has changed; callers commit.
+        return check_and_upgrade(self, password)
 
 class Patient(db.Model):
     __tablename__ = 'patients'
@@ -58,18 +71,21 @@ class Patient(db.Model):
     login_count = db.Column(db.Integer, default=0)
     status = db.Column(db.String(10), default="logout")
     image = db.Column(db.String(200), nullable=True)  # Path to profile image
+    image_variants = db.Column(db.JSON(none_as_null=True), nullable=True)  # Thumbnail paths by size and format (see image_service)
     bio = db.Column(db.Text, nullable=True)  # Extra details
     email_verified = db.Column(db.Boolean, default=False, nullable=False)
     mobile_verified = db.Column(db.Boolean, default=False, nullable=False)
+    unread_messages = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Unread messages from doctors (see unread_service)
 
     def __repr__(self):
         return f"<Patient {self.username}>"
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        # Also rehashes the password if PASSWORD_HASH_METHOD has changed; callers commit.
+        return check_and_upgrade(self, password)
 
     def can_message_doctor(self, doctor_id):
         """
@@ -78,7 +94,6 @@ class Patient(db.Model):
         completed appointment is within a 7-day follow-up period.
         """
         from datetime import datetime, timedelta
-        MESSAGING_FOLLOW_UP_DAYS = 7
         follow_up_period = timedelta(days=MESSAGING_FOLLOW_UP_DAYS)
         now = datetime.now()
 
@@ -107,6 +122,10 @@ class Patient(db.Model):
     
 class SearchHistory(db.Model):
     __tablename__ = 'search_history'
+    __table_args__ = (
+        db.Index('ix_search_history_patient_id_id', 'patient_id', 'id'), # Recent searches sidebar
+        db.Index('ix_search_history_patient_timestamp', 'patient_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     location = db.Column(db.String(120), nullable=False)
@@ -118,6 +137,10 @@ class SearchHistory(db.Model):
 
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_doctor_timestamp', 'doctor_id', 'timestamp'),
+        db.Index('ix_reviews_patient_timestamp', 'patient_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False, default=5) # Rating from 1 to 5
     text = db.Column(db.Text, nullable=False)
@@ -133,6 +156,11 @@ class Review(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_doctor_status_date', 'doctor_id', 'status', 'appointment_date'), # Doctor dashboard
+        db.Index('ix_appointments_user_status_date', 'user_id', 'status', 'appointment_date'), # Patient dashboard / my appointments
+        db.Index('ix_appointments_user_doctor_status_date', 'user_id', 'doctor_id', 'status', 'appointment_date'), # Messaging eligibility
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
@@ -150,8 +178,56 @@ class Appointment(db.Model):
     def __repr__(self):
         return f"<Appointment {self.id} with Dr. {self.doctor_id} for Patient {self.user_id}>"
 
+class Slot(db.Model):
+    """
+    One bookable time slot. This is the queryable source of truth for availability;
+    Doctor.available_slots keeps the same data as JSON for the slot editor.
+    A slot is booked while appointment_id is set.
+    """
+    __tablename__ = 'slots'
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'consultation_type', 'start_at', name='uq_slots_doctor_type_start'),
+        # Serves "which doctors have a free slot between X and Y" without touching other doctors' rows.
+        db.Index('ix_slots_start_at_free', 'start_at', 'appointment_id', 'doctor_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    consultation_type = db.Column(db.String(20), nullable=False) # 'online' or 'in-person'
+    start_at = db.Column(db.DateTime, nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id', ondelete='SET NULL'), nullable=True, unique=True)
+
+    doctor = db.relationship('Doctor', backref=db.backref('slots', lazy='dynamic'))
+    appointment = db.relationship('Appointment', backref=db.backref('slot', uselist=False))
+
+    @property
+    def is_booked(self):
+        return self.appointment_id is not None
+
+    def __repr__(self):
+        return f"<Slot {self.consultation_type} {self.start_at} for Dr. {self.doctor_id}>"
+
+class AvailabilityBitmap(db.Model):
+    """
+    A doctor's free slot start times for one day, packed into a 1440-bit bitmap (one bit per
+    minute, so every slot maps to exactly one bit). Derived from the slots table and kept up
+    to date by availability_service; days without any free slot have no row.
+    """
+    __tablename__ = 'availability_bitmaps'
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    bits = db.Column(db.LargeBinary(180), nullable=False)
+
+    def __repr__(self):
+        return f"<AvailabilityBitmap Dr. {self.doctor_id} {self.day}>"
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_patient_doctor_timestamp_id', 'patient_id', 'doctor_id', 'timestamp', 'id'), # Thread pages (keyset on timestamp, id)
+        db.Index('ix_messages_doctor_patient_timestamp', 'doctor_id', 'patient_id', 'timestamp'), # Last message per patient (doctor side)
+        db.Index('ix_messages_doctor_sender_read', 'doctor_id', 'sender_type', 'is_read'), # Doctor unread counts
+        db.Index('ix_messages_patient_sender_read', 'patient_id', 'sender_type', 'is_read'), # Patient unread counts
+    )
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
@@ -166,6 +242,17 @@ class Message(db.Model):
     def __repr__(self):
         return f'<Message {self.id}>'
 
+class ConversationUnread(db.Model):
+    """Unread message counters for one patient-doctor conversation, one per side."""
+    __tablename__ = 'conversation_unread'
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True, index=True)
+    patient_unread = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Sent by the doctor, not yet read
+    doctor_unread = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Sent by the patient, not yet read
+
+    def __repr__(self):
+        return f"<ConversationUnread {self.patient_id}-{self.doctor_id}>"
+
 class Prescription(db.Model):
     __tablename__ = 'prescriptions'
     id = db.Column(db.Integer, primary_key=True)
@@ -220,3 +307,30 @@ class LocationAlias(db.Model):
     alias = db.Column(db.String(120), unique=True, nullable=False)
     location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
     location = db.relationship('Location', backref=db.backref('aliases', lazy=True))
+
+class NotificationJob(db.Model):
+    """
+    An outbound email or SMS waiting to be sent by the notification workers
+    (see notification_service). Failed sends are retried with backoff; jobs that keep
+    failing end up 'dead' with their last error kept for inspection.
+    """
+    __tablename__ = 'notification_jobs'
+    __table_args__ = (
+        db.Index('ix_notification_jobs_status_next_attempt', 'status', 'next_attempt_at'), # Workers claiming due jobs
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False) # 'email' or 'sms'
+    recipient = db.Column(db.String(255), nullable=False) # Email address or E.164 phone number
+    subject = db.Column(db.String(255), nullable=True) # Email only
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending') # 'pending', 'sending', 'sent' or 'dead'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True) # When a worker claimed it; stale claims are retried
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<NotificationJob {self.id} {self.channel} {self.status}>"
@@ -1,121 +1,75 @@
-from flask import render_template, request, session, redirect, url_for, flash, jsonify, current_app
-from app.services.doctor_service import find_doctors, get_nearby_locations, map_disease_to_specialist, find_hospitals, get_featured_hospitals, extract_entities_from_query, get_autocomplete_suggestions, get_location_suggestions
-import os
+from flask import render_template, request, session, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context, abort
+from app.services.doctor_service import find_doctors, get_nearby_locations, map_disease_to_specialist, find_hospitals, get_featured_hospitals, extract_entities_from_query, get_autocomplete_suggestions, get_location_suggestions, get_warmup_state, get_specialist_cache_stats
+from app.services.booking_service import book_appointment, SlotTakenError
+from app.services.conversation_service import patient_conversations, message_page, message_payload, fetch_new_messages, conversation_events
+from app.services.availability_service import get_free_slots
+from app.services.unread_service import mark_conversation_read
+from app.services.notification_service import enqueue_email, enqueue_sms
+from app.services.image_service import store_image, InvalidImageError
 import random
-from werkzeug.utils import secure_filename
-from app.extension import db, mail, login_required, check_gmail_app_password
+from app.extension import db, login_required, check_gmail_app_password, get_current_patient, wants_json_response
 from app.models import SearchHistory, Patient, Doctor, Appointment, Review, Message
-from datetime import datetime, date
-from sqlalchemy import func, case, and_
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature
-from flask_mail import Message as MailMessage  # Alias to avoid name conflict with model
 from firebase_admin import auth
-from twilio.rest import Client
-from twilio.base import exceptions
-import smtplib
 from markupsafe import Markup
 
 
 def _filter_doctor_slots(doctors_list):
     """
-    A helper function to filter a list of doctors' available_slots.
-    It removes past slots and already booked slots. This version is optimized
-    to avoid making a separate database query for each doctor (N+1 problem).
+    A helper function to replace each doctor's available_slots with the slots that are
+    still free (upcoming and not booked), read from the shared availability service.
+    The filtered slots are set as the committed value so they are never written back to the DB.
     """
     if not doctors_list:
         return doctors_list
 
-    today = date.today()
-    now = datetime.now()
-
-    doctor_ids = [doc.id for doc in doctors_list]
-    all_slot_dates = set()
-    for doc in doctors_list:
-        # Correctly iterate through the new nested structure to get all dates
-        if isinstance(doc.available_slots, dict):
-            for consult_type in ['online', 'in-person']:
-                if isinstance(doc.available_slots.get(consult_type), dict):
-                    all_slot_dates.update(doc.available_slots[consult_type].keys())
-
-    # If no doctors have any slots defined, we can just clear them and return.
-    if not all_slot_dates:
-        for doc in doctors_list:
-            doc.available_slots = {}
-        return doctors_list
-
-    # --- Optimized Appointment Fetching ---
-    # Fetch all relevant appointments for all doctors in the list in a single query.
-    all_appointments = Appointment.query.filter(
-        Appointment.doctor_id.in_(doctor_ids),
-        Appointment.appointment_date.cast(db.Date).in_(list(all_slot_dates)),
-        Appointment.status.in_(['Pending', 'Confirmed'])
-    ).all()
-
-    # Create a lookup map for booked slots: {doctor_id: {booked_slot_key, ...}}
-    booked_slots_by_doctor = {}
-    for appt in all_appointments: 
-        slot_key = f"{appt.consultation_type}_{appt.appointment_date.strftime('%Y-%m-%d')}_{appt.appointment_date.strftime('%H:%M')}" 
-        booked_slots_by_doctor.setdefault(appt.doctor_id, set()).add(slot_key) 
-    # --- End Optimization ---
-
+    free_slots = get_free_slots([doc.id for doc in doctors_list])
     for doctor in doctors_list:
-        if not isinstance(doctor.available_slots, dict):
-            doctor.available_slots = {}
-            continue
-        
-        valid_slots = {}
-        booked_slot_times = booked_slots_by_doctor.get(doctor.id, set())
-
-        # Normalize slots into a unified structure: {'online': {...}, 'in-person': {...}}
-        normalized_slots = {}
-        is_new_structure = 'online' in doctor.available_slots or 'in-person' in doctor.available_slots
-
-        if is_new_structure:
-            normalized_slots = doctor.available_slots
-        else: # Handle old structure for backward compatibility
-            # Default old slots to the doctor's primary consultation type, or 'In-Person'
-            default_type = 'in-person' if doctor.consultation_types in ['In-Person', 'Both'] else 'online'
-            normalized_slots = {default_type: doctor.available_slots}
-
-        # Process the normalized structure
-        for consult_type, date_slots in normalized_slots.items():
-            if consult_type not in ['online', 'in-person'] or not isinstance(date_slots, dict):
-                continue
-            
-            valid_type_slots = {}
-            for slot_date_str, times in date_slots.items():
-                try:
-                    slot_date = datetime.strptime(slot_date_str, '%Y-%m-%d').date()
-                    if slot_date >= today and isinstance(times, list):
-                        available_times = []
-                        for time_str in times:
-                            slot_datetime = datetime.strptime(f"{slot_date_str} {time_str}", '%Y-%m-%d %H:%M')
-                            slot_key = f"{consult_type}_{slot_date_str}_{time_str}"
-                            if slot_datetime > now and slot_key not in booked_slot_times:
-                                available_times.append(time_str)
-                        if available_times:
-                            valid_type_slots[slot_date_str] = available_times
-                except (ValueError, TypeError):
-                    continue
-            if valid_type_slots:
-                valid_slots[consult_type] = valid_type_slots
-
-        doctor.available_slots = valid_slots
+        set_committed_value(doctor, 'available_slots', free_slots[doctor.id])
     return doctors_list
 
+def _keyset_after(keys, values):
+    """
+    Builds the WHERE clause for keyset pagination: rows that sort strictly after `values`
+    under the ordering `keys`, a list of (column, descending) pairs.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        ties = [key_column == value for (key_column, _), value in zip(keys[:i], values[:i])]
+        clauses.append(and_(*ties, column < values[i] if descending else column > values[i]))
+    return or_(*clauses)
+
+def _encode_browse_cursor(doctor, now):
+    """Cursor for browse_doctors: 'a~<next_available_at>~<rating>~<id>' or 'b~<rating>~<id>'."""
+    rating = doctor.rating or 0.0
+    if doctor.next_available_at and doctor.next_available_at > now:
+        return f"a~{doctor.next_available_at.isoformat()}~{rating}~{doctor.id}"
+    return f"b~{rating}~{doctor.id}"
+
+def _decode_browse_cursor(token):
+    try:
+        parts = token.split('~')
+        if parts[0] == 'a' and len(parts) == 4:
+            return ('a', datetime.fromisoformat(parts[1]), float(parts[2]), int(parts[3]))
+        if parts[0] == 'b' and len(parts) == 3:
+            return ('b', float(parts[1]), int(parts[2]))
+    except ValueError:
+        pass
+    return None # Missing or malformed cursor: start from the first page
+
 def setup_routes(app):
     @app.context_processor
     def inject_user_data():
         context = {'patient': None, 'unread_patient_messages': 0}
-        if 'patient_id' in session:
-            patient = Patient.query.get(session['patient_id'])
-            if patient:
-                context['patient'] = patient
-                context['unread_patient_messages'] = Message.query.filter_by(
-                    patient_id=patient.id,
-                    sender_type='doctor',
-                    is_read=False
-                ).count()
+        patient = get_current_patient()
+        if patient:
+            context['patient'] = patient
+            context['unread_patient_messages'] = patient.unread_messages
         return context
 
     @app.route("/login", methods=["GET", "POST"])
@@ -196,12 +150,10 @@ def setup_routes(app):
 
     @app.route("/logout")
     def logout():
-        patient_id = session.get("patient_id")
-        if patient_id:
-            patient = Patient.query.get(patient_id)
-            if patient:
-                patient.status = "logout"
-                db.session.commit()
+        patient = get_current_patient()
+        if patient:
+            patient.status = "logout"
+            db.session.commit()
         session.pop("patient_id", None)
         flash("You have been logged out successfully.", "info")
         return redirect(url_for("index"))
@@ -223,7 +175,7 @@ def setup_routes(app):
     @app.route("/home")
     @login_required
     def patient_home():
-        patient = Patient.query.get(session['patient_id'])
+        patient = get_current_patient()
         top_doctors = Doctor.query.order_by(Doctor.rating.desc()).limit(3).all()
         _filter_doctor_slots(top_doctors)
         return render_template("patient_home.html", patient=patient, top_doctors=top_doctors)
@@ -231,29 +183,44 @@ def setup_routes(app):
     @app.route('/browse_doctors')
     def browse_doctors():
         """
-        Displays all doctors, paginated and sorted by availability, review count, and rating.
+        Displays all doctors sorted by availability (soonest free slot first) and rating.
+        Uses keyset pagination: `after` is the cursor of the last doctor on the previous page.
         This page is now public and does not require login.
         """
-        page = request.args.get('page', 1, type=int)
-        review_count_subq = db.session.query(
-            Review.doctor_id,
-            func.count(Review.id).label('review_count')
-        ).group_by(Review.doctor_id).subquery()
-        has_slots_case = case(
-            (and_(Doctor.available_slots != None, Doctor.available_slots != {}), 0),
-            else_=1
-        )
-        all_doctors_query = Doctor.query.outerjoin(
-            review_count_subq, Doctor.id == review_count_subq.c.doctor_id
-        ).order_by(
-            has_slots_case.asc(), 
-            func.coalesce(review_count_subq.c.review_count, 0).desc(),
-            Doctor.rating.desc()
-        )
-
-        # Paginate the results, showing 10 doctors per page.
-        pagination = all_doctors_query.paginate(page=page, per_page=10, error_out=False)
-        all_doctors_list = pagination.items
+        per_page = 10
+        now = datetime.now()
+        # Optional filter: only doctors with a free slot within this many days.
+        available_within = request.args.get('available_within', type=int)
+        cursor = _decode_browse_cursor(request.args.get('after', ''))
+        rating = func.coalesce(Doctor.rating, 0.0)
+
+        # 1. Doctors with an upcoming free slot, soonest first. Served by the next_available_at index.
+        all_doctors_list = []
+        if cursor is None or cursor[0] == 'a':
+            available_query = Doctor.query.filter(Doctor.next_available_at > now)
+            if available_within:
+                available_query = available_query.filter(Doctor.next_available_at < now + timedelta(days=available_within))
+            if cursor:
+                available_query = available_query.filter(_keyset_after(
+                    [(Doctor.next_available_at, False), (rating, True), (Doctor.id, False)], cursor[1:]
+                ))
+            all_doctors_list = available_query.order_by(
+                Doctor.next_available_at.asc(), rating.desc(), Doctor.id.asc()
+            ).limit(per_page + 1).all()
+
+        # 2. Then everyone else by rating, once the available doctors are used up.
+        if len(all_doctors_list) <= per_page and not available_within:
+            unavailable_query = Doctor.query.filter(or_(Doctor.next_available_at.is_(None), Doctor.next_available_at <= now))
+            if cursor and cursor[0] == 'b':
+                unavailable_query = unavailable_query.filter(_keyset_after([(rating, True), (Doctor.id, False)], cursor[1:]))
+            all_doctors_list += unavailable_query.order_by(
+                rating.desc(), Doctor.id.asc()
+            ).limit(per_page + 1 - len(all_doctors_list)).all()
+
+        next_cursor = None
+        if len(all_doctors_list) > per_page:
+            all_doctors_list = all_doctors_list[:per_page]
+            next_cursor = _encode_browse_cursor(all_doctors_list[-1], now)
 
         # Filter slots to show only valid, available ones
         _filter_doctor_slots(all_doctors_list)
@@ -265,7 +232,7 @@ def setup_routes(app):
 
         return render_template('doctor_finding.html', doctors=all_doctors_list, recent_searches=recent_searches, 
                                datetime=datetime, disease_query="", location_query="",
-                               pagination=pagination, page_title="Browse All Doctors")
+                               next_cursor=next_cursor, available_within=available_within, page_title="Browse All Doctors")
 
     @app.route("/dashboard")
     @login_required
@@ -302,7 +269,7 @@ def setup_routes(app):
         ).scalar() or 0
 
         # Fetch reviews given by the patient
-        reviews_given = Review.query.filter_by(patient_id=patient_id).order_by(Review.timestamp.desc()).all()
+        reviews_given = Review.query.options(joinedload(Review.doctor)).filter_by(patient_id=patient_id).order_by(Review.timestamp.desc()).all()
 
         # --- New: Count unique conversations ---
         # A conversation exists if there's an appointment or a message.
@@ -312,7 +279,7 @@ def setup_routes(app):
         total_conversations_count = len(conversation_doctor_ids)
 
         recent_searches = SearchHistory.query.filter_by(patient_id=patient_id).order_by(SearchHistory.timestamp.desc()).limit(5).all()
-        upcoming_appointments = Appointment.query.filter(
+        upcoming_appointments = Appointment.query.options(joinedload(Appointment.doctor)).filter(
             Appointment.user_id == patient_id,
             Appointment.status.in_(['Pending', 'Confirmed']),
             Appointment.appointment_date >= now
@@ -327,12 +294,11 @@ def setup_routes(app):
     @login_required
     def my_appointments():
         patient_id = session['patient_id']
-        patient = Patient.query.get(patient_id)
         status_filter = request.args.get('status')
         view_filter = request.args.get('view')
         now = datetime.now()
         
-        appointments_query = Appointment.query.filter_by(user_id=patient_id)
+        appointments_query = Appointment.query.options(joinedload(Appointment.doctor)).filter_by(user_id=patient_id)
 
         # --- Refactored Appointment Filtering ---
         # This logic now filters out expired appointments from the 'Pending' and 'Confirmed'
@@ -355,50 +321,8 @@ def setup_routes(app):
         reviewed_doctor_ids = {review.doctor_id for review in Review.query.filter_by(patient_id=patient_id).all()}
 
         # --- Start: Logic to get all doctors for conversations ---
-        # Find all unique doctors the patient has interacted with
-        # Use all appointments to build the conversation list, not just the filtered ones
-        all_patient_appointments = Appointment.query.filter_by(user_id=patient_id).all()
-        doctor_ids = {app.doctor_id for app in all_patient_appointments}
-        messages_with_doctors = Message.query.filter_by(patient_id=patient_id).all()
-        doctor_ids.update({msg.doctor_id for msg in messages_with_doctors})
-
-        conversations = []
-        if doctor_ids:
-            doctors = Doctor.query.filter(Doctor.id.in_(doctor_ids)).all()
-            
-            # Optimized query to get the last message for each conversation
-            subq = db.session.query(
-                Message.doctor_id,
-                func.max(Message.timestamp).label('max_ts')
-            ).filter(
-                Message.patient_id == patient_id,
-                Message.doctor_id.in_(doctor_ids)
-            ).group_by(Message.doctor_id).subquery()
-
-            last_messages_q = db.session.query(Message).join(
-                subq,
-                db.and_(Message.doctor_id == subq.c.doctor_id, Message.timestamp == subq.c.max_ts)
-            )
-            last_messages_map = {msg.doctor_id: msg for msg in last_messages_q.all()}
-            
-            for doc in doctors:
-                # Count unread messages from this doctor
-                unread_count = Message.query.filter_by(
-                    patient_id=patient_id, 
-                    doctor_id=doc.id, 
-                    is_read=False, 
-                    sender_type='doctor'
-                ).count()
-                can_message = patient.can_message_doctor(doc.id)
-                conversations.append({
-                    'doctor': doc,
-                    'last_message': last_messages_map.get(doc.id),
-                    'unread_count': unread_count,
-                    'can_message': can_message
-                })
-            
-            # Sort conversations by last message time, descending
-            conversations.sort(key=lambda x: x['last_message'].timestamp if x['last_message'] else datetime.min, reverse=True)
+        # Every doctor the patient has an appointment with or has messaged, not just the filtered ones
+        conversations = patient_conversations(patient_id)
         # --- End: Logic to get all doctors for conversations ---
 
         return render_template('my_appointments.html', appointments=appointments, reviewed_doctor_ids=reviewed_doctor_ids, conversations=conversations, status_filter=status_filter, view_filter=view_filter, now=now)
@@ -602,8 +526,17 @@ def setup_routes(app):
                 if all_nearby_locations:
                     query = query.filter(Doctor.location.in_(list(all_nearby_locations)))
             
-            # 3. Execute the query and get results
-            results = query.order_by(Doctor.rating.desc()).all()
+            # 3. Execute the query and get results, doctors with the soonest free slot first.
+            # Like browse_doctors, everyone else is ranked by rating alone: their
+            # next_available_at is NULL or in the past, so it says nothing.
+            now = datetime.now()
+            is_available = Doctor.next_available_at > now
+            results = query.order_by(
+                case((is_available, 0), else_=1),
+                case((is_available, Doctor.next_available_at)).asc(),
+                func.coalesce(Doctor.rating, 0.0).desc(),
+                Doctor.id.asc()
+            ).all()
             
             # 4. Provide feedback if no results were found
             if not results and (final_symptom or final_locations):
@@ -646,6 +579,23 @@ def setup_routes(app):
         suggestions = get_location_suggestions(query)
         return jsonify(suggestions)
 
+    @app.route('/healthz')
+    def healthz():
+        """
+        Liveness probe. Always returns 200 while the process can serve requests,
+        along with the AI warm-up state and per-phase load timings.
+        """
+        return jsonify({'status': 'ok', 'warmup': get_warmup_state(), 'specialist_cache': get_specialist_cache_stats()})
+
+    @app.route('/readyz')
+    def readyz():
+        """
+        Readiness probe. Returns 503 until the warm-up has finished (successfully or in
+        degraded keyword-fallback mode), so load balancers can hold traffic back.
+        """
+        state = get_warmup_state()
+        return jsonify({'ready': state['ready'], 'warmup': state}), (200 if state['ready'] else 503)
+
     @app.route("/about")
     def about():
         return render_template("about.html")
@@ -677,59 +627,27 @@ def setup_routes(app):
     def list_conversations():
         patient_id = session['patient_id']
         
-        # Find all doctors the patient has had an appointment with
-        appointments = Appointment.query.filter_by(user_id=patient_id).all()
-        doctor_ids = {app.doctor_id for app in appointments}
-        
-        # Also include doctors they have messaged
-        messages_with_doctors = Message.query.filter_by(patient_id=patient_id).all()
-        doctor_ids.update({msg.doctor_id for msg in messages_with_doctors})
-
-        if not doctor_ids:
-            return render_template('conversations.html', conversations=[])
-
-        doctors = Doctor.query.filter(Doctor.id.in_(doctor_ids)).all()
-        
-        # Optimized query to get the last message for each conversation
-        subq = db.session.query(
-            Message.doctor_id,
-            func.max(Message.timestamp).label('max_ts')
-        ).filter(
-            Message.patient_id == patient_id,
-            Message.doctor_id.in_(doctor_ids)
-        ).group_by(Message.doctor_id).subquery()
-
-        last_messages_q = db.session.query(Message).join(
-            subq,
-            db.and_(Message.doctor_id == subq.c.doctor_id, Message.timestamp == subq.c.max_ts)
-        )
-        last_messages_map = {msg.doctor_id: msg for msg in last_messages_q.all()}
-        
-        conversations = []
-        for doc in doctors:
-            conversations.append({
-                'doctor': doc,
-                'last_message': last_messages_map.get(doc.id)
-            })
-        
-        # Sort conversations by last message time, descending
-        conversations.sort(key=lambda x: x['last_message'].timestamp if x['last_message'] else datetime.min, reverse=True)
-
+        conversations = patient_conversations(patient_id)
         return render_template('conversations.html', conversations=conversations)
 
     @app.route('/messages/<int:doctor_id>', methods=['GET', 'POST'])
     @login_required
     def conversation(doctor_id):
         patient_id = session['patient_id']
-        patient = Patient.query.get(patient_id)
+        patient = get_current_patient()
         doctor = Doctor.query.get_or_404(doctor_id)
         back_url = request.args.get('back_url') or url_for('my_appointments')
 
         can_message = patient.can_message_doctor(doctor_id)
 
         if request.method == 'POST':
+            # The chat page posts with fetch() and asks for JSON; a plain form post gets the page.
+            as_json = wants_json_response()
             if not can_message:
-                flash("Messaging is disabled as the follow-up period for your last appointment has ended. Please book a new appointment to re-enable messaging.", "warning")
+                warning = "Messaging is disabled as the follow-up period for your last appointment has ended. Please book a new appointment to re-enable messaging."
+                if as_json:
+                    return jsonify({'error': warning}), 403
+                flash(warning, "warning")
                 return redirect(url_for('conversation', doctor_id=doctor_id, back_url=back_url))
 
             content = request.form.get('content')
@@ -737,19 +655,47 @@ def setup_routes(app):
                 message = Message(patient_id=patient_id, doctor_id=doctor_id, sender_type='patient', content=content)
                 db.session.add(message)
                 db.session.commit()
+                if as_json:
+                    return jsonify(message_payload(message)), 201
+            if as_json:
+                return jsonify({'error': 'Message is empty.'}), 400
             return redirect(url_for('conversation', doctor_id=doctor_id, back_url=back_url))
 
         # Mark messages from this doctor as read upon opening the chat
-        Message.query.filter_by(
-            patient_id=patient_id, 
-            doctor_id=doctor_id, 
-            sender_type='doctor', 
-            is_read=False
-        ).update({Message.is_read: True})
-        db.session.commit()
+        if mark_conversation_read(patient_id, doctor_id, reader='patient'):
+            db.session.commit()
 
-        messages = Message.query.filter_by(patient_id=patient_id, doctor_id=doctor_id).order_by(Message.timestamp.asc()).all()
-        return render_template('conversation.html', doctor=doctor, messages=messages, back_url=back_url, can_message=can_message)
+        messages, older_cursor = message_page(patient_id, doctor_id)
+        return render_template('conversation.html', doctor=doctor, messages=messages, older_cursor=older_cursor,
+                               back_url=back_url, can_message=can_message)
+
+    @app.route('/messages/<int:doctor_id>/history')
+    @login_required
+    def conversation_history(doctor_id):
+        """The page of messages before ?before=<cursor>, for the chat's "Load older messages" button."""
+        messages, older_cursor = message_page(session['patient_id'], doctor_id, before=request.args.get('before'))
+        return jsonify({'messages': [message_payload(msg) for msg in messages], 'older_cursor': older_cursor})
+
+    @app.route('/messages/<int:doctor_id>/updates')
+    @login_required
+    def conversation_updates(doctor_id):
+        """Messages newer than ?after=<id>, polled by open chats (unless MESSAGE_STREAM_ENABLED)."""
+        after_id = request.args.get('after', 0, type=int)
+        return jsonify({'messages': fetch_new_messages(session['patient_id'], doctor_id, 'patient', after_id)})
+
+    @app.route('/messages/<int:doctor_id>/stream')
+    @login_required
+    def conversation_stream(doctor_id):
+        if not current_app.config.get('MESSAGE_STREAM_ENABLED', False):
+            abort(404) # Streams would tie up a sync worker; chats poll /updates instead
+        after_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', 0, type=int)
+        events = conversation_events(
+            session['patient_id'], doctor_id, 'patient', after_id,
+            poll_seconds=current_app.config.get('MESSAGE_STREAM_POLL_SECONDS', 2),
+            max_seconds=current_app.config.get('MESSAGE_STREAM_MAX_SECONDS', 30)
+        )
+        return Response(stream_with_context(events), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     # Hospital Services
     @app.route('/hospital_finding')
@@ -768,7 +714,7 @@ def setup_routes(app):
             flash("Please login first!", "danger")
             return redirect(url_for("login"))
 
-        patient = Patient.query.get(session["patient_id"])
+        patient = get_current_patient(full=True)
 
         if request.method == "POST":
             # Update text fields
@@ -786,10 +732,10 @@ def setup_routes(app):
             if "image" in request.files:
                 file = request.files["image"]
                 if file and file.filename != "":
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                    file.save(filepath)
-                    patient.image = f"uploads/{filename}"  # store relative path
+                    try:
+                        patient.image, patient.image_variants = store_image(app.config["UPLOAD_FOLDER"], file.stream)
+                    except InvalidImageError as e:
+                        flash(f"Profile image not updated: {e}", "danger")
 
             db.session.commit()
             flash("Profile updated successfully!", "success")
@@ -811,7 +757,7 @@ def setup_routes(app):
         if not check_gmail_app_password():
             return redirect(url_for('user_profile'))
 
-        patient = Patient.query.get(session['patient_id'])
+        patient = get_current_patient()
         if not patient.email:
             flash('Please add an email address to your profile first.', 'warning')
             return redirect(url_for('user_profile'))
@@ -825,21 +771,11 @@ def setup_routes(app):
         session['email_verification_otp'] = otp
         session['email_to_verify'] = patient.email
 
-        # Send email with OTP
-        msg = MailMessage('Verify Your Email for CareConnect',
-                          sender=app.config['MAIL_USERNAME'],
-                          recipients=[patient.email])
-        msg.body = f'Your CareConnect email verification OTP is: {otp}'
-        try:
-            mail.send(msg)
-            flash(f'An OTP has been sent to {patient.email}. Please check your inbox.', 'info')
-        except smtplib.SMTPAuthenticationError as e:
-            error_msg = Markup("Email sending failed due to an authentication error. If using Gmail, please use a 16-character <strong>App Password</strong>. <a href='https://myaccount.google.com/apppasswords' target='_blank' class='alert-link'>Generate one here</a>.")
-            flash(error_msg, "danger")
-            current_app.logger.error(f"SMTPAuthenticationError: {e}. Check MAIL_USERNAME and MAIL_PASSWORD.")
-            if current_app.debug:
-                flash(Markup(f"DEV MODE: Email sending failed. You can <a href='{url_for('dev_bypass_patient_email_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
-            return redirect(url_for('user_profile'))
+        # Queue the email with the OTP; it is sent in the background (see notification_service)
+        enqueue_email(patient.email, 'Verify Your Email for CareConnect', f'Your CareConnect email verification OTP is: {otp}')
+        flash(f'An OTP has been sent to {patient.email}. Please check your inbox.', 'info')
+        if current_app.debug:
+            flash(Markup(f"DEV MODE: If the email doesn't arrive, you can <a href='{url_for('dev_bypass_patient_email_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
 
         return redirect(url_for('verify_email_otp'))
 
@@ -853,7 +789,7 @@ def setup_routes(app):
         if request.method == 'POST':
             submitted_otp = request.form.get('otp')
             if submitted_otp == session.get('email_verification_otp'):
-                patient = Patient.query.get(session['patient_id'])
+                patient = get_current_patient()
                 if patient.email == session.get('email_to_verify'):
                     patient.email_verified = True
                     db.session.commit()
@@ -886,7 +822,7 @@ def setup_routes(app):
             decoded_token = auth.verify_id_token(id_token)
             firebase_phone_number = decoded_token.get('phone_number')
 
-            patient = Patient.query.get(session['patient_id'])
+            patient = get_current_patient()
 
             # Ensure the number from the token matches the number in the user's profile.
             # Firebase numbers are in E.164 format (e.g., +919876543210).
@@ -914,7 +850,7 @@ def setup_routes(app):
         if not current_app.debug:
             return "This feature is only available in development mode.", 404
         
-        patient = Patient.query.get(session['patient_id'])
+        patient = get_current_patient()
         patient.mobile_verified = True
         db.session.commit()
         flash('DEV MODE: Mobile number verification bypassed.', 'success')
@@ -929,7 +865,7 @@ def setup_routes(app):
         if not current_app.debug:
             return "This feature is only available in development mode.", 404
         
-        patient = Patient.query.get(session['patient_id'])
+        patient = get_current_patient()
         patient.email_verified = True
         db.session.commit()
         flash('DEV MODE: Email verification bypassed.', 'success')
@@ -998,18 +934,26 @@ def setup_routes(app):
                 # For now, we'll mark it as 'Pending' and assume payment will be handled.
                 payment_status = 'Pending' # This would become 'Completed' after a successful payment webhook.
 
-            new_appointment = Appointment(
-                user_id=patient_id,
-                doctor_id=doctor_id,
-                appointment_date=appointment_date,
-                consultation_for=consultation_for,
-                consultation_type=consultation_type,
-                reason=reason,
-                payment_method=payment_method,
-                payment_status=payment_status
-            )
-            db.session.add(new_appointment)
-            db.session.commit()
+            # Claims the slot atomically; if another patient got it first, nothing is saved.
+            try:
+                book_appointment(
+                    from_published_slot='appointment_time' in request.form,
+                    user_id=patient_id,
+                    doctor_id=doctor_id,
+                    appointment_date=appointment_date,
+                    consultation_for=consultation_for,
+                    consultation_type=consultation_type,
+                    reason=reason,
+                    payment_method=payment_method,
+                    payment_status=payment_status
+                )
+            except SlotTakenError:
+                flash('Sorry, that time slot was just booked by someone else. Please choose another slot.', 'warning')
+                return redirect(url_for('view_doctor_profile', doctor_id=doctor_id))
+            except OperationalError:
+                current_app.logger.exception("Booking failed after retries")
+                flash('We could not complete your booking right now. Please try again.', 'danger')
+                return redirect(url_for('view_doctor_profile', doctor_id=doctor_id))
 
             flash(f'Appointment requested with {doctor.doctor_name}. You will be notified upon confirmation.', 'success')
             
@@ -1031,7 +975,7 @@ def setup_routes(app):
             flash("The SMS service is not configured. Please contact support.", "danger")
             return redirect(url_for('user_profile'))
 
-        patient = Patient.query.get(session['patient_id'])
+        patient = get_current_patient()
         if not patient.mobile:
             flash('Please add a mobile number to your profile first.', 'warning')
             return redirect(url_for('user_profile'))
@@ -1045,29 +989,12 @@ def setup_routes(app):
         session['patient_mobile_verification_otp'] = otp
         session['patient_mobile_to_verify'] = patient.mobile
 
-        # Send SMS with OTP via Twilio
-        try:
-            current_app.logger.info(f"Attempting to send OTP to patient number: {patient.mobile}")
-            client = Client(current_app.config['TWILIO_ACCOUNT_SID'], current_app.config['TWILIO_AUTH_TOKEN'])
-            message = client.messages.create(
-                body=f"Your CareConnect account mobile verification OTP is: {otp}",
-                from_=current_app.config['TWILIO_PHONE_NUMBER'],
-                to=patient.mobile
-            )
-            flash(f'An OTP has been sent to {patient.mobile}.', 'info')
-        except exceptions.TwilioRestException as e:
-            # Log the specific error from Twilio for debugging
-            current_app.logger.error(f"Twilio API error for patient verification: {e.msg} (Code: {e.code})")
-            flash("Failed to send OTP. Please check your mobile number or try again later.", "danger")
-            if current_app.debug:
-                # In debug mode, show the specific Twilio error to the developer
-                flash(Markup(f"<b>DEV MODE DEBUG:</b> Twilio Error Code {e.code} - {e.msg}. <a href='https://www.twilio.com/docs/api/errors/{e.code}' target='_blank' class='alert-link'>More info here.</a>"), "warning")
-        except Exception as e:
-            current_app.logger.error(f"Twilio failed to send SMS for patient verification: {e}")
-            flash("Failed to send OTP. Please check your mobile number or try again later.", "danger")
-            if current_app.debug:
-                flash(Markup(f"DEV MODE: SMS sending failed. You can <a href='{url_for('dev_bypass_patient_mobile_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
-            return redirect(url_for('user_profile'))
+        # Queue the SMS with the OTP; it is sent in the background via Twilio (see notification_service)
+        current_app.logger.info(f"Queueing OTP for patient number: {patient.mobile}")
+        enqueue_sms(patient.mobile, f"Your CareConnect account mobile verification OTP is: {otp}")
+        flash(f'An OTP has been sent to {patient.mobile}.', 'info')
+        if current_app.debug:
+            flash(Markup(f"DEV MODE: If the SMS doesn't arrive, you can <a href='{url_for('dev_bypass_patient_mobile_verification')}' class='alert-link'>click here to bypass verification</a>."), 'info')
 
         return redirect(url_for('verify_patient_mobile'))
 
@@ -1088,7 +1015,7 @@ def setup_routes(app):
         if request.method == 'POST':
             submitted_otp = request.form.get('otp')
             if submitted_otp == session.get('patient_mobile_verification_otp'):
-                patient = Patient.query.get(session['patient_id'])
+                patient = get_current_patient()
                 if patient.mobile == session.get('patient_mobile_to_verify'):
                     patient.mobile_verified = True
                     db.session.commit()
@@ -0,0 +1,163 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+# --- Autocomplete Index ---
+# Prefix matches come from a sorted array of lower-cased terms, "contains" matches from a
+# suffix array over every term's inner suffixes. Either way the matches for a query are one
+# contiguous range, found with two binary searches. Ranges are in alphabetical order, not
+# display order, so each array also gets a range-minimum index (_RankedRange) that yields a
+# range's display ranks smallest first. A lookup therefore costs time proportional to
+# `limit`, however many terms match a one-letter query.
+
+_SEPARATOR = "\x00"  # Sorts before every printable character, so suffixes never match across terms.
+_BLOCK = 32  # Entries per block in _RankedRange; edge blocks are scanned directly.
+
+
+def _successor(query):
+    """The smallest string greater than every string that starts with `query`."""
+    return query[:-1] + chr(ord(query[-1]) + 1)
+
+
+class _RankedRange:
+    """
+    Range-minimum index over an array of ranks: `ascending(lo, hi)` yields ranks[lo:hi] in
+    increasing order, doing O(_BLOCK) work per value yielded instead of sorting the range.
+    Block minima are combined in a sparse table, so any run of whole blocks is answered
+    with two lookups.
+    """
+
+    def __init__(self, ranks):
+        self.ranks = ranks
+        block_mins = array('i', (min(ranks[i:i + _BLOCK]) for i in range(0, len(ranks), _BLOCK)))
+        self._block_mins = block_mins
+        # _levels[j][b]: the block with the smallest rank among blocks b .. b + 2**j - 1.
+        level = array('i', range(len(block_mins)))
+        self._levels = [level]
+        width = 1
+        while 2 * width <= len(block_mins):
+            level = array('i', (a if block_mins[a] <= block_mins[b] else b for a, b in zip(level, level[width:])))
+            self._levels.append(level)
+            width *= 2
+
+    def _min_block(self, first, last):
+        """The block with the smallest rank among blocks first .. last - 1."""
+        level = self._levels[(last - first).bit_length() - 1]
+        a, b = level[first], level[last - (1 << ((last - first).bit_length() - 1))]
+        return a if self._block_mins[a] <= self._block_mins[b] else b
+
+    def _argmin(self, lo, hi):
+        ranks = self.ranks
+        first, last = -(-lo // _BLOCK), hi // _BLOCK
+        if first >= last:
+            return ranks.index(min(ranks[lo:hi]), lo, hi)
+        block = self._min_block(first, last)
+        best = self._block_mins[block]
+        where = (block * _BLOCK, min((block + 1) * _BLOCK, hi))
+        for edge_lo, edge_hi in ((lo, first * _BLOCK), (last * _BLOCK, hi)):
+            if edge_lo < edge_hi:
+                edge_min = min(ranks[edge_lo:edge_hi])
+                if edge_min < best:
+                    best, where = edge_min, (edge_lo, edge_hi)
+        return ranks.index(best, *where)
+
+    def ascending(self, lo, hi):
+        heap = []
+        if lo < hi:
+            pos = self._argmin(lo, hi)
+            heap.append((self.ranks[pos], pos, lo, hi))
+        while heap:
+            rank, pos, lo, hi = heapq.heappop(heap)
+            yield rank
+            for sub_lo, sub_hi in ((lo, pos), (pos + 1, hi)):
+                if sub_lo < sub_hi:
+                    sub_pos = self._argmin(sub_lo, sub_hi)
+                    heapq.heappush(heap, (self.ranks[sub_pos], sub_pos, sub_lo, sub_hi))
+
+
+class AutocompleteIndex:
+    def __init__(self, terms):
+        """`terms` is the display-ordered list of suggestions; results are returned in that order."""
+        self.terms = list(terms)
+        self._lowered = lowered = [term.lower() for term in self.terms]
+
+        # 1. Prefix index: lower-cased terms sorted alphabetically, with their display rank.
+        prefix_order = sorted(range(len(lowered)), key=lowered.__getitem__)
+        self._prefix_keys = [lowered[i] for i in prefix_order]
+        self._prefix_ranks = _RankedRange(array('i', prefix_order))
+
+        # 2. Substring index: all suffixes that start inside a term (offset >= 1). Suffixes at
+        #    offset 0 are already covered by the prefix index. Suffixes are bucketed by their
+        #    first character and each bucket sorted on its own, so only one bucket's sort keys
+        #    are in memory at a time.
+        self._text = text = _SEPARATOR.join(lowered) + _SEPARATOR
+        buckets = {}
+        offset = 0
+        for term_id, term in enumerate(lowered):
+            for i in range(1, len(term)):
+                positions, owners = buckets.get(term[i]) or buckets.setdefault(term[i], (array('i'), array('i')))
+                positions.append(offset + i)
+                owners.append(term_id)
+            offset += len(term) + 1
+
+        self._suffix_positions = suffix_positions = array('i')
+        suffix_owners = array('i')
+        for first_char in sorted(buckets):
+            positions, owners = buckets.pop(first_char)
+            keys = [text[p:text.index(_SEPARATOR, p)] for p in positions]
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            del keys
+            suffix_positions.extend(map(positions.__getitem__, order))
+            suffix_owners.extend(map(owners.__getitem__, order))
+        self._suffix_ranks = _RankedRange(suffix_owners)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _prefix_matches(self, query):
+        keys = self._prefix_keys
+        return self._prefix_ranks.ascending(bisect_left(keys, query), bisect_left(keys, _successor(query)))
+
+    def _suffix_lower_bound(self, query):
+        text, positions, width = self._text, self._suffix_positions, len(query)
+        lo, hi = 0, len(positions)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if text[positions[mid]:positions[mid] + width] < query:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _contains_matches(self, query, exclude):
+        seen = set(exclude)
+        for term_id in self._suffix_ranks.ascending(self._suffix_lower_bound(query), self._suffix_lower_bound(_successor(query))):
+            # A term containing the query twice comes up once per occurrence; terms that also
+            # start with the query belong to the prefix results.
+            if term_id not in seen:
+                seen.add(term_id)
+                if not self._lowered[term_id].startswith(query):
+                    yield term_id
+
+    def search_groups(self, query, limit=10):
+        """
+        Returns (terms starting with the query, terms only containing it), each in display
+        order, with at most `limit` terms in total. Lets callers merge several indexes.
+        """
+        query = query.lower()
+        if not query or limit <= 0:
+            return [], []
+        starts_with = list(islice(self._prefix_matches(query), limit))
+        contains = []
+        if len(starts_with) < limit:
+            contains = list(islice(self._contains_matches(query, starts_with), limit - len(starts_with)))
+        return [self.terms[i] for i in starts_with], [self.terms[i] for i in contains]
+
+    def search(self, query, limit=10):
+        """
+        Returns up to `limit` terms: those starting with the query first, then those
+        containing it. Each group keeps the display order of the original term list.
+        """
+        starts_with, contains = self.search_groups(query, limit)
+        return starts_with + contains
@@ -0,0 +1,240 @@
+from datetime import datetime, timedelta
+from itertools import chain
+import numpy as np
+from flask import g, has_app_context
+from sqlalchemy import event, inspect, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.extension import db
+from app.models import AvailabilityBitmap, Doctor, Slot
+
+# --- Availability Engine ---
+# One place that answers "which slots are still free for these doctors in this window".
+# Free slots are read from the slots table with a plain range predicate on start_at (so
+# the database can use its index) and come back in the nested slot-JSON shape the
+# templates already render: {'online': {'YYYY-MM-DD': ['HH:MM', ...]}, 'in-person': {...}}.
+# Results are memoized on `g`, so several callers in one request share one query.
+#
+# For ranking many doctors at once, each doctor's free slots are also kept as one bitmap per
+# day (availability_bitmaps, one bit per minute). Whenever slots are added, removed, booked
+# or released, the same flush rebuilds the bitmaps of the days it touched, then derives
+# Doctor.next_available_at and Doctor.free_slots_7d from the doctor's bitmaps with vectorized
+# bit operations. Those columns let search pages order, filter ("available within N days")
+# and paginate by availability in SQL. Slots passing their start time don't flush anything,
+# so `flask sweep-availability` recomputes every doctor from the bitmaps periodically.
+
+FREE_SLOTS_WINDOW = timedelta(days=7)
+SWEEP_CHUNK_SIZE = 500
+MINUTES_PER_DAY = 24 * 60
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+
+def _current_minute():
+    # Slots are minute-aligned, so truncating keeps results identical and lets calls in one request share the memo.
+    return datetime.now().replace(second=0, microsecond=0)
+
+
+def _request_memo(start, end):
+    if not has_app_context():
+        return {}
+    memo = g.setdefault('_availability_memo', {})
+    return memo.setdefault((start, end), {})
+
+
+def get_free_slots(doctor_ids, start=None, end=None):
+    """
+    Returns {doctor_id: {consultation_type: {date_str: [time_str, ...]}}} with every free
+    slot after `start` and before `end`. `start` defaults to now; `end=None` means no upper bound.
+    Doctors without free slots map to {}. The returned dicts are shared; don't mutate them.
+    """
+    start = start or _current_minute()
+    memo = _request_memo(start, end)
+    missing = {doctor_id for doctor_id in doctor_ids if doctor_id not in memo}
+    if missing:
+        query = db.session.query(Slot.doctor_id, Slot.consultation_type, Slot.start_at).filter(
+            Slot.doctor_id.in_(list(missing)),
+            Slot.start_at > start,
+            Slot.appointment_id.is_(None)
+        )
+        if end is not None:
+            query = query.filter(Slot.start_at < end)
+        for doctor_id in missing:
+            memo[doctor_id] = {}
+        date_keys = {} # Each date is formatted once, not once per slot
+        for doctor_id, consult_type, start_at in query.order_by(Slot.start_at):
+            day = start_at.date()
+            date_str = date_keys.get(day) or date_keys.setdefault(day, day.isoformat())
+            day_slots = memo[doctor_id].setdefault(consult_type, {})
+            day_slots.setdefault(date_str, []).append(f"{start_at.hour:02d}:{start_at.minute:02d}")
+    return {doctor_id: memo[doctor_id] for doctor_id in doctor_ids}
+
+
+def get_weekly_slots(doctor_id, days=7, now=None):
+    """Free slots from now until the end of the `days`-day window, as {date_str: {consultation_type: [times]}}."""
+    now = now or _current_minute()
+    window_end = datetime.combine(now.date() + timedelta(days=days), datetime.min.time())
+    weekly_slots = {}
+    for consult_type, date_slots in get_free_slots([doctor_id], now, window_end)[doctor_id].items():
+        for date_str, times in date_slots.items():
+            weekly_slots.setdefault(date_str, {})[consult_type] = times
+    return weekly_slots
+
+
+# --- Availability Bitmaps ---
+
+def _minute_of_day(moment):
+    return moment.hour * 60 + moment.minute
+
+
+def build_day_bitmap(start_times):
+    """Packs a day's free slot start times into BITMAP_BYTES bytes."""
+    cells = np.zeros(MINUTES_PER_DAY, dtype=bool)
+    cells[[_minute_of_day(start_at) for start_at in start_times]] = True
+    return np.packbits(cells).tobytes()
+
+
+def _free_starts_by_day(connection, doctor_id, start, end):
+    slots = Slot.__table__
+    free_starts = {}
+    for (start_at,) in connection.execute(
+        db.select(slots.c.start_at).where(
+            slots.c.doctor_id == doctor_id,
+            slots.c.start_at >= start,
+            slots.c.start_at < end,
+            slots.c.appointment_id.is_(None)
+        )
+    ):
+        free_starts.setdefault(start_at.date(), []).append(start_at)
+    return free_starts
+
+
+def refresh_day_bitmaps(connection, doctor_days):
+    """Rebuilds the bitmaps for the given {(doctor_id, day), ...} from the slots table."""
+    bitmaps = AvailabilityBitmap.__table__
+    days_by_doctor = {}
+    for doctor_id, day in doctor_days:
+        days_by_doctor.setdefault(doctor_id, set()).add(day)
+
+    for doctor_id, days in days_by_doctor.items():
+        free_starts = _free_starts_by_day(
+            connection, doctor_id,
+            datetime.combine(min(days), datetime.min.time()),
+            datetime.combine(max(days) + timedelta(days=1), datetime.min.time())
+        )
+        connection.execute(bitmaps.delete().where(bitmaps.c.doctor_id == doctor_id, bitmaps.c.day.in_(list(days))))
+        rows = [
+            {'doctor_id': doctor_id, 'day': day, 'bits': build_day_bitmap(starts)}
+            for day, starts in free_starts.items() if day in days
+        ]
+        if rows:
+            connection.execute(bitmaps.insert(), rows)
+
+
+def summarize_bitmaps(rows, now, window=FREE_SLOTS_WINDOW):
+    """
+    From (doctor_id, day, bits) rows, returns {doctor_id: (next_free_at, free_in_window)}: the
+    first free start time after `now` (or None) and the number of free start times between
+    `now` and `now + window`. Vectorized over all rows at once; doctors without rows are left out.
+    """
+    if not rows:
+        return {}
+    today = now.date()
+    doctor_column = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    day_start = np.fromiter(((row[1] - today).days * MINUTES_PER_DAY for row in rows), dtype=np.int64, count=len(rows))
+    packed = np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint8).reshape(len(rows), BITMAP_BYTES)
+    cells = np.unpackbits(packed, axis=1).astype(bool)
+
+    # Minute offsets from today's midnight: a slot counts if now < start (< now + window).
+    minute = np.arange(MINUTES_PER_DAY)
+    now_minute = _minute_of_day(now)
+    window_minutes = int(window.total_seconds() // 60)
+    upcoming = cells & (minute >= (now_minute + 1 - day_start)[:, None])
+    in_window = upcoming & (minute < (now_minute + window_minutes - day_start)[:, None])
+
+    never = np.iinfo(np.int64).max
+    first = np.where(upcoming.any(axis=1), day_start + upcoming.argmax(axis=1), never)
+    doctors, owner = np.unique(doctor_column, return_inverse=True)
+    earliest = np.full(len(doctors), never, dtype=np.int64)
+    np.minimum.at(earliest, owner, first)
+    counts = np.zeros(len(doctors), dtype=np.int64)
+    np.add.at(counts, owner, in_window.sum(axis=1))
+
+    midnight = datetime.combine(today, datetime.min.time())
+    return {
+        int(doctor_id): (midnight + timedelta(minutes=int(offset)) if offset != never else None, int(count))
+        for doctor_id, offset, count in zip(doctors, earliest, counts)
+    }
+
+
+# --- Derived Doctor Columns ---
+
+def refresh_doctor_availability(connection, doctor_ids, now=None, session=None):
+    """
+    Recomputes next_available_at and free_slots_7d for the given doctors from their
+    availability bitmaps. If a session is given, loaded Doctor objects get the new values too.
+    """
+    now = now or _current_minute()
+    bitmaps = AvailabilityBitmap.__table__
+    doctors = Doctor.__table__
+    doctor_ids = list(doctor_ids)
+    for i in range(0, len(doctor_ids), SWEEP_CHUNK_SIZE):
+        chunk = doctor_ids[i:i + SWEEP_CHUNK_SIZE]
+        summary = summarize_bitmaps(connection.execute(
+            db.select(bitmaps.c.doctor_id, bitmaps.c.day, bitmaps.c.bits)
+            .where(bitmaps.c.doctor_id.in_(chunk), bitmaps.c.day >= now.date())
+        ).all(), now)
+        values = [
+            {'doctor': doctor_id, 'next_at': next_at, 'week_count': week_count}
+            for doctor_id in chunk
+            for next_at, week_count in [summary.get(doctor_id, (None, 0))]
+        ]
+        connection.execute(
+            doctors.update().where(doctors.c.id == bindparam('doctor')).values(
+                next_available_at=bindparam('next_at'), free_slots_7d=bindparam('week_count')
+            ),
+            values
+        )
+        if session is not None:
+            for row in values:
+                doctor = session.identity_map.get(session.identity_key(Doctor, row['doctor']))
+                if doctor is not None:
+                    set_committed_value(doctor, 'next_available_at', row['next_at'])
+                    set_committed_value(doctor, 'free_slots_7d', row['week_count'])
+    return len(doctor_ids)
+
+
+def sweep_doctor_availability(now=None):
+    """
+    Refreshes every doctor that had a free slot at the last refresh, dropping slots that have
+    started since and counting slots that entered the 7-day window. Bitmaps of past days are
+    deleted. Commits.
+    """
+    now = now or _current_minute()
+    doctor_ids = [doctor_id for (doctor_id,) in db.session.query(Doctor.id).filter(Doctor.next_available_at.isnot(None))]
+    refresh_doctor_availability(db.session.connection(), doctor_ids, now=now, session=db.session)
+    db.session.execute(db.delete(AvailabilityBitmap).where(AvailabilityBitmap.day < now.date()))
+    db.session.commit()
+    return len(doctor_ids)
+
+
+def refresh_slot_availability(doctor_id, start_at):
+    """For a slot changed with Core statements, which the flush hook below doesn't see."""
+    refresh_day_bitmaps(db.session.connection(), {(doctor_id, start_at.date())})
+    refresh_doctor_availability(db.session.connection(), [doctor_id], session=db.session)
+
+
+def _refresh_availability_after_flush(session, flush_context):
+    doctor_days = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Slot) or obj.doctor_id is None or obj.start_at is None:
+            continue
+        doctor_days.add((obj.doctor_id, obj.start_at.date()))
+        for previous_start in inspect(obj).attrs.start_at.history.deleted or ():
+            doctor_days.add((obj.doctor_id, previous_start.date()))
+    if doctor_days:
+        connection = session.connection()
+        refresh_day_bitmaps(connection, doctor_days)
+        refresh_doctor_availability(connection, {doctor_id for doctor_id, _ in doctor_days}, session=session)
+
+# Slot edits (manage_slots), bookings and cancellations all flush Slot rows through the ORM.
+event.listen(Session, 'after_flush', _refresh_availability_after_flush)
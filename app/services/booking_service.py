@@ -0,0 +1,51 @@
+import random
+import time
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.extension import db
+from app.models import Appointment
+from app.services.slot_service import claim_appointment_slot, is_slot_conflict
+
+# --- Booking Engine ---
+# Creating an appointment and claiming its slot happen in one short transaction: the slot
+# is claimed with a compare-and-swap UPDATE (or, for free-form times, guarded by the slots
+# unique constraint), so when two patients pick the same slot exactly one booking commits
+# and the other gets SlotTakenError. Transient lock errors (deadlocks, lock wait timeouts,
+# SQLite's "database is locked") are retried with a short jittered backoff.
+
+MAX_BOOKING_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.05
+
+
+class SlotTakenError(Exception):
+    """The requested slot was booked by someone else first (or is no longer offered)."""
+
+
+def book_appointment(from_published_slot=True, max_attempts=MAX_BOOKING_ATTEMPTS, **appointment_fields):
+    """
+    Creates and commits an Appointment only if its slot can be claimed.
+    `from_published_slot=False` allows times the doctor didn't publish (the datetime picker
+    shown for doctors without slots). Raises SlotTakenError if the slot is gone.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            appointment = Appointment(**appointment_fields)
+            db.session.add(appointment)
+            db.session.flush()
+            if not claim_appointment_slot(appointment, allow_unpublished=not from_published_slot):
+                raise SlotTakenError()
+            db.session.commit()
+            return appointment
+        except SlotTakenError:
+            db.session.rollback()
+            raise
+        except IntegrityError as e:
+            # Only the slot's unique constraint means "taken"; anything else is a real error.
+            db.session.rollback()
+            if not is_slot_conflict(e):
+                raise
+            raise SlotTakenError() from e
+        except OperationalError:
+            db.session.rollback()
+            if attempt == max_attempts:
+                raise
+            time.sleep(RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
@@ -0,0 +1,210 @@
+import json
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, and_, or_
+from app.extension import db
+from app.models import Appointment, ConversationUnread, Doctor, Message, Patient, MESSAGING_FOLLOW_UP_DAYS
+from app.services.unread_service import RECIPIENTS, mark_conversation_read
+
+# --- Conversation Summaries ---
+# Builds the conversation lists for both sides of the messaging feature: the other party,
+# the last message, the unread count (from the counters kept by unread_service) and whether
+# messaging is still allowed. Every piece is fetched for all conversations at once with
+# grouped queries, so a list costs the same handful of queries whether it has 3
+# conversations or 300.
+
+
+def messaging_eligibility(patient_ids, doctor_ids, now=None):
+    """
+    Bulk version of Patient.can_message_doctor(). Returns the set of (patient_id, doctor_id)
+    pairs with an upcoming appointment or a completed one within the follow-up period.
+    """
+    patient_ids, doctor_ids = list(patient_ids), list(doctor_ids)
+    if not patient_ids or not doctor_ids:
+        return set()
+    now = now or datetime.now()
+    pair_filter = (Appointment.user_id.in_(patient_ids), Appointment.doctor_id.in_(doctor_ids))
+
+    upcoming = db.session.query(Appointment.user_id, Appointment.doctor_id).filter(
+        *pair_filter,
+        Appointment.status.in_(['Pending', 'Confirmed']),
+        Appointment.appointment_date > now
+    ).distinct()
+    recently_completed = db.session.query(Appointment.user_id, Appointment.doctor_id).filter(
+        *pair_filter,
+        Appointment.status == 'Completed'
+    ).group_by(Appointment.user_id, Appointment.doctor_id).having(
+        func.max(Appointment.appointment_date) >= now - timedelta(days=MESSAGING_FOLLOW_UP_DAYS)
+    )
+    return {(patient_id, doctor_id) for patient_id, doctor_id in upcoming.union(recently_completed).all()}
+
+
+def doctor_conversations(doctor_id, limit=None):
+    """
+    Summaries of a doctor's conversations, most recent first:
+    [{'patient', 'last_message', 'unread_count', 'can_message'}, ...]
+    """
+    # The highest id is the latest message; unlike max(timestamp) it can't match two rows.
+    last_message_ids = db.session.query(func.max(Message.id)).filter(
+        Message.doctor_id == doctor_id
+    ).group_by(Message.patient_id)
+    last_messages_q = Message.query.filter(Message.id.in_(last_message_ids)).order_by(
+        Message.timestamp.desc(), Message.id.desc()
+    )
+    if limit:
+        last_messages_q = last_messages_q.limit(limit)
+    last_messages = last_messages_q.all()
+    if not last_messages:
+        return []
+
+    patient_ids = [msg.patient_id for msg in last_messages]
+    patients = {patient.id: patient for patient in Patient.query.filter(Patient.id.in_(patient_ids))}
+    unread_counts = dict(db.session.query(ConversationUnread.patient_id, ConversationUnread.doctor_unread).filter(
+        ConversationUnread.doctor_id == doctor_id,
+        ConversationUnread.patient_id.in_(patient_ids)
+    ).all())
+    eligible = messaging_eligibility(patient_ids, [doctor_id])
+
+    return [{
+        'patient': patients[msg.patient_id],
+        'last_message': msg,
+        'unread_count': unread_counts.get(msg.patient_id, 0),
+        'can_message': (msg.patient_id, doctor_id) in eligible
+    } for msg in last_messages if msg.patient_id in patients]
+
+
+def patient_conversations(patient_id):
+    """
+    Summaries of a patient's conversations: every doctor they have an appointment with or
+    have messaged, most recent message first:
+    [{'doctor', 'last_message', 'unread_count', 'can_message'}, ...]
+    """
+    doctor_ids_q = db.session.query(Appointment.doctor_id).filter(Appointment.user_id == patient_id).union(
+        db.session.query(Message.doctor_id).filter(Message.patient_id == patient_id)
+    )
+    doctor_ids = [doctor_id for (doctor_id,) in doctor_ids_q.all()]
+    if not doctor_ids:
+        return []
+
+    doctors = Doctor.query.filter(Doctor.id.in_(doctor_ids)).all()
+    last_message_ids = db.session.query(func.max(Message.id)).filter(
+        Message.patient_id == patient_id
+    ).group_by(Message.doctor_id)
+    last_messages = {msg.doctor_id: msg for msg in Message.query.filter(Message.id.in_(last_message_ids))}
+    unread_counts = dict(db.session.query(ConversationUnread.doctor_id, ConversationUnread.patient_unread).filter(
+        ConversationUnread.patient_id == patient_id
+    ).all())
+    eligible = messaging_eligibility([patient_id], doctor_ids)
+
+    conversations = [{
+        'doctor': doctor,
+        'last_message': last_messages.get(doctor.id),
+        'unread_count': unread_counts.get(doctor.id, 0),
+        'can_message': (patient_id, doctor.id) in eligible
+    } for doctor in doctors]
+    # Sort conversations by last message time, descending
+    conversations.sort(key=lambda x: x['last_message'].timestamp if x['last_message'] else datetime.min, reverse=True)
+    return conversations
+
+
+# --- Thread Pages ---
+# A chat renders only the latest MESSAGE_PAGE_SIZE messages; older ones are fetched a page at
+# a time with a keyset cursor on (timestamp, id), which ix_messages_patient_doctor_timestamp_id
+# serves directly. A page costs the same however long the thread is.
+
+MESSAGE_PAGE_SIZE = 50
+
+
+def encode_message_cursor(message):
+    """Cursor for the page before `message`: '<timestamp>~<id>'."""
+    return f"{message.timestamp.isoformat()}~{message.id}"
+
+
+def decode_message_cursor(token):
+    try:
+        timestamp, message_id = token.split('~')
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (AttributeError, ValueError):
+        return None # Missing or malformed cursor: start from the latest messages
+
+
+def message_page(patient_id, doctor_id, before=None, limit=MESSAGE_PAGE_SIZE):
+    """
+    Returns (messages, older_cursor): up to `limit` messages of the conversation that come
+    before the `before` cursor (the latest ones if it is None), oldest first, and the cursor
+    for the page before those, or None if there is nothing older.
+    """
+    query = Message.query.filter(Message.patient_id == patient_id, Message.doctor_id == doctor_id)
+    position = decode_message_cursor(before) if before else None
+    if position:
+        timestamp, message_id = position
+        query = query.filter(or_(
+            Message.timestamp < timestamp,
+            and_(Message.timestamp == timestamp, Message.id < message_id)
+        ))
+    messages = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    older_cursor = encode_message_cursor(messages[limit - 1]) if len(messages) > limit else None
+    messages = messages[:limit]
+    messages.reverse()
+    return messages, older_cursor
+
+
+# --- Incremental Thread Updates ---
+# An open chat only ever asks for messages newer than the last one it has (by id), either
+# by polling the JSON endpoint or, with MESSAGE_STREAM_ENABLED, through the Server-Sent Events
+# stream, so an update costs a few bytes instead of re-rendering the whole thread. A stream
+# occupies its worker while open, so it is only enabled for gevent/gthread deployments.
+
+def message_payload(message):
+    return {
+        'id': message.id,
+        'sender_type': message.sender_type,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(timespec='seconds') if message.timestamp else None,
+    }
+
+
+def messages_after(patient_id, doctor_id, after_id=0):
+    """The conversation's messages with an id greater than `after_id`, oldest first."""
+    return Message.query.filter(
+        Message.patient_id == patient_id,
+        Message.doctor_id == doctor_id,
+        Message.id > (after_id or 0)
+    ).order_by(Message.id).all()
+
+
+def fetch_new_messages(patient_id, doctor_id, reader, after_id=0):
+    """
+    New messages for an open chat as payload dicts. Messages `reader` received are marked
+    read, committing only if something was actually marked.
+    """
+    messages = messages_after(patient_id, doctor_id, after_id)
+    if any(msg.sender_type == RECIPIENTS[reader] and not msg.is_read for msg in messages):
+        if mark_conversation_read(patient_id, doctor_id, reader):
+            db.session.commit()
+    return [message_payload(msg) for msg in messages]
+
+
+def conversation_events(patient_id, doctor_id, reader, after_id=0, poll_seconds=2.0, max_seconds=30):
+    """
+    Server-Sent Events for one conversation: an `event: message` frame per new message (with
+    the message id as the event id, so a reconnecting browser resumes via Last-Event-ID) and a
+    comment line on quiet polls. Ends after `max_seconds`; EventSource then reconnects, so a
+    stream never holds a worker for long.
+    """
+    deadline = time.monotonic() + max_seconds
+    yield f"retry: {int(poll_seconds * 1000)}\n\n"
+    while True:
+        new_messages = fetch_new_messages(patient_id, doctor_id, reader, after_id)
+        # End the transaction and hand the connection back while sleeping; the next poll
+        # then also sees rows committed in the meantime.
+        db.session.close()
+        if new_messages:
+            after_id = new_messages[-1]['id']
+            for payload in new_messages:
+                yield f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload)}\n\n"
+        else:
+            yield ": keep-alive\n\n"
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(poll_seconds)
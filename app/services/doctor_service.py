@@ -1,13 +1,25 @@
 import os
+import copy
 import json
+import queue
 import random
-from sentence_transformers import SentenceTransformer, util
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
 import spacy
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload
+from flask import current_app
+from sqlalchemy import func, event
+from sqlalchemy.orm import Session, joinedload, object_session
 import numpy as np
 from app.extension import db
-from app.models import Doctor, Specialty, Symptom, Location, LocationAlias
+from app.models import Doctor, Specialty, Symptom, Location, LocationAlias, SearchHistory
+from app.services.embedding_index import load_symptom_index
+from app.services.vector_search import build_search_backend
+from app.services.cache import LRUCache
+from app.services.autocomplete_index import AutocompleteIndex
+from app.services.location_matcher import LocationMatcher
+from app.services.location_graph import LocationGraph
 import re
 
 # --- AI Model & Data Caching ---
@@ -16,64 +28,350 @@ nlp_ner = None
 semantic_model = None
 AI_MODELS_LOADED = False
 SEMANTIC_DATA = {}
-AUTOCOMPLETE_DATA = {"all": [], "locations": []}
-
-def load_service_data():
+# "terms" holds symptoms and specialties, "locations" location names and aliases; general
+# suggestions merge the two, so a location change only rebuilds the small location index.
+AUTOCOMPLETE_DATA = {"terms": [], "locations": []}
+AUTOCOMPLETE_INDEX = {"terms": AutocompleteIndex([]), "locations": AutocompleteIndex([])}
+LOCATION_MATCHER = LocationMatcher({})
+LOCATION_GRAPH = LocationGraph([], [])
+# Tracks when the location-derived data above was last checked against the tables, the
+# tables' signature at that point, and whether they changed since (in this process).
+LOCATION_DATA_STATE = {"checked_at": None, "signature": None, "stale": False}
+_LOCATION_REFRESH_LOCK = threading.Lock()
+EMBEDDING_BATCHER = None
+SPACY_EXCLUDED_PIPES = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+# Caches the full map_disease_to_specialist() result, keyed on the normalized search term.
+SPECIALIST_CACHE = LRUCache(max_size=2048, ttl_seconds=3600)
+
+class EmbeddingBatcher:
     """
-    Loads AI models and data from the database into memory at application start.
-    This is a one-time operation called from the app factory.
+    Coalesces single-query embedding requests from concurrent requests into one model call.
+    A background thread collects queries for up to `max_wait_ms` milliseconds (or until
+    `max_batch_size` queries are waiting), encodes them as one batch and hands each caller
+    its own normalized vector.
     """
-    global AI_MODELS_LOADED, SEMANTIC_DATA, AUTOCOMPLETE_DATA, nlp_ner, semantic_model
-    
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def _ensure_worker(self):
+        # Started lazily (and restarted after a fork) so each gunicorn worker gets its own thread.
+        if self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive() or self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def encode(self, text, timeout=30):
+        """Returns the normalized embedding for `text`, blocking until its batch is encoded."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=timeout)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Identical queries in the same batch (e.g. 'fever') are encoded only once.
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = self.model.encode(unique_texts, batch_size=len(unique_texts), convert_to_numpy=True, normalize_embeddings=True)
+                vectors_by_text = dict(zip(unique_texts, vectors))
+                for text, future in batch:
+                    future.set_result(vectors_by_text[text])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+def _encode_query(term):
+    if EMBEDDING_BATCHER is not None:
+        return EMBEDDING_BATCHER.encode(term)
+    return semantic_model.encode(term, convert_to_numpy=True, normalize_embeddings=True)
+
+def _new_warmup_state():
+    phases = {name: {"status": "pending", "seconds": None, "error": None} for name in ("autocomplete", "models", "embeddings")}
+    return {"status": "pending", "started_at": None, "finished_at": None, "phases": phases}
+
+# Tracks start-up progress for the /healthz and /readyz endpoints.
+WARMUP_STATE = _new_warmup_state()
+_WARMUP_LOCK = threading.Lock()
+
+def _run_warmup_phase(name, loader):
+    """Runs one warm-up phase, recording its status and duration. Returns True on success."""
+    phase = WARMUP_STATE["phases"][name]
+    phase["status"] = "running"
+    started = time.perf_counter()
+    try:
+        succeeded = loader()
+    except Exception as e:
+        phase["error"] = str(e)
+        succeeded = False
+    phase["seconds"] = round(time.perf_counter() - started, 3)
+    phase["status"] = "ready" if succeeded else "failed"
+    return succeeded
+
+def _embedding_model_key():
+    """Identifies the embedding model + backend, so each backend gets its own on-disk index."""
+    model_name = current_app.config.get('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+    if current_app.config.get('EMBEDDING_BACKEND', 'sentence-transformers') == 'onnx-int8':
+        return f"{model_name}-onnx-int8"
+    return model_name
+
+def _load_embedding_model():
+    """Loads the embedding model selected by EMBEDDING_BACKEND."""
+    if current_app.config.get('EMBEDDING_BACKEND', 'sentence-transformers') == 'onnx-int8':
+        from app.services.onnx_embedding import OnnxSentenceEncoder
+        return OnnxSentenceEncoder(
+            current_app.config['ONNX_MODEL_DIR'],
+            num_threads=current_app.config.get('ONNX_NUM_THREADS')
+        )
+    # Imported lazily so CPU-only nodes using the ONNX backend don't need torch installed.
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(current_app.config.get('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2'))
+
+def _load_models():
+    global AI_MODELS_LOADED, EMBEDDING_BATCHER, nlp_ner, semantic_model
     try:
-        nlp_ner = spacy.load("en_core_web_sm")
-        semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Query parsing only needs the tokenizer and the NER component (which has its own
+        # tok2vec layer in en_core_web_sm), so the other pipes are never loaded.
+        nlp_ner = spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDED_PIPES)
+        semantic_model = _load_embedding_model()
+        EMBEDDING_BATCHER = EmbeddingBatcher(
+            semantic_model,
+            max_batch_size=current_app.config.get('EMBEDDING_BATCH_SIZE', 32),
+            max_wait_ms=current_app.config.get('EMBEDDING_BATCH_WAIT_MS', 5)
+        )
         AI_MODELS_LOADED = True
-        print("✅ AI models (spaCy, SentenceTransformer) loaded successfully.")
+        print(f"✅ AI models (spaCy, {type(semantic_model).__name__}) loaded successfully.")
+        return True
     except (OSError, ImportError) as e:
         # --- BEGIN IMPROVEMENT: More helpful error message for missing spaCy model ---
         error_message = str(e)
+        WARMUP_STATE["phases"]["models"]["error"] = error_message
         print(f"⚠️ Warning: Could not load AI models. Semantic search will be disabled. Error: {error_message}")
         if "[E050]" in error_message or "[E0550]" in error_message: # Common spaCy model-not-found error codes.
             print("   -> FIX: The spaCy NLP model ('en_core_web_sm') is missing. Run this command in your terminal:")
             print("   -> python -m spacy download en_core_web_sm")
         # --- END IMPROVEMENT ---
-        return
+        return False
 
-    # Pre-compute embeddings for semantic search
+def _load_embeddings():
+    """Loads (or incrementally builds) the memory-mapped symptom embedding index."""
+    global AI_MODELS_LOADED, SEMANTIC_DATA
     try:
-        symptoms = Symptom.query.options(joinedload(Symptom.specialty)).all()
+        symptoms = Symptom.query.options(joinedload(Symptom.specialty)).order_by(Symptom.id).all()
         if not symptoms:
             print("⚠️ Warning: No symptoms found in the database. Semantic search will be limited. Run seed_data.py.")
-        else:
-            symptom_names = [s.name for s in symptoms]
-            symptom_embeddings = semantic_model.encode(symptom_names, convert_to_tensor=True)
-            SEMANTIC_DATA = {
-                "symptoms": symptom_names,
-                "embeddings": symptom_embeddings,
-                "symptom_to_specialty": {s.name: s.specialty.name for s in symptoms}
-            }
-            print("✅ Symptom embeddings computed and cached for semantic search.")
+            return True
+        model_name = _embedding_model_key()
+        rows = [(s.id, s.name, s.specialty_id) for s in symptoms]
+        index = load_symptom_index(semantic_model, model_name, rows, current_app.config['EMBEDDING_INDEX_DIR'])
+        search_backend = build_search_backend(
+            index["vectors"],
+            backend=current_app.config.get('VECTOR_SEARCH_BACKEND', 'auto'),
+            n_probe=current_app.config.get('VECTOR_SEARCH_IVF_NPROBE', 16)
+        )
+        SEMANTIC_DATA = {
+            "symptoms": [s.name for s in symptoms],
+            "embeddings": index["vectors"],
+            "search_backend": search_backend,
+            "symptom_ids": index["symptom_ids"],
+            "specialty_ids": index["specialty_ids"],
+            "symptom_to_specialty": {s.name: s.specialty.name for s in symptoms}
+        }
+        print(f"✅ Symptom embedding index loaded ({len(rows)} symptoms, {index['encoded']} newly encoded, '{search_backend.name}' search).")
+        return True
     except Exception as e:
+        WARMUP_STATE["phases"]["embeddings"]["error"] = str(e)
         print(f"❌ Error pre-computing embeddings: {e}. Semantic search may not work correctly.")
         AI_MODELS_LOADED = False
+        return False
 
-    # Pre-compile autocomplete terms
+def _load_autocomplete():
+    """Pre-compiles the symptom/specialty autocomplete index, then all location-derived data."""
+    global AUTOCOMPLETE_DATA, AUTOCOMPLETE_INDEX
     try:
         symptoms = [s.name.title() for s in Symptom.query.all()]
         specialties = [s.name.title() for s in Specialty.query.all()]
-        locations = [l.name.title() for l in Location.query.all()]
-        aliases = [a.alias for a in LocationAlias.query.all()]
-
-        all_terms = set(symptoms + specialties + locations + aliases)
-        all_terms.add("Emergency Services")
-        AUTOCOMPLETE_DATA["all"] = sorted(list(all_terms))
-
-        location_terms = set(locations + aliases)
-        AUTOCOMPLETE_DATA["locations"] = sorted(list(location_terms))
-        print("✅ Autocomplete suggestions cached from database.")
+        terms = sorted(set(symptoms + specialties + ["Emergency Services"]))
+        # Build the prefix/substring index used on every keystroke.
+        terms_index = AutocompleteIndex(terms)
+        AUTOCOMPLETE_DATA = {**AUTOCOMPLETE_DATA, "terms": terms}
+        AUTOCOMPLETE_INDEX = {**AUTOCOMPLETE_INDEX, "terms": terms_index}
+        _load_location_data()
+        print("✅ Autocomplete suggestions cached and indexed from database.")
+        return True
     except Exception as e:
+        LOCATION_DATA_STATE["stale"] = True
+        WARMUP_STATE["phases"]["autocomplete"]["error"] = str(e)
         print(f"❌ Error caching autocomplete data: {e}. Autocomplete may not work.")
+        return False
+
+def _location_signature():
+    """
+    Row counts and highest ids of the Location and LocationAlias tables: one cheap query that
+    tells whether another worker added or removed locations since the last build.
+    """
+    return tuple(db.session.execute(db.select(
+        db.select(func.count(Location.id)).scalar_subquery(),
+        db.select(func.max(Location.id)).scalar_subquery(),
+        db.select(func.count(LocationAlias.id)).scalar_subquery(),
+        db.select(func.max(LocationAlias.id)).scalar_subquery()
+    )).one())
+
+def _load_location_data():
+    """Builds the location autocomplete index, the location matcher and the location graph."""
+    global AUTOCOMPLETE_DATA, AUTOCOMPLETE_INDEX, LOCATION_MATCHER, LOCATION_GRAPH
+    # Snapshot first so a concurrent change can't mark the data stale before we read it.
+    LOCATION_DATA_STATE["stale"] = False
+    signature = _location_signature()
+    location_rows = Location.query.all()
+    alias_rows = LocationAlias.query.options(joinedload(LocationAlias.location)).all()
+    locations = [l.name.title() for l in location_rows]
+    aliases = [a.alias for a in alias_rows]
+    location_terms = sorted(set(locations + aliases))
+    locations_index = AutocompleteIndex(location_terms)
+
+    # Compile every location name and alias into a single-pass matcher for query parsing.
+    # As in the graph, a location name always wins over an alias spelled the same way.
+    canonical_by_term = {l.name: l.name for l in location_rows}
+    for a in alias_rows:
+        canonical_by_term.setdefault(a.alias, a.location.name)
+    location_matcher = LocationMatcher(canonical_by_term)
+
+    # Alias -> location -> search group, so get_nearby_locations never hits the DB.
+    location_graph = LocationGraph(
+        [(l.id, l.name, l.parent_id) for l in location_rows],
+        [(a.alias, a.location_id) for a in alias_rows]
+    )
+
+    # Everything is built before anything is published, so readers never see a mix.
+    AUTOCOMPLETE_DATA = {**AUTOCOMPLETE_DATA, "locations": location_terms}
+    AUTOCOMPLETE_INDEX = {**AUTOCOMPLETE_INDEX, "locations": locations_index}
+    LOCATION_MATCHER = location_matcher
+    LOCATION_GRAPH = location_graph
+    LOCATION_DATA_STATE.update(checked_at=time.monotonic(), signature=signature)
+
+def _refresh_location_snapshot():
+    """
+    Rebuilds the location data if this process changed the location tables, or if their
+    signature shows another worker did; otherwise only records that the snapshot is current.
+    """
+    try:
+        if LOCATION_DATA_STATE["stale"] or _location_signature() != LOCATION_DATA_STATE["signature"]:
+            _load_location_data()
+        else:
+            LOCATION_DATA_STATE["checked_at"] = time.monotonic()
+    except Exception as e:
+        LOCATION_DATA_STATE["stale"] = True
+        print(f"❌ Error refreshing location data: {e}. Using the previous snapshot.")
+
+def _refresh_location_data():
+    """
+    Refreshes the location graph, matcher and location autocomplete index if the Location or
+    LocationAlias tables changed (in this process), or, every LOCATION_GRAPH_MAX_AGE seconds,
+    if a cheap signature query shows another worker changed them. The symptom/specialty
+    index is never rebuilt here. The check and any rebuild run in a background thread; every
+    request, including this one, keeps using the current snapshot until the new one is
+    swapped in. Only one refresh runs at a time.
+    """
+    checked_at = LOCATION_DATA_STATE["checked_at"]
+    if checked_at is None:
+        return  # Not warmed up yet; load_service_data() builds it.
+    max_age = current_app.config.get('LOCATION_GRAPH_MAX_AGE', 300)
+    expired = bool(max_age) and time.monotonic() - checked_at > max_age
+    if not (LOCATION_DATA_STATE["stale"] or expired):
+        return
+    if not _LOCATION_REFRESH_LOCK.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+
+    def refresh():
+        try:
+            with app.app_context():
+                _refresh_location_snapshot()
+        finally:
+            _LOCATION_REFRESH_LOCK.release()
+
+    try:
+        threading.Thread(target=refresh, name="location-data-refresh", daemon=True).start()
+    except BaseException:
+        _LOCATION_REFRESH_LOCK.release()
+        raise
+
+def load_service_data():
+    """
+    Loads AI models and data from the database into memory at application start.
+    This is a one-time operation, called from the app factory either directly or
+    from a background thread (see start_background_warmup).
+    Autocomplete data is loaded first since search can already use it in keyword-fallback mode.
+    """
+    global SPECIALIST_CACHE
+
+    with _WARMUP_LOCK:
+        SPECIALIST_CACHE = LRUCache(
+            max_size=current_app.config.get('SPECIALIST_CACHE_SIZE', 2048),
+            ttl_seconds=current_app.config.get('SPECIALIST_CACHE_TTL', 3600)
+        )
+        WARMUP_STATE.update(_new_warmup_state())
+        WARMUP_STATE["status"] = "running"
+        WARMUP_STATE["started_at"] = datetime.utcnow().isoformat()
+
+        autocomplete_ok = _run_warmup_phase("autocomplete", _load_autocomplete)
+        models_ok = _run_warmup_phase("models", _load_models)
+        if models_ok:
+            embeddings_ok = _run_warmup_phase("embeddings", _load_embeddings)
+        else:
+            embeddings_ok = False
+            WARMUP_STATE["phases"]["embeddings"]["status"] = "skipped"
+
+        # Results cached while running in keyword-fallback mode would otherwise outlive the warm-up.
+        SPECIALIST_CACHE.clear()
+        WARMUP_STATE["status"] = "ready" if (autocomplete_ok and models_ok and embeddings_ok) else "degraded"
+        WARMUP_STATE["finished_at"] = datetime.utcnow().isoformat()
+
+def start_background_warmup(app):
+    """
+    Runs load_service_data() in a daemon thread so the worker can start serving requests
+    immediately. Until the models are loaded, searches use keyword fallback mode.
+    """
+    def warmup():
+        with app.app_context():
+            try:
+                load_service_data()
+            except Exception as e:
+                WARMUP_STATE["status"] = "degraded"
+                print(f"❌ Background warm-up failed: {e}")
+
+    thread = threading.Thread(target=warmup, name="ai-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def get_warmup_state():
+    """A snapshot of the warm-up progress, including per-phase load timings."""
+    state = copy.deepcopy(WARMUP_STATE)
+    state["ready"] = state["status"] in ("ready", "degraded")
+    state["search_mode"] = "semantic" if (AI_MODELS_LOADED and SEMANTIC_DATA) else "keyword"
+    return state
 
 
 def find_doctors(locations, specialization):
@@ -162,116 +460,141 @@ def get_featured_hospitals(limit=3):
 
 def get_nearby_locations(location):
     """
-    Finds a list of nearby/related locations for a given location by querying the database.
+    Finds a list of nearby/related locations for a given location using the in-memory location graph.
     It resolves aliases (e.g., 'hyd' -> 'Hyderabad') and finds parent/child relationships.
     """
     if not location:
         return []
 
-    search_term = location.strip().lower()
-
-    # 1. Check for an exact location match
-    loc = Location.query.filter(func.lower(Location.name) == search_term).first()
-
-    # 2. If no match, check aliases
-    if not loc:
-        alias = LocationAlias.query.options(joinedload(LocationAlias.location)).filter(func.lower(LocationAlias.alias) == search_term).first()
-        if alias:
-            loc = alias.location
-
-    # 3. If a location is found, determine the search group
-    if loc:
-        # If the location has a parent, the group is the parent and all its children
-        if loc.parent:
-            parent_loc = loc.parent
-            related_locations = [parent_loc.name] + [child.name for child in parent_loc.sub_locations]
-            return list(set(related_locations))
-        # If the location has no parent, it is a parent itself. The group is the location and its children.
-        else:
-            related_locations = [loc.name] + [child.name for child in loc.sub_locations]
-            return list(set(related_locations))
+    _refresh_location_data()
+    # The group is the parent location and all its children (or the location itself and its children).
+    group = LOCATION_GRAPH.group(location)
+    if group:
+        return list(group)
 
-    # 4. Fallback: if no match, return the original input as a single-item list
+    # Fallback: if no match, return the original input as a single-item list
     return [location.strip().title()]
 
 def get_autocomplete_suggestions(query: str, limit: int = 10):
     """
     Provides autocomplete suggestions based on a partial query.
-    Searches against a pre-compiled list of diseases, specialties, and locations.
+    Searches against a pre-built index of diseases, specialties, and locations.
     Prioritizes suggestions that start with the query.
     """
     if not query:
         return []
-    
-    query_lower = query.lower()
-    
-    # Use the cached list from AUTOCOMPLETE_DATA
-    suggestion_pool = AUTOCOMPLETE_DATA.get("all", [])
-    if not suggestion_pool:
-        return []
-
-    # 1. Find matches that start with the query (highest priority)
-    starts_with_matches = [term for term in suggestion_pool if term.lower().startswith(query_lower)]
-    
-    # If we have enough matches, return them.
-    if len(starts_with_matches) >= limit:
-        return starts_with_matches[:limit]
-    
-    # 2. Find matches that contain the query string, but don't start with it.
-    contains_matches = [term for term in suggestion_pool if query_lower in term.lower() and term not in starts_with_matches]
-    
-    # Combine the lists and return up to the limit.
-    all_matches = starts_with_matches + contains_matches
-    return all_matches[:limit]
+    _refresh_location_data()
+    # Merged as if both indexes were one list in alphabetical order: each index returns its
+    # best starts-with and contains matches, which include the best of the union.
+    starts_with, contains = set(), set()
+    for index in (AUTOCOMPLETE_INDEX["terms"], AUTOCOMPLETE_INDEX["locations"]):
+        index_starts_with, index_contains = index.search_groups(query, limit)
+        starts_with.update(index_starts_with)
+        contains.update(index_contains)
+    starts_with = sorted(starts_with)[:limit]
+    return starts_with + sorted(contains)[:limit - len(starts_with)]
 
 def get_location_suggestions(query: str, limit: int = 10):
     """
     Provides autocomplete suggestions for locations only.
-    Searches against a pre-compiled list of locations and their aliases.
+    Searches against a pre-built index of locations and their aliases.
     """
     if not query:
         return []
-    
-    query_lower = query.lower()
+    _refresh_location_data()
+    return AUTOCOMPLETE_INDEX["locations"].search(query, limit)
 
-    # Use the cached list from AUTOCOMPLETE_DATA
-    suggestion_pool = AUTOCOMPLETE_DATA.get("locations", [])
-    if not suggestion_pool:
+def find_similar_symptoms(term: str, top_k: int = 5):
+    """
+    Returns the `top_k` known symptoms closest to the given term, as a list of
+    {'symptom', 'specialist', 'score'} dicts ordered by descending cosine similarity.
+    Returns an empty list when semantic search is unavailable.
+    """
+    term = term.lower().strip()
+    if not (AI_MODELS_LOADED and SEMANTIC_DATA and term):
         return []
+    query_embedding = _encode_query(term)
+    matches = []
+    for index, score in SEMANTIC_DATA["search_backend"].search(query_embedding, k=top_k):
+        symptom_name = SEMANTIC_DATA["symptoms"][index]
+        matches.append({
+            "symptom": symptom_name,
+            "specialist": SEMANTIC_DATA["symptom_to_specialty"][symptom_name],
+            "score": score
+        })
+    return matches
 
-    # 1. Find matches that start with the query (highest priority)
-    starts_with_matches = [term for term in suggestion_pool if term.lower().startswith(query_lower)]
-    
-    # If we have enough matches, return them.
-    if len(starts_with_matches) >= limit:
-        return starts_with_matches[:limit]
-    
-    # 2. Find matches that contain the query string, but don't start with it.
-    contains_matches = [term for term in suggestion_pool if query_lower in term.lower() and term not in starts_with_matches]
-    
-    # Combine the lists and return up to the limit.
-    all_matches = starts_with_matches + contains_matches
-    return all_matches[:limit]
+def normalize_search_term(term: str) -> str:
+    """Lower-cases a search term and collapses whitespace, e.g. '  Back   Pain ' -> 'back pain'."""
+    return " ".join(term.lower().split())
+
+def get_specialist_cache_stats():
+    return SPECIALIST_CACHE.stats()
+
+def _invalidate_specialist_cache(mapper, connection, target):
+    SPECIALIST_CACHE.clear()
+
+# Any change to the Symptom or Specialty tables can change a cached mapping.
+for _model in (Symptom, Specialty):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _invalidate_specialist_cache)
+
+def _note_location_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['location_data_changed'] = True
+
+def _location_change_committed(session):
+    # Only committed changes mark the graph stale; it is rebuilt lazily on the next lookup.
+    if session.info.pop('location_data_changed', False):
+        LOCATION_DATA_STATE["stale"] = True
+
+def _location_change_rolled_back(session):
+    session.info.pop('location_data_changed', None)
+
+for _model in (Location, LocationAlias):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _note_location_change)
+event.listen(Session, 'after_commit', _location_change_committed)
+event.listen(Session, 'after_rollback', _location_change_rolled_back)
 
 def map_disease_to_specialist(disease: str)->str:
     """
     Maps user input to a specialist. Returns a dictionary with the original term,
     the mapped specialist, and a 'did_you_mean' suggestion if applicable.
+    Results are cached per normalized term, so repeated searches skip the model and the DB.
     """
+    cache_key = normalize_search_term(disease)
+    cached = SPECIALIST_CACHE.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+    result, semantic_failed = _resolve_specialist(cache_key)
+    if not semantic_failed:
+        SPECIALIST_CACHE.set(cache_key, dict(result))
+    else:
+        # The keyword answer stood in for a failed model call (e.g. an embedding batch timed
+        # out). Keep it only briefly so the term goes back to semantic search soon.
+        fallback_ttl = current_app.config.get('SPECIALIST_FALLBACK_CACHE_TTL', 30)
+        if fallback_ttl > 0:
+            SPECIALIST_CACHE.set(cache_key, dict(result), ttl_seconds=fallback_ttl)
+    return result
+
+def _resolve_specialist(disease: str):
+    """Returns (result, semantic_failed): semantic_failed is True if the model raised and the keyword search answered instead."""
     term = disease.lower().strip()
+    semantic_failed = False
 
     # --- AI-powered Semantic Search (if models are loaded) ---
     if AI_MODELS_LOADED and SEMANTIC_DATA and term:
         try:
-            query_embedding = semantic_model.encode(term, convert_to_tensor=True)
-            cosine_scores = util.cos_sim(query_embedding, SEMANTIC_DATA["embeddings"])[0]
-            best_match_index = np.argmax(cosine_scores)
-            best_match_score = cosine_scores[best_match_index]
-            
+            best_matches = find_similar_symptoms(term, top_k=1)
+            best_match = best_matches[0] if best_matches else None
+
             # Lowered threshold to be more forgiving of typos.
-            if best_match_score > 0.45:
-                matched_disease = SEMANTIC_DATA["symptoms"][best_match_index]
-                specialist = SEMANTIC_DATA["symptom_to_specialty"][matched_disease]
+            if best_match and best_match["score"] > 0.45:
+                best_match_score = best_match["score"]
+                matched_disease = best_match["symptom"]
+                specialist = best_match["specialist"]
                 
                 # Provide a "did you mean" suggestion for medium-confidence matches.
                 did_you_mean = None
@@ -282,66 +605,72 @@ def map_disease_to_specialist(disease: str)->str:
                     "original_term": term.title(),
                     "specialist": specialist,
                     "did_you_mean": did_you_mean
-                }
+                }, False
         except Exception as e:
             print(f"Semantic search failed: {e}")
             # Fall through to keyword search if AI fails
+            semantic_failed = True
 
     # --- Fallback to existing keyword-based search ---
     # Check for exact symptom match
     symptom = Symptom.query.options(joinedload(Symptom.specialty)).filter(func.lower(Symptom.name) == term).first()
     if symptom:
-        return {"original_term": term.title(), "specialist": symptom.specialty.name, "did_you_mean": None}
+        return {"original_term": term.title(), "specialist": symptom.specialty.name, "did_you_mean": None}, semantic_failed
 
     # Check for exact specialty match
     specialty = Specialty.query.filter(func.lower(Specialty.name) == term).first()
     if specialty:
-        return {"original_term": specialty.name, "specialist": specialty.name, "did_you_mean": None}
+        return {"original_term": specialty.name, "specialist": specialty.name, "did_you_mean": None}, semantic_failed
 
     # If no match is found, return None for the specialist.
-    return {"original_term": term.title(), "specialist": None, "did_you_mean": None}
+    return {"original_term": term.title(), "specialist": None, "did_you_mean": None}, semantic_failed
 
-def extract_entities_from_query(query: str) -> dict:
+# Words that never carry symptom information in a search query.
+QUERY_FILLER_WORDS = {'doctor', 'doctors', 'dr', 'in', 'at', 'near', 'for', 'my', 'i', 'have', 'need', 'and', 'or', ','}
+
+def _extract_entities_keyword_fallback(query: str) -> dict:
     """
-    Uses a combination of NER and custom keyword search to extract one or more locations
-    and treats the rest of the query as the symptom/disease.
-    Example: "skin doctor in Gachibowli and Tirupati" -> {'symptom': 'skin doctor', 'locations': ['Gachibowli', 'Tirupati']}
+    Used while the NLP models are still warming up (or failed to load). Only known
+    locations and aliases are extracted; the remaining words form the symptom.
     """
-    if not AI_MODELS_LOADED or not nlp_ner:
+    matches = LOCATION_MATCHER.find(query)
+    if not matches:
         return {'symptom': query, 'locations': []}
+    locations = list(dict.fromkeys(canonical for _, _, canonical in matches))
+    words = re.findall(r"[\w'-]+", LOCATION_MATCHER.strip(query))
+    symptom_text = " ".join(word for word in words if word.lower() not in QUERY_FILLER_WORDS)
+    return {'symptom': symptom_text, 'locations': locations}
+
+def _spans_overlap(start, end, spans):
+    return any(start < span_end and end > span_start for span_start, span_end in spans)
 
-    symptom_text = query
+def _entities_from_doc(query: str, doc) -> dict:
+    """Builds the extract_entities_from_query() result from an already-parsed Doc of the query."""
     locations = []
+    removed_spans = []
 
     # 1. Use spaCy's NER to find all GPEs (Geopolitical Entities)
-    doc = nlp_ner(query)
     for ent in doc.ents:
         if ent.label_ in ["GPE", "LOC"]: # GPE (Geopolitical Entity) and LOC (Location)
             locations.append(ent.text.title())
-            symptom_text = symptom_text.replace(ent.text, "")
+            removed_spans.append((ent.start_char, ent.end_char))
 
-    # 2. Use custom search for our specific known locations and aliases.
+    # 2. Use the precompiled matcher for our specific known locations and aliases.
     # This is more precise and catches terms spaCy might miss (e.g., 'Gachibowli', 'hyd').
-    all_searchable_terms = sorted(AUTOCOMPLETE_DATA.get("locations", []), key=len, reverse=True)
-    
-    for term in all_searchable_terms:
-        pattern = r'\b' + re.escape(term) + r'\b'
-        matches = list(re.finditer(pattern, symptom_text, re.IGNORECASE))
-        if matches:
-            for match in matches:
-                # Find the canonical location from the DB to add to the list
-                nearby = get_nearby_locations(match.group(0)) # This resolves aliases
-                canonical_location = nearby[0] if nearby else match.group(0).title()
-                if canonical_location not in locations:
-                    locations.append(canonical_location)
-            # Remove from the text so we don't match sub-parts
-            symptom_text = re.sub(pattern, '', symptom_text, flags=re.IGNORECASE)
-
-    # 3. Clean up the remaining text to get the core symptom.
-    doc_symptom = nlp_ner(symptom_text)
+    # One pass finds the longest non-overlapping matches and resolves aliases in memory.
+    for start, end, canonical_location in LOCATION_MATCHER.find(query):
+        if _spans_overlap(start, end, removed_spans):
+            continue # Already taken by NER
+        if canonical_location not in locations:
+            locations.append(canonical_location)
+        removed_spans.append((start, end))
+
+    # 3. Clean up the remaining text to get the core symptom. This re-uses the tokens of the
+    # first parse (stop words and punctuation are lexical attributes) instead of re-parsing.
     symptom_words = [
-        token.text for token in doc_symptom 
-        if not token.is_stop and not token.is_punct and token.text.lower() not in ['doctor', 'doctors', 'dr', 'in', 'at', 'near', 'for', 'my', 'i', 'have', 'need', 'and', 'or', ',']
+        token.text for token in doc
+        if not _spans_overlap(token.idx, token.idx + len(token.text), removed_spans)
+        and not token.is_stop and not token.is_punct and token.text.lower() not in QUERY_FILLER_WORDS
     ]
     symptom_text = " ".join(symptom_words).strip()
     symptom_text = re.sub(r'\s+', ' ', symptom_text).strip() # Remove extra spaces
@@ -353,4 +682,43 @@ def extract_entities_from_query(query: str) -> dict:
     
     # Return a unique list of found locations, preserving order
     unique_locations = list(dict.fromkeys(locations))
-    return {'symptom': final_symptom, 'locations': unique_locations}
\ No newline at end of file
+    return {'symptom': final_symptom, 'locations': unique_locations}
+
+def extract_entities_from_query(query: str) -> dict:
+    """
+    Uses a combination of NER and custom keyword search to extract one or more locations
+    and treats the rest of the query as the symptom/disease.
+    Example: "skin doctor in Gachibowli and Tirupati" -> {'symptom': 'skin doctor', 'locations': ['Gachibowli', 'Tirupati']}
+    """
+    _refresh_location_data()
+    if not AI_MODELS_LOADED or not nlp_ner:
+        return _extract_entities_keyword_fallback(query)
+    return _entities_from_doc(query, nlp_ner(query))
+
+def extract_entities_batch(queries, batch_size: int = 64) -> list:
+    """
+    Batch version of extract_entities_from_query() for offline processing. Queries are
+    streamed through nlp.pipe(), which is much faster than parsing them one at a time.
+    """
+    queries = list(queries)
+    _refresh_location_data()
+    if not AI_MODELS_LOADED or not nlp_ner:
+        return [_extract_entities_keyword_fallback(q) for q in queries]
+    return [_entities_from_doc(q, doc) for q, doc in zip(queries, nlp_ner.pipe(queries, batch_size=batch_size))]
+
+def reprocess_search_history(batch_size: int = 256):
+    """
+    Re-parses every saved SearchHistory query with the current models, e.g. after the
+    location data or the NLP pipeline changes. Rows are read in id order with keyset
+    pagination. Yields (search_id, entities) tuples; nothing is written back.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.query(SearchHistory.id, SearchHistory.disease).filter(
+            SearchHistory.id > last_id
+        ).order_by(SearchHistory.id).limit(batch_size).all()
+        if not rows:
+            break
+        for row, entities in zip(rows, extract_entities_batch([row.disease for row in rows], batch_size=batch_size)):
+            yield row.id, entities
+        last_id = rows[-1].id
@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+# --- Persistent Symptom Embedding Index ---
+# The symptom embeddings are stored on disk as plain .npy files so that every
+# gunicorn worker can memory-map the same page-cached copy instead of re-encoding
+# the whole Symptom table on start-up. An index is identified by the model name
+# and a content hash of the Symptom table; the manifest points at the latest one.
+
+INDEX_FORMAT_VERSION = 1
+
+
+def _safe_model_name(model_name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+
+
+def _name_digest(name):
+    """A stable 64-bit digest of a symptom name, used to detect changed rows."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def compute_content_hash(model_name, rows):
+    """
+    Hashes the model name and the (id, name, specialty_id) rows of the Symptom table.
+    Any insert, rename, re-mapping or delete produces a new hash.
+    """
+    hasher = hashlib.sha256(f"v{INDEX_FORMAT_VERSION}\t{model_name}\n".encode('utf-8'))
+    for symptom_id, name, specialty_id in rows:
+        hasher.update(f"{symptom_id}\t{name}\t{specialty_id}\n".encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _index_paths(index_dir, model_name, content_hash):
+    base = os.path.join(index_dir, f"{_safe_model_name(model_name)}-{content_hash[:16]}")
+    return {
+        "vectors": f"{base}.vectors.npy",
+        "symptom_ids": f"{base}.symptom_ids.npy",
+        "specialty_ids": f"{base}.specialty_ids.npy",
+        "name_digests": f"{base}.name_digests.npy",
+    }
+
+
+def _manifest_path(index_dir, model_name):
+    return os.path.join(index_dir, f"{_safe_model_name(model_name)}.manifest.json")
+
+
+def _save_array_atomic(path, array):
+    # Write to a temporary file first so a concurrently starting worker never maps a half-written file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _load_arrays(paths):
+    return {
+        "vectors": np.load(paths["vectors"], mmap_mode='r'),
+        "symptom_ids": np.load(paths["symptom_ids"], mmap_mode='r'),
+        "specialty_ids": np.load(paths["specialty_ids"], mmap_mode='r'),
+        "name_digests": np.load(paths["name_digests"], mmap_mode='r'),
+    }
+
+
+def _read_manifest(index_dir, model_name):
+    try:
+        with open(_manifest_path(index_dir, model_name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _previous_vectors_by_digest(index_dir, model_name):
+    """Returns {name_digest: vector} from the latest index of this model, if one exists."""
+    manifest = _read_manifest(index_dir, model_name)
+    if not manifest or manifest.get("format") != INDEX_FORMAT_VERSION:
+        return {}
+    try:
+        previous = _load_arrays(_index_paths(index_dir, model_name, manifest["content_hash"]))
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {int(digest): previous["vectors"][i] for i, digest in enumerate(previous["name_digests"])}
+
+
+def _remove_stale_indexes(index_dir, model_name, keep_hash):
+    prefix = f"{_safe_model_name(model_name)}-"
+    keep_prefix = f"{prefix}{keep_hash[:16]}."
+    for filename in os.listdir(index_dir):
+        if filename.startswith(prefix) and filename.endswith('.npy') and not filename.startswith(keep_prefix):
+            try:
+                os.remove(os.path.join(index_dir, filename))
+            except OSError:
+                # Another worker may still have it mapped (e.g. on Windows); it will be removed next time.
+                pass
+
+
+def load_symptom_index(model, model_name, rows, index_dir):
+    """
+    Returns the embedding index for the given Symptom rows, building it if necessary.
+
+    `rows` is a list of (symptom_id, name, specialty_id) tuples ordered by id. The result
+    is a dict of read-only, memory-mapped arrays: 'vectors' (L2-normalized float32, one row
+    per symptom), 'symptom_ids' and 'specialty_ids', plus 'encoded', the number of rows that
+    had to be run through the model (0 when the index was already up to date).
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    content_hash = compute_content_hash(model_name, rows)
+    paths = _index_paths(index_dir, model_name, content_hash)
+
+    # 1. Fast path: an index for exactly this table content already exists.
+    try:
+        index = _load_arrays(paths)
+        if len(index["symptom_ids"]) == len(rows):
+            index["encoded"] = 0
+            return index
+    except (OSError, ValueError):
+        pass
+
+    # 2. Rebuild, re-using vectors of unchanged names from the previous index.
+    reusable = _previous_vectors_by_digest(index_dir, model_name)
+    digests = np.array([_name_digest(name) for _, name, _ in rows], dtype=np.uint64)
+    missing = [i for i, digest in enumerate(digests) if int(digest) not in reusable]
+
+    dimension = model.get_sentence_embedding_dimension()
+    vectors = np.zeros((len(rows), dimension), dtype=np.float32)
+    for i, digest in enumerate(digests):
+        if int(digest) in reusable:
+            vectors[i] = reusable[int(digest)]
+    if missing:
+        encoded = model.encode([rows[i][1] for i in missing], convert_to_numpy=True, normalize_embeddings=True)
+        vectors[missing] = np.asarray(encoded, dtype=np.float32)
+
+    _save_array_atomic(paths["vectors"], vectors)
+    _save_array_atomic(paths["symptom_ids"], np.array([r[0] for r in rows], dtype=np.int64))
+    _save_array_atomic(paths["specialty_ids"], np.array([r[2] for r in rows], dtype=np.int64))
+    _save_array_atomic(paths["name_digests"], digests)
+
+    manifest_tmp = f"{_manifest_path(index_dir, model_name)}.{os.getpid()}.tmp"
+    with open(manifest_tmp, 'w', encoding='utf-8') as f:
+        json.dump({"format": INDEX_FORMAT_VERSION, "model": model_name, "content_hash": content_hash, "rows": len(rows)}, f)
+    os.replace(manifest_tmp, _manifest_path(index_dir, model_name))
+    _remove_stale_indexes(index_dir, model_name, content_hash)
+
+    index = _load_arrays(paths)
+    index["encoded"] = len(missing)
+    return index
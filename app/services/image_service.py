@@ -0,0 +1,159 @@
+import hashlib
+import os
+import uuid
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# --- Profile Image Pipeline ---
+# Uploads are streamed to a temporary file in UPLOAD_FOLDER while being hashed, then stored
+# under their SHA-256 (uploads/ab/abcdef....jpeg), so identical photos are kept once and two
+# users uploading 'photo.jpg' no longer overwrite each other. Each image also gets square
+# thumbnails in JPEG and WebP (VARIANT_SIZES), named after the same hash; their paths are
+# recorded on the owner's image_variants column so list pages can ship a few KB instead of
+# the original. All files are written under a temporary name and renamed into place.
+
+VARIANT_SIZES = {'thumb': 128, 'card': 320}  # square edge in pixels
+VARIANT_FORMATS = {'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+                   'webp': ('WEBP', {'quality': 80, 'method': 4})}
+STORED_FORMATS = {'JPEG': 'jpeg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}  # Pillow format -> extension
+CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_PIXELS = 40_000_000  # rejects decompression bombs hidden in small uploads
+
+
+class InvalidImageError(ValueError):
+    """The upload is not an image we can store (unknown format or too large when decoded)."""
+
+
+def _static_path(upload_folder, path):
+    # Stored paths are relative to the static folder ('uploads/...'); UPLOAD_FOLDER is static/uploads.
+    return os.path.join(os.path.dirname(os.path.normpath(upload_folder)), path)
+
+
+def _temp_path(directory):
+    return os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+
+
+def _stream_to_temp(stream, directory):
+    """Copies the upload to a temporary file in chunks. Returns (temp_path, sha256 hex digest)."""
+    hasher = hashlib.sha256()
+    tmp_path = _temp_path(directory)
+    with open(tmp_path, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            f.write(chunk)
+    return tmp_path, hasher.hexdigest()
+
+
+def _identify(path):
+    """Returns the stored extension for the image at `path`, or raises InvalidImageError."""
+    try:
+        with Image.open(path) as img:
+            if img.width * img.height > MAX_IMAGE_PIXELS:
+                raise InvalidImageError("The image is too large.")
+            fmt = img.format
+            img.verify()
+        # verify() doesn't decode pixel data, so a truncated JPEG passes it; decoding does not
+        # (at draft scale, like build_variants, which still reads the whole file).
+        with Image.open(path) as img:
+            img.draft('RGB', (max(VARIANT_SIZES.values()),) * 2)
+            img.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidImageError("The file is not a valid image.") from e
+    if fmt not in STORED_FORMATS:
+        raise InvalidImageError(f"Unsupported image format: {fmt}.")
+    return STORED_FORMATS[fmt]
+
+
+def _save_image_atomic(img, path, pillow_format, options):
+    tmp_path = _temp_path(os.path.dirname(path))
+    img.save(tmp_path, pillow_format, **options)
+    os.replace(tmp_path, path)
+
+
+def _variant_paths(relative_dir, digest):
+    return {
+        name: {ext: f"{relative_dir}/{digest}-{name}.{ext}" for ext in VARIANT_FORMATS}
+        for name in VARIANT_SIZES
+    }
+
+
+def build_variants(upload_folder, image_path, digest):
+    """
+    Writes the thumbnails for the stored image `image_path` (relative to static) that don't
+    exist yet and returns {variant: {'jpeg': path, 'webp': path}}.
+    """
+    variants = _variant_paths(os.path.dirname(image_path), digest)
+    missing = [
+        (name, ext) for name, formats in variants.items() for ext, path in formats.items()
+        if not os.path.exists(_static_path(upload_folder, path))
+    ]
+    if not missing:
+        return variants
+    with Image.open(_static_path(upload_folder, image_path)) as img:
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale, which is much faster than a full decode.
+        img.draft('RGB', (max(VARIANT_SIZES.values()),) * 2)
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+        for name, size in sorted(VARIANT_SIZES.items(), key=lambda item: -item[1]):
+            thumb = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+            for ext, (pillow_format, options) in VARIANT_FORMATS.items():
+                if (name, ext) not in missing:
+                    continue
+                out = thumb
+                if pillow_format == 'JPEG' and thumb.mode == 'RGBA':
+                    # JPEG has no alpha channel: flatten transparent areas onto white.
+                    out = Image.new('RGB', thumb.size, (255, 255, 255))
+                    out.paste(thumb, mask=thumb.getchannel('A'))
+                _save_image_atomic(out, _static_path(upload_folder, variants[name][ext]), pillow_format, options)
+    return variants
+
+
+def store_image(upload_folder, stream):
+    """
+    Stores an uploaded image and its thumbnails. Returns (image_path, variants), with paths
+    relative to the static folder. Raises InvalidImageError if the upload is not an image.
+    """
+    tmp_path, digest = _stream_to_temp(stream, upload_folder)
+    try:
+        ext = _identify(tmp_path)
+        relative_dir = f"uploads/{digest[:2]}"
+        os.makedirs(_static_path(upload_folder, relative_dir), exist_ok=True)
+        image_path = f"{relative_dir}/{digest}.{ext}"
+        target = _static_path(upload_folder, image_path)
+        stored_now = not os.path.exists(target)
+        if stored_now:
+            os.replace(tmp_path, target)
+        else:
+            os.remove(tmp_path)  # Same content already stored
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    try:
+        return image_path, build_variants(upload_folder, image_path, digest)
+    except OSError as e:
+        # Whatever _identify() missed: don't leave an original behind that has no thumbnails.
+        if stored_now:
+            os.remove(target)
+        raise InvalidImageError("The file is not a valid image.") from e
+
+
+def store_existing_image(upload_folder, image_path):
+    """
+    Copies a pre-pipeline upload (e.g. 'uploads/photo.jpg') into content-addressed storage
+    and builds its thumbnails. Returns (image_path, variants). The old file is left in place.
+    """
+    with open(_static_path(upload_folder, image_path), 'rb') as f:
+        return store_image(upload_folder, f)
+
+
+def image_variant(owner, variant, fmt='jpeg'):
+    """
+    Jinja filter: static path of `owner`'s `variant` thumbnail in `fmt`, falling back to the
+    original image for uploads made before thumbnails existed, or None without an image.
+    """
+    variants = getattr(owner, 'image_variants', None) or {}
+    return variants.get(variant, {}).get(fmt) or getattr(owner, 'image', None)
@@ -0,0 +1,60 @@
+from types import MappingProxyType
+
+# --- In-Memory Location Graph ---
+# A read-only snapshot of the Location / LocationAlias tables: every name and alias
+# (lower-cased) points at a canonical location id, and every id points at its search group
+# (the top-level location plus its sub-locations). Lookups never touch the database.
+# A graph is never mutated after it is built; a refresh builds a new one and swaps it in.
+
+
+class LocationGraph:
+    def __init__(self, locations, aliases):
+        """
+        `locations` is an iterable of (id, name, parent_id) rows and `aliases` an iterable
+        of (alias, location_id) rows.
+        """
+        names = {}
+        parents = {}
+        children = {}
+        for location_id, name, parent_id in locations:
+            names[location_id] = name
+            parents[location_id] = parent_id
+            if parent_id is not None:
+                children.setdefault(parent_id, []).append(location_id)
+
+        id_by_term = {}
+        for location_id, name in names.items():
+            id_by_term[name.lower()] = location_id
+        for alias, location_id in aliases:
+            # A location name always wins over an alias spelled the same way.
+            if alias and location_id in names:
+                id_by_term.setdefault(alias.lower(), location_id)
+
+        groups = {}
+        for location_id in names:
+            # A sub-location searches its parent's whole group; a top-level location its own.
+            head = parents[location_id] if parents[location_id] in names else location_id
+            members = [names[head]] + sorted(names[child] for child in children.get(head, ()))
+            groups[location_id] = tuple(dict.fromkeys(members))
+
+        self._names = MappingProxyType(names)
+        self._id_by_term = MappingProxyType(id_by_term)
+        self._groups = MappingProxyType(groups)
+
+    def __len__(self):
+        return len(self._names)
+
+    def resolve(self, term):
+        """Returns the canonical location id for a name or alias (any case), or None."""
+        if not term:
+            return None
+        return self._id_by_term.get(term.strip().lower())
+
+    def canonical_name(self, term):
+        location_id = self.resolve(term)
+        return self._names[location_id] if location_id is not None else None
+
+    def group(self, term):
+        """Returns the names in the search group of a name or alias, or None if it is unknown."""
+        location_id = self.resolve(term)
+        return self._groups[location_id] if location_id is not None else None
@@ -0,0 +1,58 @@
+import re
+
+# --- Multi-Pattern Location Matcher ---
+# All known location names and aliases are compiled into ONE regular expression shaped
+# like a trie (e.g. 'hyd' and 'hyderabad' become 'hyd(?:erabad)?'), so a query is scanned
+# in a single pass no matter how many localities we know about. Greedy optional groups make
+# the longest term win, and finditer() returns non-overlapping matches left to right.
+
+
+def _trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[None] = True  # End-of-term marker
+
+    def build(node):
+        is_terminal = None in node
+        branches = [re.escape(char) + build(child) for char, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_terminal:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if is_terminal else group
+
+    return build(trie)
+
+
+class LocationMatcher:
+    def __init__(self, canonical_by_term):
+        """
+        `canonical_by_term` maps a location name or alias (any case) to its canonical location
+        name. Terms that differ only in case keep the first mapping, so list names before aliases.
+        """
+        self._canonical = {}
+        for term, canonical in canonical_by_term.items():
+            if term:
+                self._canonical.setdefault(term.lower(), canonical)
+        self._pattern = None
+        if self._canonical:
+            self._pattern = re.compile(r'\b(?:' + _trie_pattern(self._canonical) + r')\b', re.IGNORECASE)
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def find(self, text):
+        """Returns [(start, end, canonical_location), ...] for every longest, non-overlapping match."""
+        if not self._pattern or not text:
+            return []
+        return [(m.start(), m.end(), self._canonical[m.group(0).lower()]) for m in self._pattern.finditer(text)]
+
+    def strip(self, text):
+        """Removes every matched location from the text."""
+        if not self._pattern or not text:
+            return text
+        return self._pattern.sub('', text)
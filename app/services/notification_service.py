@@ -0,0 +1,517 @@
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message as MailMessage, email_dispatched, sanitize_address, sanitize_addresses
+from sqlalchemy import and_, or_
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+from app.extension import db
+from app.models import NotificationJob
+
+# --- Notification Queue ---
+# OTP emails and SMS are not sent inside the request. The route stores a NotificationJob row
+# and returns; a small pool of worker threads claims due jobs (compare-and-swap UPDATE, so
+# several processes can share the table) and hands them to the transport for their channel.
+# Failures are retried with jittered exponential backoff until NOTIFICATION_MAX_ATTEMPTS,
+# after which the job is left 'dead' with its last error. Errors that can't succeed on a
+# retry (rejected credentials, invalid numbers) go straight to 'dead'. A job whose worker
+# died mid-send is claimed again once its lease (NOTIFICATION_LEASE_SECONDS) has expired.
+#
+# create_app() starts the pool when NOTIFICATION_WORKERS > 0, so retries and jobs left by a
+# previous process go out even when this one queues nothing; `flask` CLI commands only start
+# it on their first enqueue. Threads don't survive a fork: app-server workers forked from a
+# preloaded app restart theirs from gunicorn's post_fork hook (gunicorn.conf.py), and other
+# forked children (e.g. multiprocessing helpers) never send.
+# `flask send-notifications` runs it as a dedicated process instead (set NOTIFICATION_WORKERS=0
+# for the web workers).
+# Its threads share one set of transports, which keep SMTP connections and the Twilio HTTP
+# session open between sends. enqueue_bulk() queues many messages (e.g. appointment
+# reminders) with a single INSERT, and the workers then send them over those connections.
+
+CLAIM_BATCH_SIZE = 5
+IDLE_POLL_SECONDS = 2.0
+
+
+class PermanentDeliveryError(Exception):
+    """A send that would fail the same way on every retry."""
+
+
+class SmtpConnectionPool:
+    """
+    Logged-in SMTP connections (MAIL_* settings) kept open between sends, so each email costs
+    one SMTP transaction instead of a TCP connect, STARTTLS handshake and login. At most
+    `size` idle connections are kept. One that has been idle longer than `check_after`
+    seconds is probed with NOOP before reuse and replaced if the server has dropped it;
+    MAIL_MAX_EMAILS, if set, recycles a connection after that many messages.
+    """
+    def __init__(self, config, size=2, check_after=30, timeout=30):
+        self.server = config.get('MAIL_SERVER') or 'localhost'
+        self.port = config.get('MAIL_PORT', 25)
+        self.use_ssl = config.get('MAIL_USE_SSL', False)
+        self.use_tls = config.get('MAIL_USE_TLS', False)
+        self.username = config.get('MAIL_USERNAME')
+        self.password = config.get('MAIL_PASSWORD')
+        self.max_emails = config.get('MAIL_MAX_EMAILS')
+        self.size = max(1, int(size))
+        self.check_after = check_after
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()  # (host, last_used, sent); LIFO keeps the warmest in use
+
+    def _connect(self):
+        if self.use_ssl:
+            host = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+        else:
+            host = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if self.use_tls:
+            host.starttls()
+        if self.username and self.password:
+            host.login(self.username, self.password)
+        return host
+
+    @staticmethod
+    def _quit(host):
+        try:
+            host.quit()
+        except (smtplib.SMTPException, OSError):
+            host.close()
+
+    def _checkout(self):
+        """Returns (host, sent, reused): an idle connection that still answers, or a new one."""
+        while True:
+            try:
+                host, last_used, sent = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), 0, False
+            if time.monotonic() - last_used < self.check_after:
+                return host, sent, True
+            try:
+                if host.noop()[0] == 250:
+                    return host, sent, True
+            except (smtplib.SMTPException, OSError):
+                pass
+            host.close()
+
+    def _checkin(self, host, sent):
+        if (self.max_emails and sent >= self.max_emails) or self._idle.qsize() >= self.size:
+            self._quit(host)
+        else:
+            self._idle.put((host, time.monotonic(), sent))
+
+    def sendmail(self, from_addr, to_addrs, message_bytes):
+        host, sent, reused = self._checkout()
+        try:
+            try:
+                host.sendmail(from_addr, to_addrs, message_bytes)
+            except smtplib.SMTPServerDisconnected:
+                if not reused:
+                    raise
+                # The server dropped a pooled connection after its last check; a fresh one
+                # gets a single retry before the job's own retry schedule takes over.
+                host.close()
+                host, sent = None, 0
+                host = self._connect()
+                host.sendmail(from_addr, to_addrs, message_bytes)
+        except smtplib.SMTPServerDisconnected:
+            if host is not None:
+                host.close()
+            raise
+        except smtplib.SMTPException:
+            # Refusals leave the connection usable (smtplib has already sent RSET).
+            if host is not None:
+                self._checkin(host, sent)
+            raise
+        except OSError:
+            if host is not None:
+                host.close()
+            raise
+        self._checkin(host, sent + 1)
+
+    def close(self):
+        while True:
+            try:
+                self._quit(self._idle.get_nowait()[0])
+            except queue.Empty:
+                return
+
+
+class MailTransport:
+    """Sends email jobs over pooled SMTP connections; Flask-Mail builds the message."""
+    def __init__(self, config):
+        self.sender = config.get('MAIL_USERNAME')
+        self.suppress = config.get('MAIL_SUPPRESS_SEND', config.get('TESTING', False))
+        self.pool = SmtpConnectionPool(
+            config,
+            size=config.get('NOTIFICATION_SMTP_POOL_SIZE', 2),
+            check_after=config.get('NOTIFICATION_SMTP_CHECK_AFTER_SECONDS', 30),
+            timeout=config.get('NOTIFICATION_SMTP_TIMEOUT_SECONDS', 30)
+        )
+
+    def send(self, job):
+        self.send_message(self.build_message(job))
+
+    def build_message(self, job):
+        msg = MailMessage(job.subject, sender=self.sender, recipients=[job.recipient])
+        msg.body = job.body
+        return msg
+
+    def send_message(self, msg):
+        if msg.date is None:
+            msg.date = time.time()
+        try:
+            if not self.suppress:
+                self.pool.sendmail(
+                    sanitize_address(msg.sender), list(sanitize_addresses(msg.send_to)), msg.as_bytes()
+                )
+        except smtplib.SMTPAuthenticationError as e:
+            raise PermanentDeliveryError(
+                f"SMTPAuthenticationError: {e}. Check MAIL_USERNAME and MAIL_PASSWORD "
+                "(Gmail needs a 16-character App Password)."
+            ) from e
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentDeliveryError(f"Recipient refused: {e.recipients}") from e
+        # Keeps mail.record_messages() working for anything that listens for Flask-Mail sends.
+        email_dispatched.send(current_app._get_current_object(), message=msg)
+
+    def close(self):
+        self.pool.close()
+
+
+class TwilioTransport:
+    """
+    Sends SMS jobs through one Twilio client shared by all worker threads. Its HTTP session
+    keeps connections to the API open; a connection error drops the client so the next send
+    starts a fresh session.
+    """
+    def __init__(self, config):
+        self.account_sid = config.get('TWILIO_ACCOUNT_SID')
+        self.auth_token = config.get('TWILIO_AUTH_TOKEN')
+        self.from_number = config.get('TWILIO_PHONE_NUMBER')
+        self.timeout = config.get('NOTIFICATION_TWILIO_TIMEOUT_SECONDS', 30)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = Client(
+                        self.account_sid, self.auth_token,
+                        http_client=TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+                    )
+                client = self._client
+        return client
+
+    def send(self, job):
+        client = self._get_client()
+        try:
+            client.messages.create(body=job.body, from_=self.from_number, to=job.recipient)
+        except TwilioRestException as e:
+            # 4xx means the request itself is wrong (e.g. an invalid number); 429 is just throttling.
+            if e.status and 400 <= e.status < 500 and e.status != 429:
+                raise PermanentDeliveryError(f"Twilio error {e.code}: {e.msg}") from e
+            raise
+        except OSError:
+            # Network failures (requests' exceptions are OSErrors); the job is retried later.
+            self._reset(client)
+            raise
+
+    def _reset(self, client):
+        with self._lock:
+            if self._client is client:
+                self._client = None
+        session = getattr(client.http_client, 'session', None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        client = self._client
+        if client is not None:
+            self._reset(client)
+
+
+class StandInTransport:
+    """
+    Local stand-in for SMTP or Twilio: logs the message instead of sending it, after an
+    injected delay, and fails a configurable share of sends, to exercise the queue locally.
+    """
+    def __init__(self, channel, latency_ms=0, failure_rate=0.0):
+        self.channel = channel
+        self.latency = max(0, latency_ms) / 1000.0
+        self.failure_rate = failure_rate
+
+    def send(self, job):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError(f"Stand-in {self.channel} transport: injected failure")
+        current_app.logger.info(f"[stand-in {self.channel}] to={job.recipient} subject={job.subject!r} body={job.body!r}")
+
+    def close(self):
+        pass
+
+
+def build_transports(config):
+    """Returns {channel: transport} for the NOTIFICATION_TRANSPORT setting."""
+    if config.get('NOTIFICATION_TRANSPORT', 'live') == 'stand-in':
+        latency_ms = config.get('NOTIFICATION_STANDIN_LATENCY_MS', 0)
+        failure_rate = config.get('NOTIFICATION_STANDIN_FAILURE_RATE', 0.0)
+        return {channel: StandInTransport(channel, latency_ms, failure_rate) for channel in ('email', 'sms')}
+    return {'email': MailTransport(config), 'sms': TwilioTransport(config)}
+
+
+def close_transports(transports):
+    """Closes the pooled connections held by build_transports() transports."""
+    for transport in transports.values():
+        transport.close()
+
+
+# --- Enqueueing ---
+
+def enqueue_notification(channel, recipient, body, subject=None):
+    """Stores a job, commits, and wakes this process's workers. Returns the job."""
+    job = NotificationJob(
+        channel=channel,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        max_attempts=current_app.config.get('NOTIFICATION_MAX_ATTEMPTS', 5),
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+    get_notification_worker(current_app._get_current_object()).wake()
+    return job
+
+
+def enqueue_bulk(channel, messages):
+    """
+    Queues one job per message in a single INSERT and commit, then wakes the workers. Each
+    message is a dict with 'recipient', 'body' and optionally 'subject'. Returns the count.
+    """
+    now = datetime.utcnow()
+    max_attempts = current_app.config.get('NOTIFICATION_MAX_ATTEMPTS', 5)
+    rows = [{
+        'channel': channel,
+        'recipient': message['recipient'],
+        'subject': message.get('subject'),
+        'body': message['body'],
+        'max_attempts': max_attempts,
+        'next_attempt_at': now
+    } for message in messages]
+    if not rows:
+        return 0
+    db.session.execute(db.insert(NotificationJob), rows)
+    db.session.commit()
+    get_notification_worker(current_app._get_current_object()).wake()
+    return len(rows)
+
+
+def enqueue_email(recipient, subject, body):
+    return enqueue_notification('email', recipient, body, subject=subject)
+
+
+def enqueue_sms(recipient, body):
+    return enqueue_notification('sms', recipient, body)
+
+
+# --- Claiming and Sending ---
+
+def _claimable(now, lease_seconds):
+    return or_(
+        and_(NotificationJob.status == 'pending', NotificationJob.next_attempt_at <= now),
+        and_(NotificationJob.status == 'sending', NotificationJob.locked_at < now - timedelta(seconds=lease_seconds))
+    )
+
+
+def claim_next_job(lease_seconds=120, now=None):
+    """
+    Claims the next due job for this worker and commits the claim. Returns its id, or None
+    if nothing is due. The UPDATE re-checks the claim condition, so two workers racing for
+    the same job can't both get it.
+    """
+    now = now or datetime.utcnow()
+    condition = _claimable(now, lease_seconds)
+    candidates = db.session.query(NotificationJob.id).filter(condition).order_by(
+        NotificationJob.next_attempt_at, NotificationJob.id
+    ).limit(CLAIM_BATCH_SIZE).all()
+    for (job_id,) in candidates:
+        claimed = db.session.execute(
+            db.update(NotificationJob).where(NotificationJob.id == job_id, condition).values(
+                status='sending', locked_at=now, attempts=NotificationJob.attempts + 1
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed:
+            db.session.commit()
+            return job_id
+    db.session.rollback()
+    return None
+
+
+def retry_delay(attempts, base_seconds):
+    """Seconds to wait after the given number of failed attempts (exponential, jittered)."""
+    return base_seconds * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+
+
+def process_job(job_id, transports):
+    """Sends one claimed job and records the outcome. Commits. Returns the job's new status."""
+    job = db.session.get(NotificationJob, job_id)
+    now = datetime.utcnow()
+    error, permanent = None, False
+    if job.attempts > job.max_attempts:
+        # Only reachable through expired leases: the worker died on the last attempt.
+        error, permanent = "Gave up: the last attempt never finished.", True
+    else:
+        try:
+            transports[job.channel].send(job)
+        except PermanentDeliveryError as e:
+            error, permanent = str(e), True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+    if error is None:
+        job.status = 'sent'
+        job.sent_at = now
+        job.last_error = None
+    elif permanent or job.attempts >= job.max_attempts:
+        job.status = 'dead'
+        job.last_error = error
+        current_app.logger.error(f"Notification {job.id} ({job.channel} to {job.recipient}) dead-lettered after {job.attempts} attempt(s): {error}")
+    else:
+        job.status = 'pending'
+        job.last_error = error
+        job.next_attempt_at = now + timedelta(seconds=retry_delay(job.attempts, current_app.config.get('NOTIFICATION_RETRY_BASE_SECONDS', 5)))
+        current_app.logger.warning(f"Notification {job.id} attempt {job.attempts} failed, retrying at {job.next_attempt_at}: {error}")
+    job.locked_at = None
+    db.session.commit()
+    return job.status
+
+
+def drain_due_jobs(transports=None):
+    """Sends every job that is due right now in the calling thread. Returns {status: count}."""
+    owned = transports is None
+    if owned:
+        transports = build_transports(current_app.config)
+    lease_seconds = current_app.config.get('NOTIFICATION_LEASE_SECONDS', 120)
+    outcomes = {}
+    try:
+        while True:
+            job_id = claim_next_job(lease_seconds)
+            if job_id is None:
+                return outcomes
+            status = process_job(job_id, transports)
+            outcomes[status] = outcomes.get(status, 0) + 1
+    finally:
+        if owned:
+            close_transports(transports)
+
+
+class NotificationWorker:
+    """
+    A pool of threads that claim and send due jobs through one shared set of transports.
+    Started lazily, so each app process gets its own threads. A process forked from one
+    that already ran them starts its own with new transports and database connections, so
+    no process reuses its parent's sockets; wake() skips the idle wait.
+    """
+    def __init__(self, app, size=2):
+        self.app = app
+        self.size = max(0, int(size))
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self.transports = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not all(thread.is_alive() for thread in self._threads):
+                if self._pid is not None and self._pid != os.getpid():
+                    self._forget_parent_connections()
+                if self._pid != os.getpid() or self.transports is None:
+                    self.transports = build_transports(self.app.config)
+                self._threads = [
+                    threading.Thread(target=self._run, name=f"notification-worker-{i}", daemon=True)
+                    for i in range(self.size)
+                ]
+                self._pid = os.getpid()
+                for thread in self._threads:
+                    thread.start()
+
+    def wake(self):
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _forget_parent_connections(self):
+        # Pooled connections inherited from the parent still belong to it; close=False drops
+        # them without sending anything on the parent's sockets.
+        with self.app.app_context():
+            db.engine.dispose(close=False)
+        self.transports = None
+
+    def _restart_after_fork(self):
+        # Another thread may have held the lock when the process forked; the child gets a new one.
+        self._lock = threading.Lock()
+        self._ensure_started()
+
+    def join(self):
+        self._ensure_started()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        transports = self.transports
+        lease_seconds = self.app.config.get('NOTIFICATION_LEASE_SECONDS', 120)
+        while True:
+            job_id = None
+            with self.app.app_context():
+                try:
+                    job_id = claim_next_job(lease_seconds)
+                    if job_id is not None:
+                        process_job(job_id, transports)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Notification worker error: {e}")
+            if job_id is None:
+                self._wakeup.wait(IDLE_POLL_SECONDS)
+                self._wakeup.clear()
+
+
+NOTIFICATION_WORKER = None
+_WORKER_LOCK = threading.Lock()
+
+
+def get_notification_worker(app):
+    """The process-wide worker pool for `app` (NOTIFICATION_WORKERS threads)."""
+    global NOTIFICATION_WORKER
+    if NOTIFICATION_WORKER is None or NOTIFICATION_WORKER.app is not app:
+        with _WORKER_LOCK:
+            if NOTIFICATION_WORKER is None or NOTIFICATION_WORKER.app is not app:
+                NOTIFICATION_WORKER = NotificationWorker(app, app.config.get('NOTIFICATION_WORKERS', 2))
+    return NOTIFICATION_WORKER
+
+
+def start_notification_workers(app):
+    """Starts `app`'s worker pool now rather than on the first enqueue."""
+    worker = get_notification_worker(app)
+    worker._ensure_started()
+    return worker
+
+
+def restart_notification_workers_after_fork():
+    """
+    For app-server workers forked from a process that already started the pool (gunicorn
+    --preload): starts this process's own threads on fresh database connections. Called from
+    gunicorn's post_fork hook; does nothing if the parent never started a pool.
+    """
+    worker = NOTIFICATION_WORKER
+    if worker is not None and worker._pid is not None and worker._pid != os.getpid():
+        worker._restart_after_fork()
+    return worker
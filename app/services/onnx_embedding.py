@@ -0,0 +1,64 @@
+import os
+import numpy as np
+
+# --- ONNX Runtime Embedding Backend ---
+# A CPU-only alternative to SentenceTransformer for all-MiniLM-L6-v2. It runs an exported,
+# int8-quantized copy of the same transformer through onnxruntime and reproduces the
+# SentenceTransformer pipeline (mean pooling + L2 normalization), so the embeddings stay
+# compatible with the cosine thresholds used in map_disease_to_specialist.
+# Create the model directory with `python export_onnx_model.py`.
+
+ONNX_MODEL_FILENAME = "model_int8.onnx"
+TOKENIZER_FILENAME = "tokenizer.json"
+
+
+class OnnxSentenceEncoder:
+    """Implements the subset of the SentenceTransformer API used by the app."""
+
+    def __init__(self, model_dir, max_seq_length=256, num_threads=None):
+        # Optional dependencies: only needed when EMBEDDING_BACKEND is 'onnx-int8'.
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILENAME))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILENAME), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self._dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self):
+        return self._dimension
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {k: v for k, v in feed.items() if k in self._input_names})[0]
+        # Mean pooling over the real (non-padding) tokens, as in the SentenceTransformer model.
+        mask = attention_mask[:, :, None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if not sentences:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+        embeddings = np.concatenate([
+            self._encode_batch(list(sentences[i:i + batch_size])) for i in range(0, len(sentences), batch_size)
+        ]).astype(np.float32)
+        # all-MiniLM-L6-v2 ends in a Normalize layer, so its embeddings are always unit length.
+        embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
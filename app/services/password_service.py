@@ -0,0 +1,94 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --- Password Hashing ---
+# Hashing and verifying passwords is deliberately slow, so it runs on a small pool of
+# PASSWORD_HASH_WORKERS threads per app process instead of on the request thread: a burst of
+# logins is limited to that many cores and queues there in arrival order, while the request
+# threads just wait on the result. Werkzeug hashes with hashlib's scrypt/PBKDF2, which
+# release the GIL, so the pool threads run in parallel with each other and with requests;
+# nothing forks. PASSWORD_HASH_METHOD is a Werkzeug method string and sets both
+# the algorithm and its cost. Hashes made with other parameters still verify, and are
+# replaced with a hash made with the current ones the next time that user logs in.
+#
+# Outside an app context (scripts, shells) or with PASSWORD_HASH_WORKERS=0 the work runs
+# in the calling thread.
+
+DEFAULT_HASH_METHOD = 'scrypt'
+KNOWN_HASH_ALGORITHMS = ('scrypt', 'pbkdf2')
+
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool(workers):
+    # Created lazily (and again after a fork, whose child has none of the threads) so each
+    # gunicorn worker gets its own.
+    global _POOL, _POOL_PID
+    if _POOL is None or _POOL_PID != os.getpid():
+        with _POOL_LOCK:
+            if _POOL is None or _POOL_PID != os.getpid():
+                _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                _POOL_PID = os.getpid()
+    return _POOL
+
+
+def _run(fn, *args):
+    if not has_app_context():
+        return fn(*args)
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+    if workers <= 0:
+        return fn(*args)
+    return _get_pool(workers).submit(fn, *args).result()
+
+
+def hash_method():
+    """The configured Werkzeug method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'."""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_HASH_METHOD
+    return DEFAULT_HASH_METHOD
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def verify_password(password_hash, password):
+    if not password_hash or password is None:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def is_password_hash(value):
+    """True if `value` looks like a Werkzeug hash ('method$salt$hash') rather than plain text."""
+    parts = (value or '').split('$')
+    return len(parts) == 3 and parts[0].split(':', 1)[0] in KNOWN_HASH_ALGORITHMS and all(parts)
+
+
+@lru_cache(maxsize=8)
+def _full_method(method):
+    # Werkzeug fills in default costs ('scrypt' -> 'scrypt:32768:8:1'); hashing once shows
+    # exactly which parameters new hashes get, including across Werkzeug upgrades.
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a different algorithm or cost than PASSWORD_HASH_METHOD."""
+    return password_hash.split('$', 1)[0] != _full_method(hash_method())
+
+
+def check_and_upgrade(user, password):
+    """
+    Verifies `password` against user.password. On success, a hash made with outdated
+    parameters is replaced on the object; the caller commits. Returns True on a match.
+    """
+    if not verify_password(user.password, password):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
@@ -0,0 +1,138 @@
+import json
+from datetime import datetime
+from app.extension import db
+from app.models import Slot
+from app.services.availability_service import refresh_slot_availability
+
+# --- Slot Table Maintenance ---
+# Availability is stored one row per slot in the `slots` table, keyed on
+# (doctor_id, consultation_type, start_at). Doctor.available_slots still holds the same
+# schedule as JSON for the slot editor; these helpers keep the table in step with it and
+# answer availability questions in SQL.
+
+SLOT_TYPES = ('online', 'in-person')
+SLOT_UNIQUE_CONSTRAINT = 'uq_slots_doctor_type_start'
+
+
+def normalize_consultation_type(value):
+    """Maps 'Online' / 'In-Person' (appointments, forms) to the slot keys 'online' / 'in-person'."""
+    return 'online' if (value or '').strip().lower() == 'online' else 'in-person'
+
+
+def normalize_slots_json(raw_slots, doctor_consultation_types=None):
+    """
+    Returns the slot JSON in the nested {'online': {date: [times]}, 'in-person': {...}} form.
+    Accepts a JSON string and the old flat {date: [times]} structure, which is assigned to
+    the doctor's primary consultation type (in-person unless they are online-only).
+    """
+    if isinstance(raw_slots, str):
+        try:
+            raw_slots = json.loads(raw_slots)
+        except json.JSONDecodeError:
+            return {}
+    if not isinstance(raw_slots, dict):
+        return {}
+    if any(consult_type in raw_slots for consult_type in SLOT_TYPES):
+        return {k: v for k, v in raw_slots.items() if k in SLOT_TYPES and isinstance(v, dict)}
+    default_type = 'in-person' if doctor_consultation_types in ('In-Person', 'Both') else 'online'
+    return {default_type: raw_slots}
+
+
+def iter_slot_starts(raw_slots, doctor_consultation_types=None):
+    """Yields (consultation_type, start_at) for every well-formed entry in the slot JSON."""
+    for consult_type, date_slots in normalize_slots_json(raw_slots, doctor_consultation_types).items():
+        for date_str, times in date_slots.items():
+            if not isinstance(times, list):
+                continue
+            for time_str in times:
+                try:
+                    yield consult_type, datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M')
+                except (ValueError, TypeError):
+                    continue
+
+
+def replace_doctor_slots(doctor, raw_slots, now=None):
+    """
+    Makes the doctor's upcoming slots match the given slot JSON: new slots are inserted and
+    free slots that were removed are deleted. Booked slots and past slots are never touched.
+    Does not commit. Returns (added, removed) counts.
+    """
+    now = now or datetime.now()
+    wanted = {(t, start) for t, start in iter_slot_starts(raw_slots, doctor.consultation_types) if start > now}
+    existing = Slot.query.filter(Slot.doctor_id == doctor.id, Slot.start_at > now).all()
+    existing_keys = {(slot.consultation_type, slot.start_at) for slot in existing}
+
+    removed = 0
+    for slot in existing:
+        if (slot.consultation_type, slot.start_at) not in wanted and slot.appointment_id is None:
+            db.session.delete(slot)
+            removed += 1
+    new_keys = sorted(wanted - existing_keys, key=lambda key: (key[1], key[0]))
+    db.session.add_all(Slot(doctor_id=doctor.id, consultation_type=t, start_at=start) for t, start in new_keys)
+    return len(new_keys), removed
+
+
+def is_slot_conflict(error):
+    """
+    True if an IntegrityError was raised by the (doctor_id, consultation_type, start_at)
+    unique constraint, i.e. someone else holds the slot. MySQL and PostgreSQL name the
+    constraint in the error; SQLite lists its columns.
+    """
+    message = str(getattr(error, 'orig', error))
+    return SLOT_UNIQUE_CONSTRAINT in message or 'slots.doctor_id, slots.consultation_type, slots.start_at' in message
+
+
+def claim_appointment_slot(appointment, allow_unpublished=False):
+    """
+    Atomically claims the slot for the appointment's doctor, type and time. The appointment
+    must have an id (flush first). The claim is a single compare-and-swap UPDATE that only
+    succeeds while the slot is free, so two concurrent bookings can't both win, and no row
+    lock is held beyond that statement. Returns True if the slot is now held by the appointment.
+
+    With `allow_unpublished`, a time the doctor never published (free-form bookings) is
+    claimed by inserting an already-booked slot; the unique constraint on
+    (doctor_id, consultation_type, start_at) then rejects a concurrent booking with an
+    IntegrityError for which is_slot_conflict() is true; the caller should treat it as
+    "slot taken".
+    """
+    consult_type = normalize_consultation_type(appointment.consultation_type)
+    result = db.session.execute(
+        db.update(Slot).where(
+            Slot.doctor_id == appointment.doctor_id,
+            Slot.consultation_type == consult_type,
+            Slot.start_at == appointment.appointment_date,
+            Slot.appointment_id.is_(None)
+        ).values(appointment_id=appointment.id).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        # A Core UPDATE skips the ORM flush hooks, so refresh the derived availability here.
+        refresh_slot_availability(appointment.doctor_id, appointment.appointment_date)
+        return True
+    if not allow_unpublished:
+        return False
+    db.session.add(Slot(
+        doctor_id=appointment.doctor_id,
+        consultation_type=consult_type,
+        start_at=appointment.appointment_date,
+        appointment_id=appointment.id
+    ))
+    db.session.flush()
+    return True
+
+
+def release_appointment_slot(appointment):
+    """
+    Frees the slot held by an appointment (e.g. when it is canceled). A slot that was only
+    created for a free-form booking is deleted instead, so it doesn't become bookable.
+    Does not commit.
+    """
+    slot = Slot.query.filter_by(appointment_id=appointment.id).first()
+    if slot:
+        # Through the ORM, so the doctor's availability columns are refreshed on flush
+        published = set(iter_slot_starts(slot.doctor.available_slots, slot.doctor.consultation_types))
+        if (slot.consultation_type, slot.start_at) in published:
+            slot.appointment_id = None
+        else:
+            db.session.delete(slot)
+    return slot
+
@@ -0,0 +1,92 @@
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.extension import db
+from app.models import ConversationUnread, Doctor, Message, Patient
+
+# --- Unread Message Counters ---
+# Unread counts are kept as counters instead of being counted from the messages table on
+# every page: conversation_unread holds one row per patient-doctor conversation with an
+# unread count for each side, and Patient/Doctor.unread_messages holds the recipient's total
+# for the header badge. New messages bump the counters in the same flush that inserts them;
+# mark_conversation_read() takes them back down by the number of messages it marked.
+# All changes are relative UPDATEs, so concurrent requests can't lose each other's counts.
+
+RECIPIENTS = {'patient': 'doctor', 'doctor': 'patient'} # sender_type -> recipient
+_OWNER_MODELS = {'patient': Patient, 'doctor': Doctor}
+
+
+def _bump_conversation(connection, patient_id, doctor_id, recipient, delta):
+    counters = ConversationUnread.__table__
+    column = counters.c[f'{recipient}_unread']
+    update = counters.update().where(
+        counters.c.patient_id == patient_id, counters.c.doctor_id == doctor_id
+    ).values({column: column + delta})
+    if connection.execute(update).rowcount:
+        return
+    try:
+        # First message of the conversation. The savepoint keeps a concurrent insert of the
+        # same row from failing the whole transaction; it can then be updated like any other.
+        with connection.begin_nested():
+            connection.execute(counters.insert().values(
+                patient_id=patient_id, doctor_id=doctor_id, **{column.name: max(delta, 0)}
+            ))
+    except IntegrityError:
+        connection.execute(update)
+
+
+def apply_unread_deltas(connection, deltas, session=None):
+    """
+    Applies {(patient_id, doctor_id, recipient): delta} to the conversation counters and the
+    recipients' totals. If a session is given, loaded Patient/Doctor totals are expired.
+    """
+    for (patient_id, doctor_id, recipient), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        _bump_conversation(connection, patient_id, doctor_id, recipient, delta)
+        owner_model = _OWNER_MODELS[recipient]
+        owner_id = patient_id if recipient == 'patient' else doctor_id
+        owners = owner_model.__table__
+        connection.execute(
+            owners.update().where(owners.c.id == owner_id).values(unread_messages=owners.c.unread_messages + delta)
+        )
+        if session is not None:
+            owner = session.identity_map.get(session.identity_key(owner_model, owner_id))
+            if owner is not None:
+                session.expire(owner, ['unread_messages'])
+
+
+def mark_conversation_read(patient_id, doctor_id, reader):
+    """
+    Marks the messages `reader` ('patient' or 'doctor') received in this conversation as read
+    and lowers the counters to match. Does not commit. Returns the number of messages marked;
+    callers only need to commit when it is non-zero.
+    """
+    # A primary-key read of the counter is much cheaper than an UPDATE that matches nothing.
+    unread = db.session.query(getattr(ConversationUnread, f'{reader}_unread')).filter_by(
+        patient_id=patient_id, doctor_id=doctor_id
+    ).scalar()
+    if not unread:
+        return 0
+    marked = Message.query.filter_by(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        sender_type=RECIPIENTS[reader],
+        is_read=False
+    ).update({Message.is_read: True})
+    if marked:
+        apply_unread_deltas(db.session.connection(), {(patient_id, doctor_id, reader): -marked}, db.session)
+    return marked
+
+
+def _count_new_messages(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Message) and not obj.is_read and obj.sender_type in RECIPIENTS:
+            key = (obj.patient_id, obj.doctor_id, RECIPIENTS[obj.sender_type])
+            deltas[key] = deltas.get(key, 0) + 1
+    if deltas:
+        apply_unread_deltas(session.connection(), deltas, session)
+
+# Both conversation views add messages through the ORM, so the counters move in the same flush.
+event.listen(Session, 'after_flush', _count_new_messages)
@@ -0,0 +1,115 @@
+import numpy as np
+
+# --- Vector Search Backends ---
+# Both backends operate on an L2-normalized float32 matrix (one row per symptom), so the
+# score returned for each match is the cosine similarity. `search()` returns a list of
+# (row_index, score) tuples ordered by descending score.
+
+# Above this many vectors the 'auto' backend switches from exact to approximate search.
+AUTO_IVF_THRESHOLD = 50_000
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class ExactSearchBackend:
+    """Brute-force search: one matrix-vector product over every vector."""
+    name = "exact"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query, k=1):
+        scores = self.vectors @ np.asarray(query, dtype=np.float32)
+        return [(int(i), float(scores[i])) for i in _top_k(scores, k)]
+
+
+class IVFSearchBackend:
+    """
+    Inverted-file index built in-process. Vectors are clustered with spherical k-means and
+    a query only scans the `n_probe` clusters whose centroids are closest to it, so the cost
+    per query grows with roughly sqrt(n) instead of n.
+    """
+    name = "ivf"
+
+    def __init__(self, vectors, n_lists=None, n_probe=16, train_size=65_536, iterations=10, seed=0):
+        self.vectors = vectors
+        n = len(vectors)
+        self.n_lists = max(1, min(n, n_lists or int(4 * np.sqrt(n))))
+        self.n_probe = max(1, min(n_probe, self.n_lists))
+
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(n, size=min(n, train_size), replace=False))
+        sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+        self.centroids = self._train(sample, rng, iterations)
+
+        assignments = self._assign(vectors)
+        order = np.argsort(assignments, kind='stable')
+        self.list_ids = order.astype(np.int64)
+        self.list_offsets = np.searchsorted(assignments[order], np.arange(self.n_lists + 1))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _train(self, sample, rng, iterations):
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for clusters that ended up empty.
+            non_empty = norms[:, 0] > 0
+            centroids[non_empty] = sums[non_empty] / norms[non_empty]
+        return centroids
+
+    def _assign(self, vectors, chunk_size=65_536):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def search(self, query, k=1):
+        query = np.asarray(query, dtype=np.float32)
+        probe_lists = _top_k(self.centroids @ query, self.n_probe)
+        candidates = np.concatenate([
+            self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe_lists
+        ])
+        if not len(candidates):
+            return []
+        candidates.sort()  # Sequential reads are much cheaper on a memory-mapped matrix.
+        scores = self.vectors[candidates] @ query
+        return [(int(candidates[i]), float(scores[i])) for i in _top_k(scores, k)]
+
+
+SEARCH_BACKENDS = {
+    ExactSearchBackend.name: ExactSearchBackend,
+    IVFSearchBackend.name: IVFSearchBackend,
+}
+
+
+def build_search_backend(vectors, backend="auto", **options):
+    """
+    Creates a search backend for the given normalized matrix. 'auto' uses exact search for
+    small vocabularies and the IVF index once the vocabulary exceeds AUTO_IVF_THRESHOLD.
+    Extra options are passed to the IVF backend only.
+    """
+    if backend == "auto":
+        backend = IVFSearchBackend.name if len(vectors) > AUTO_IVF_THRESHOLD else ExactSearchBackend.name
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown vector search backend '{backend}'. Choose one of: auto, {', '.join(SEARCH_BACKENDS)}.")
+    if backend == IVFSearchBackend.name:
+        return IVFSearchBackend(vectors, **options)
+    return ExactSearchBackend(vectors)
@@ -0,0 +1,96 @@
+import argparse
+import gc
+import random
+import tracemalloc
+from app.services.autocomplete_index import AutocompleteIndex
+from benchmarks.common import latency_summary, parse_int_list, timed_ms
+
+# --- Autocomplete Benchmark ---
+# Build time, memory and per-keystroke latency of AutocompleteIndex against a synthetic
+# vocabulary of symptom/specialty/location-like terms. Keystrokes are replayed by typing
+# sampled terms one character at a time (prefix lookups) and by typing fragments from the
+# middle of terms (substring lookups); latency is reported per query length, since short
+# queries match the most terms. The old full scan is timed on the same keystrokes.
+#
+#   python -m benchmarks.autocomplete [--terms 200k] [--typed 300]
+
+SYLLABLES = [
+    "ab", "ach", "al", "an", "ar", "ba", "bra", "car", "ch", "co", "der", "di", "ga", "gi", "ha", "it", "ka",
+    "la", "lo", "ma", "mi", "na", "ne", "o", "pa", "pur", "ra", "ri", "sa", "sis", "ta", "ti", "u", "va", "ya",
+]
+SUFFIXES = ["", "", "", " pain", " nagar", " syndrome", "itis", "ology", "pet", " colony", " fever", " road"]
+
+
+def make_terms(count, seed=0):
+    """`count` distinct display-ordered terms of one to three made-up words."""
+    rng = random.Random(seed)
+    terms = set()
+    while len(terms) < count:
+        words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.choice((1, 1, 2, 3)))]
+        terms.add((' '.join(words) + rng.choice(SUFFIXES)).title())
+    return sorted(terms)
+
+
+def make_keystrokes(terms, typed, seed=1):
+    """Every query a user sends while typing `typed` sampled terms (up to 8 characters each)."""
+    rng = random.Random(seed)
+    queries = []
+    for term in rng.sample(terms, typed):
+        start = 0 if rng.random() < 0.7 else rng.randrange(len(term) // 2 + 1)
+        fragment = term[start:start + 8]
+        queries.extend(fragment[:length] for length in range(1, len(fragment) + 1))
+    return queries
+
+
+def scan(terms, query, limit):
+    """The full scan the index replaced."""
+    query = query.lower()
+    starts_with = [term for term in terms if term.lower().startswith(query)]
+    contains = [term for term in terms if query in term.lower() and not term.lower().startswith(query)]
+    return (starts_with + contains)[:limit]
+
+
+def build_measured(terms):
+    """Returns (index, build seconds, peak MB allocated while building)."""
+    index, elapsed = timed_ms(AutocompleteIndex, terms)
+    # Tracing slows the build down several times, so memory is measured on a second build.
+    gc.collect()
+    tracemalloc.start()
+    AutocompleteIndex(terms)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return index, elapsed / 1000, peak / 2**20
+
+
+def run(term_count, typed, scanned, limit):
+    terms = make_terms(term_count)
+    index, build_s, peak_mb = build_measured(terms)
+    print(f"{len(terms)} terms; build {build_s:6.2f} s, peak memory {peak_mb:6.1f} MB")
+
+    queries = make_keystrokes(terms, typed)
+    by_length = {}
+    for query in queries:
+        _, elapsed = timed_ms(index.search, query, limit)
+        by_length.setdefault(min(len(query), 4), []).append(elapsed)
+    for length, samples in sorted(by_length.items()):
+        label = f"{length}+ chars" if length == 4 else f"{length} char{'s' if length > 1 else ''}"
+        print(f"  index, {label:>8}: {latency_summary(samples)}   ({len(samples)} keystrokes)")
+
+    scan_samples = []
+    mismatches = 0
+    for query in queries[:scanned]:
+        expected, elapsed = timed_ms(scan, terms, query, limit)
+        scan_samples.append(elapsed)
+        mismatches += index.search(query, limit) != expected
+    print(f"  {'full scan':>15}: {latency_summary(scan_samples)}   ({len(scan_samples)} keystrokes)")
+    print(f"  results differing from the full scan: {mismatches}/{len(scan_samples)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Autocomplete build cost and keystroke latency.")
+    parser.add_argument('--terms', type=lambda value: parse_int_list(value)[0], default=200_000)
+    parser.add_argument('--typed', type=int, default=300, help="terms typed character by character")
+    parser.add_argument('--scanned', type=int, default=200, help="keystrokes also timed against the full scan")
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    run(args.terms, args.typed, args.scanned, args.limit)
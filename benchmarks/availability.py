@@ -0,0 +1,150 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from flask import Flask
+from app.extension import db
+from app.models import Appointment, Doctor, Slot
+from app.services.availability_service import get_free_slots
+from benchmarks.common import latency_summary, timed_ms
+
+# --- Availability Benchmark ---
+# Free-slot lookup for a page of doctors: the old _filter_doctor_slots (reproduced below),
+# which parsed every doctor's slot JSON and matched booked appointments on
+# CAST(appointment_date AS DATE), against get_free_slots(), cold and memoized within a
+# request. A throwaway SQLite database holds `--doctors` doctors with 8 in-person slots a
+# day for `--days` days, about 10% of them booked. Only the database layer of the app is set
+# up; the AI models and workers aren't needed here.
+#
+#   python -m benchmarks.availability [--doctors 500] [--days 30] [--repeat 5]
+
+SLOT_HOURS = [9, 10, 11, 12, 14, 15, 16, 17]
+BOOKED_SHARE = 0.1
+
+
+def seed(doctor_count, days, rng):
+    start_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    starts = [start_day + timedelta(days=d, hours=h) for d in range(days) for h in SLOT_HOURS]
+    slot_json = {}
+    for start_at in starts:
+        slot_json.setdefault(start_at.date().isoformat(), []).append(start_at.strftime('%H:%M'))
+
+    db.session.execute(Doctor.__table__.insert(), [{
+        'NMR_ID': f'NMR{i}', 'username': f'doctor{i}', 'password': 'x', 'doctor_name': f'Doctor {i}',
+        'specialization': 'Cardiologist', 'mobile_no': '9000000000', 'email_id': f'doctor{i}@example.com',
+        'location': 'Hyderabad', 'hospital_name': 'Hospital', 'hospital_address': 'Address',
+        'hospital_contact': '040000000', 'consultation_types': 'In-Person', 'available_slots': {'in-person': slot_json},
+    } for i in range(doctor_count)])
+    doctor_ids = [row.id for row in db.session.query(Doctor.id)]
+
+    slots, appointments = [], []
+    for doctor_id in doctor_ids:
+        for start_at in starts:
+            booked = rng.random() < BOOKED_SHARE
+            if booked:
+                appointments.append({'user_id': 1, 'doctor_id': doctor_id, 'appointment_date': start_at,
+                                     'consultation_type': 'In-Person', 'status': rng.choice(['Pending', 'Confirmed'])})
+            slots.append({'doctor_id': doctor_id, 'consultation_type': 'in-person', 'start_at': start_at, 'booked': booked})
+    db.session.execute(Appointment.__table__.insert(), appointments)
+    appointment_ids = {(row.doctor_id, row.appointment_date): row.id
+                       for row in db.session.query(Appointment.id, Appointment.doctor_id, Appointment.appointment_date)}
+    for slot in slots:
+        booked = slot.pop('booked')
+        slot['appointment_id'] = appointment_ids[slot['doctor_id'], slot['start_at']] if booked else None
+    db.session.execute(Slot.__table__.insert(), slots)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    return doctor_ids, len(slots), len(appointments)
+
+
+def legacy_filter_doctor_slots(doctors):
+    """
+    _filter_doctor_slots() before the availability engine, trimmed to the new slot-JSON shape.
+    SQLite turns CAST(... AS DATE) into a number, so date() stands in for it; like the cast on
+    MySQL, it wraps the column and can't use an index.
+    """
+    now = datetime.now()
+    today = now.date()
+    all_slot_dates = {date_str for doctor in doctors for date_str in (doctor.available_slots or {}).get('in-person', {})}
+    booked_by_doctor = {}
+    for appt in Appointment.query.filter(
+        Appointment.doctor_id.in_([doctor.id for doctor in doctors]),
+        db.func.date(Appointment.appointment_date).in_(list(all_slot_dates)),
+        Appointment.status.in_(['Pending', 'Confirmed'])
+    ):
+        slot_key = f"{appt.consultation_type}_{appt.appointment_date.strftime('%Y-%m-%d')}_{appt.appointment_date.strftime('%H:%M')}"
+        booked_by_doctor.setdefault(appt.doctor_id, set()).add(slot_key)
+    filtered = {}
+    for doctor in doctors:
+        booked = booked_by_doctor.get(doctor.id, set())
+        valid_slots = {}
+        for consult_type, date_slots in (doctor.available_slots or {}).items():
+            valid_type_slots = {}
+            for date_str, times in date_slots.items():
+                if datetime.strptime(date_str, '%Y-%m-%d').date() < today:
+                    continue
+                available = [
+                    time_str for time_str in times
+                    if datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M') > now
+                    and f"{consult_type}_{date_str}_{time_str}" not in booked
+                ]
+                if available:
+                    valid_type_slots[date_str] = available
+            if valid_type_slots:
+                valid_slots[consult_type] = valid_type_slots
+        filtered[doctor.id] = valid_slots
+    return filtered
+
+
+def create_benchmark_app(directory):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    db.init_app(app)
+    return app
+
+
+def _count_slots(slots_by_doctor):
+    return sum(len(times) for slots in slots_by_doctor.values() for dates in slots.values() for times in dates.values())
+
+
+def run(doctor_count, days, repeat, directory):
+    app = create_benchmark_app(directory)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor_ids, slot_count, booked_count = seed(doctor_count, days, random.Random(0))
+    print(f"{doctor_count} doctors x {days} days: {slot_count:,} slots, {booked_count:,} booked; best of {repeat} runs")
+    window = (datetime.now().replace(second=0, microsecond=0), datetime.now() + timedelta(days=days + 1))
+
+    timings = {'old filter': [], 'engine, cold': [], 'engine, memoized': []}
+    for _ in range(repeat):
+        with app.app_context():
+            doctors = Doctor.query.all()  # The page query; not part of either path
+            old_slots, elapsed = timed_ms(legacy_filter_doctor_slots, doctors)
+            timings['old filter'].append(elapsed)
+        with app.app_context():
+            new_slots, elapsed = timed_ms(get_free_slots, doctor_ids, *window)
+            timings['engine, cold'].append(elapsed)
+            _, elapsed = timed_ms(get_free_slots, doctor_ids, *window)
+            timings['engine, memoized'].append(elapsed)
+    for label, samples in timings.items():
+        print(f"  {label:>16}: best {min(samples):9.2f} ms   {latency_summary(samples)}")
+    # The old filter built booked keys from 'In-Person' and slot keys from 'in-person', so it
+    # never hid a booked in-person slot; the engine shows only the truly free ones.
+    old_count, new_count = _count_slots(old_slots), _count_slots(new_slots)
+    print(f"  free slots listed: old filter {old_count:,} (incl. {old_count - new_count:,} booked), engine {new_count:,}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Free-slot lookup, old filter vs the availability engine.")
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp(prefix='doctorfinder-bench-')
+    try:
+        run(args.doctors, args.days, args.repeat, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,30 @@
+import time
+import numpy as np
+
+# --- Benchmark Helpers ---
+# Shared by the scripts in this package. Run them from the repository root, e.g.
+# `python -m benchmarks.vector_search`, so the `app` package is importable.
+
+
+def timed_ms(fn, *args, **kwargs):
+    """Calls fn and returns (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def latency_summary(samples_ms):
+    """'p50 ... p99 ...' for a list of per-call latencies in milliseconds."""
+    p50, p99 = np.percentile(samples_ms, [50, 99])
+    return f"p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+def parse_int_list(value):
+    """'1000,100k,1m' -> [1000, 100000, 1000000] (for argparse options)."""
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    numbers = []
+    for part in value.split(','):
+        part = part.strip().lower()
+        multiplier = multipliers.get(part[-1:], 1)
+        numbers.append(int(float(part.rstrip('km')) * multiplier))
+    return numbers
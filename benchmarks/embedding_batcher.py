@@ -0,0 +1,113 @@
+import argparse
+import random
+import threading
+import time
+import numpy as np
+from app.config import settings
+from app.services.doctor_service import EmbeddingBatcher
+from benchmarks.common import latency_summary, timed_ms
+
+# --- Embedding Micro-Batcher Benchmark ---
+# Query throughput with 1, 8 and 32 concurrent searchers, each encoding one search term at a
+# time like /find_doctor does: once calling model.encode() directly (the old path) and once
+# through EmbeddingBatcher. The model is the configured EMBEDDING_BACKEND; `--model stub`
+# swaps in a stand-in with a fixed cost per call and per text, for machines without it.
+#
+#   python -m benchmarks.embedding_batcher [--model stub] [--searchers 1,8,32]
+
+SEARCH_TERMS = [
+    "fever and headache", "chest pain", "skin rash", "tooth ache", "blurry vision", "anxiety attacks",
+    "stomach pain after eating", "knee pain", "ear infection", "high sugar", "back pain", "cough",
+    "migraine", "joint swelling", "shortness of breath", "hair loss", "acne", "sore throat",
+]
+
+
+class CountingModel:
+    """Wraps a model and counts encode() calls, to show how many requests shared a batch."""
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        return self.model.encode(texts, **kwargs)
+
+
+class StubModel:
+    """
+    Sleeps `call_ms` plus `item_ms` per text, one call at a time (a single CPU model can't
+    run two forward passes faster than one after the other), and returns random vectors.
+    """
+    def __init__(self, call_ms=8.0, item_ms=0.5, dim=384):
+        self.call_seconds = call_ms / 1000
+        self.item_seconds = item_ms / 1000
+        self.dim = dim
+        self._lock = threading.Lock()
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        with self._lock:
+            time.sleep(self.call_seconds + self.item_seconds * len(texts))
+        vectors = np.random.default_rng().standard_normal((len(texts), self.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+def load_model(name):
+    if name == 'stub':
+        return StubModel()
+    if name == 'onnx-int8':
+        from app.services.onnx_embedding import OnnxSentenceEncoder
+        return OnnxSentenceEncoder(settings.ONNX_MODEL_DIR, num_threads=settings.ONNX_NUM_THREADS)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(settings.EMBEDDING_MODEL_NAME, device='cpu')
+
+
+def run_searchers(encode, searchers, queries_per_searcher):
+    """Each searcher thread encodes its own random terms back to back. Returns (elapsed s, latencies)."""
+    barrier = threading.Barrier(searchers + 1)
+    latencies = []
+
+    def search(seed):
+        terms = random.Random(seed).choices(SEARCH_TERMS, k=queries_per_searcher)
+        barrier.wait()
+        for term in terms:
+            latencies.append(timed_ms(encode, term)[1])
+
+    threads = [threading.Thread(target=search, args=(i,)) for i in range(searchers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def run(model_name, searcher_counts, queries_per_searcher, batch_size, wait_ms):
+    model = CountingModel(load_model(model_name))
+    model.encode(SEARCH_TERMS[:4], convert_to_numpy=True, normalize_embeddings=True)  # Warm up
+    print(f"model {model_name}, batch size {batch_size}, wait {wait_ms} ms, {queries_per_searcher} queries per searcher")
+    for searchers in searcher_counts:
+        batcher = EmbeddingBatcher(model, max_batch_size=batch_size, max_wait_ms=wait_ms)
+        paths = {
+            'direct': lambda term: model.encode(term, convert_to_numpy=True, normalize_embeddings=True),
+            'batcher': batcher.encode,
+        }
+        for label, encode in paths.items():
+            model.calls = 0
+            elapsed, latencies = run_searchers(encode, searchers, queries_per_searcher)
+            print(f"  {searchers:>2} searchers, {label:>7}: {len(latencies) / elapsed:8.1f} queries/s  "
+                  f"{latency_summary(latencies)}  {model.calls:5d} model calls")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Embedding throughput with and without the micro-batcher.")
+    parser.add_argument('--model', choices=['sentence-transformers', 'onnx-int8', 'stub'], default=settings.EMBEDDING_BACKEND)
+    parser.add_argument('--searchers', default='1,8,32', type=lambda value: [int(n) for n in value.split(',')])
+    parser.add_argument('--queries', type=int, default=50, help="queries per searcher")
+    parser.add_argument('--batch-size', type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument('--wait-ms', type=float, default=settings.EMBEDDING_BATCH_WAIT_MS)
+    args = parser.parse_args()
+    run(args.model, args.searchers, args.queries, args.batch_size, args.wait_ms)
@@ -0,0 +1,79 @@
+import argparse
+import os
+import threading
+import time
+from types import SimpleNamespace
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from app.services.password_service import DEFAULT_HASH_METHOD, check_and_upgrade
+from benchmarks.common import latency_summary, timed_ms
+
+# --- Login Throughput Benchmark ---
+# A burst of concurrent logins, each verifying one password hash through
+# check_and_upgrade() as the login routes do: on the request threads themselves
+# (PASSWORD_HASH_WORKERS=0) and on the hashing pool with 1..N threads. Reports logins per
+# second per core and login latency, plus the latency of a small pure-Python job run every
+# 10 ms during the burst, which stands in for the other requests the process is serving.
+#
+#   python -m benchmarks.login_throughput [--method scrypt] [--threads 8] [--logins 8]
+
+PASSWORD = "correct horse battery staple"
+
+
+def _probe(stop, samples):
+    while not stop.is_set():
+        samples.append(timed_ms(sum, range(10_000))[1])
+        time.sleep(0.01)
+
+
+def burst(app, password_hash, thread_count, logins_per_thread):
+    """Runs the burst and returns (elapsed seconds, login latencies, probe latencies)."""
+    barrier = threading.Barrier(thread_count + 1)
+    latencies, probe_samples, stop = [], [], threading.Event()
+
+    def login():
+        with app.app_context():
+            barrier.wait()
+            for _ in range(logins_per_thread):
+                user = SimpleNamespace(password=password_hash)
+                matched, elapsed = timed_ms(check_and_upgrade, user, PASSWORD)
+                assert matched
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=login) for _ in range(thread_count)]
+    probe = threading.Thread(target=_probe, args=(stop, probe_samples))
+    for thread in threads:
+        thread.start()
+    probe.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    probe.join()
+    return elapsed, latencies, probe_samples
+
+
+def run(method, thread_count, logins_per_thread, worker_counts):
+    cores = os.cpu_count() or 1
+    password_hash, hash_ms = timed_ms(generate_password_hash, PASSWORD, method)
+    print(f"{method}: one hash takes {hash_ms:.0f} ms; {thread_count} threads x {logins_per_thread} logins on {cores} core(s)")
+    for workers in worker_counts:
+        app = Flask(__name__)
+        app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers)
+        label = "request threads" if workers == 0 else f"pool, {workers} thread{'s' if workers > 1 else ''}"
+        elapsed, latencies, probe_samples = burst(app, password_hash, thread_count, logins_per_thread)
+        rate = len(latencies) / elapsed
+        print(f"  {label:>16}: {rate / cores:6.2f} logins/s/core   login {latency_summary(latencies)}   "
+              f"other work {latency_summary(probe_samples)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concurrent login throughput, request-thread vs pooled hashing.")
+    parser.add_argument('--method', default=DEFAULT_HASH_METHOD, help="Werkzeug method string, e.g. pbkdf2:sha256:600000")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=8, help="logins per thread")
+    parser.add_argument('--workers', default=f'0,1,{os.cpu_count() or 1}', type=lambda value: sorted({int(n) for n in value.split(',')}))
+    args = parser.parse_args()
+    run(args.method, args.threads, args.logins, args.workers)
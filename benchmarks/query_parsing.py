@@ -0,0 +1,116 @@
+import argparse
+import gc
+import random
+import re
+import tracemalloc
+import spacy
+from app.services import doctor_service
+from app.services.doctor_service import QUERY_FILLER_WORDS, SPACY_EXCLUDED_PIPES, _entities_from_doc
+from app.services.location_matcher import LocationMatcher
+from benchmarks.common import latency_summary, timed_ms
+from seed_data import DISEASE_SPECIALIST_MAP, LOCATION_ALIASES, NEARBY_LOCATIONS_MAP
+
+# --- Query Parsing Benchmark ---
+# Per-query latency and model memory of extract_entities_from_query(): the full
+# en_core_web_sm pipeline parsing each query twice (the old code, reproduced below) against
+# the trimmed pipeline parsing it once, plus the nlp.pipe() batch path used to reprocess
+# SearchHistory. Queries are built from the seed symptoms and locations.
+#
+#   python -m benchmarks.query_parsing [--queries 2000]
+
+MODEL = "en_core_web_sm"
+TEMPLATES = [
+    "{symptom}", "{symptom} in {location}", "doctor for {symptom} near {location}",
+    "I have {symptom}, need a doctor in {location} or {other}", "{location} {symptom} specialist",
+]
+
+
+def make_queries(count, seed=0):
+    rng = random.Random(seed)
+    locations = [name for group in NEARBY_LOCATIONS_MAP.values() for name in group]
+    locations += [alias for aliases in LOCATION_ALIASES.values() for alias in aliases]
+    symptoms = list(DISEASE_SPECIALIST_MAP)
+    return [
+        rng.choice(TEMPLATES).format(symptom=rng.choice(symptoms), location=rng.choice(locations), other=rng.choice(locations))
+        for _ in range(count)
+    ]
+
+
+def use_seed_locations():
+    canonical_by_term = {name: name for group in NEARBY_LOCATIONS_MAP.values() for name in group}
+    for name, aliases in LOCATION_ALIASES.items():
+        for alias in aliases:
+            canonical_by_term.setdefault(alias, name)
+    doctor_service.LOCATION_MATCHER = LocationMatcher(canonical_by_term)
+
+
+def legacy_extract(nlp, query):
+    """extract_entities_from_query() before the pipeline was trimmed: NER parse, then a second parse."""
+    matcher = doctor_service.LOCATION_MATCHER
+    symptom_text = query
+    locations = []
+    for ent in nlp(query).ents:
+        if ent.label_ in ["GPE", "LOC"]:
+            locations.append(ent.text.title())
+            symptom_text = symptom_text.replace(ent.text, "")
+    for _, _, canonical_location in matcher.find(symptom_text):
+        if canonical_location not in locations:
+            locations.append(canonical_location)
+    symptom_text = matcher.strip(symptom_text)
+    symptom_words = [
+        token.text for token in nlp(symptom_text)
+        if not token.is_stop and not token.is_punct and token.text.lower() not in QUERY_FILLER_WORDS
+    ]
+    symptom_text = re.sub(r'\s+', ' ', " ".join(symptom_words)).strip()
+    final_symptom = "" if locations and not symptom_text else (symptom_text or query)
+    return {'symptom': final_symptom, 'locations': list(dict.fromkeys(locations))}
+
+
+def load_measured(**options):
+    """Loads the model and returns (nlp, MB allocated while loading it)."""
+    gc.collect()
+    tracemalloc.start()
+    nlp = spacy.load(MODEL, **options)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return nlp, allocated / 2**20
+
+
+def run(query_count, batch_size):
+    use_seed_locations()
+    queries = make_queries(query_count)
+    full_nlp, full_mb = load_measured()
+    trimmed_nlp, trimmed_mb = load_measured(exclude=SPACY_EXCLUDED_PIPES)
+    print(f"{query_count} queries; pipes kept: {', '.join(trimmed_nlp.pipe_names)}")
+    print(f"  model memory: full {full_mb:6.1f} MB   trimmed {trimmed_mb:6.1f} MB")
+
+    paths = {
+        'full pipeline, 2 parses': lambda q: legacy_extract(full_nlp, q),
+        'trimmed, 1 parse': lambda q: _entities_from_doc(q, trimmed_nlp(q)),
+    }
+    results = {}
+    for label, extract in paths.items():
+        for query in queries[:20]:  # Warm up
+            extract(query)
+        samples = []
+        results[label] = []
+        for query in queries:
+            entities, elapsed = timed_ms(extract, query)
+            samples.append(elapsed)
+            results[label].append(entities)
+        print(f"  {label:>24}: {latency_summary(samples)}   total {sum(samples) / 1000:6.2f} s")
+
+    batch, elapsed = timed_ms(lambda: [
+        _entities_from_doc(q, doc) for q, doc in zip(queries, trimmed_nlp.pipe(queries, batch_size=batch_size))
+    ])
+    print(f"  {'trimmed, nlp.pipe()':>24}: {elapsed / len(queries):8.3f} ms per query   total {elapsed / 1000:6.2f} s")
+    agree = sum(a == b for a, b in zip(results['full pipeline, 2 parses'], results['trimmed, 1 parse']))
+    print(f"  same entities as the old code: {agree}/{len(queries)}; batch matches single: {batch == results['trimmed, 1 parse']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query parsing latency and memory, full vs trimmed spaCy pipeline.")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+    run(args.queries, args.batch_size)
@@ -0,0 +1,122 @@
+import argparse
+import socketserver
+import threading
+import time
+from flask import Flask
+from flask_mail import Mail, Message as MailMessage
+from app.services.notification_service import MailTransport
+
+# --- SMTP Throughput Benchmark ---
+# Emails per second into a local SMTP sink: Flask-Mail's mail.send(), which opens a new
+# connection for every message (the old path), against MailTransport and its pooled
+# connections. The sink accepts everything and counts connections and messages. A local
+# connection is almost free, while a real provider costs a TCP connect, STARTTLS and AUTH
+# per connection; --connect-delay-ms delays the sink's greeting to stand in for that.
+#
+#   python -m benchmarks.smtp_throughput [--messages 300] [--threads 1,4] [--connect-delay-ms 100]
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: every command succeeds and DATA is read and dropped."""
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.count('connections')
+        time.sleep(self.server.connect_delay)
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250-sink")
+                self.reply("250 8BITMIME")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.count('messages')
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply("250 OK")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay_ms=0):
+        super().__init__(("127.0.0.1", 0), SmtpSinkHandler)
+        self.connect_delay = connect_delay_ms / 1000
+        self.counts = {'connections': 0, 'messages': 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = {'connections': 0, 'messages': 0}
+
+
+def create_benchmark_app(port, pool_size):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USERNAME="clinic@example.com",
+        MAIL_DEFAULT_SENDER="clinic@example.com", MAIL_SUPPRESS_SEND=False, NOTIFICATION_SMTP_POOL_SIZE=pool_size,
+    )
+    return app
+
+
+def send_all(app, send, message_count, thread_count):
+    """Sends message_count reminder emails from thread_count threads. Returns elapsed seconds."""
+    def worker(indexes):
+        with app.app_context():
+            for i in indexes:
+                msg = MailMessage("Appointment reminder", sender="clinic@example.com", recipients=[f"patient{i}@example.com"])
+                msg.body = "Your appointment is tomorrow at 10:00."
+                send(msg)
+
+    threads = [threading.Thread(target=worker, args=(range(t, message_count, thread_count),)) for t in range(thread_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run(message_count, thread_counts, connect_delay_ms):
+    sink = SmtpSink(connect_delay_ms)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    port = sink.server_address[1]
+    print(f"{message_count} emails per run, sink connect delay {connect_delay_ms} ms")
+    try:
+        for thread_count in thread_counts:
+            app = create_benchmark_app(port, pool_size=thread_count)
+            mail = Mail(app)
+            transport = MailTransport(app.config)
+            for label, send in (("Flask-Mail, connection per send", mail.send), ("pooled MailTransport", transport.send_message)):
+                sink.reset()
+                elapsed = send_all(app, send, message_count, thread_count)
+                counts = sink.counts
+                print(f"  {thread_count:>2} threads, {label:>31}: {message_count / elapsed:8.1f} msg/s  "
+                      f"({counts['messages']} delivered over {counts['connections']} connections)")
+            transport.close()
+    finally:
+        sink.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Email throughput into a local SMTP sink, with and without pooling.")
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--threads', default='1,4', type=lambda value: [int(n) for n in value.split(',')])
+    parser.add_argument('--connect-delay-ms', type=float, default=0)
+    args = parser.parse_args()
+    run(args.messages, args.threads, args.connect_delay_ms)
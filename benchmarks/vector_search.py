@@ -0,0 +1,75 @@
+import argparse
+import numpy as np
+from app.services.vector_search import build_search_backend
+from benchmarks.common import latency_summary, parse_int_list, timed_ms
+
+# --- Vector Search Benchmark ---
+# Query latency of the exact and IVF backends at several vocabulary sizes, plus how often
+# IVF returns the same top-1 symptom as exact search. The vectors are synthetic but shaped
+# like sentence embeddings: normalized, 384-d (all-MiniLM-L6-v2) and clustered around
+# topics, with each query a noisy copy of a known symptom. Memory needed is about
+# size x dim x 4 bytes (1.5 GB at 1M x 384).
+#
+#   python -m benchmarks.vector_search [--sizes 1k,100k,1m] [--queries 200]
+
+DIM = 384
+TOPICS = 2_000
+SYMPTOM_SPREAD = 1.4  # Norm of a symptom's offset from its topic, before normalizing
+QUERY_NOISE = 0.7     # Norm of a query's offset from its symptom
+
+
+def _normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _noise(shape, norm, rng):
+    # Gaussian offsets whose expected length is `norm`.
+    return rng.standard_normal(shape).astype(np.float32) * (norm / np.sqrt(shape[1]))
+
+
+def make_vectors(n, dim, rng, chunk_size=100_000):
+    """n normalized vectors scattered around TOPICS random topic directions."""
+    topics = _normalize(rng.standard_normal((min(TOPICS, n), dim)).astype(np.float32))
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        size = min(chunk_size, n - start)
+        chunk = topics[rng.integers(len(topics), size=size)] + _noise((size, dim), SYMPTOM_SPREAD, rng)
+        vectors[start:start + size] = _normalize(chunk)
+    return vectors
+
+
+def make_queries(vectors, count, rng):
+    """Noisy copies of random rows, like a misspelled or reworded known symptom."""
+    rows = vectors[rng.integers(len(vectors), size=count)]
+    return _normalize(rows + _noise(rows.shape, QUERY_NOISE, rng))
+
+
+def run(sizes, dim, query_count, seed):
+    rng = np.random.default_rng(seed)
+    for n in sizes:
+        vectors = make_vectors(n, dim, rng)
+        queries = make_queries(vectors, query_count, rng)
+        print(f"\n{n:,} symptoms x {dim}-d, {query_count} queries")
+        top1 = {}
+        for backend_name in ('exact', 'ivf'):
+            backend, build_ms = timed_ms(build_search_backend, vectors, backend_name)
+            backend.search(queries[0], k=5)  # Warm up
+            samples, results = [], []
+            for query in queries:
+                matches, elapsed = timed_ms(backend.search, query, k=5)
+                samples.append(elapsed)
+                results.append(matches[0][0] if matches else -1)
+            top1[backend_name] = np.array(results)
+            print(f"  {backend_name:>5}: {latency_summary(samples)}   build {build_ms / 1000:7.2f} s")
+        print(f"  IVF top-1 agreement with exact: {np.mean(top1['ivf'] == top1['exact']):.1%}")
+        del vectors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vector search latency at several vocabulary sizes.")
+    parser.add_argument('--sizes', type=parse_int_list, default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=DIM)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.seed)
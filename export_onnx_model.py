@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# --- ONNX Export for the Embedding Model ---
+# Exports all-MiniLM-L6-v2 to ONNX, quantizes it to int8 and writes it to ONNX_MODEL_DIR,
+# where OnnxSentenceEncoder (EMBEDDING_BACKEND=onnx-int8) picks it up. Afterwards the
+# quantized model is compared against SentenceTransformer on the seeded symptoms, so a
+# model is only shipped if it makes the same specialist decisions.
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+OUTPUT_DIR = os.getenv("ONNX_MODEL_DIR", "instance/onnx/all-MiniLM-L6-v2")
+MATCH_THRESHOLD = 0.45        # Same thresholds as map_disease_to_specialist
+DID_YOU_MEAN_THRESHOLD = 0.9
+SAMPLE_QUERIES = [
+    "fever and headache", "chest pain", "skin rash", "tooth ache", "blurry vision",
+    "anxiety attacks", "stomach pain after eating", "knee pain", "ear infection", "high sugar",
+]
+
+
+def export_model():
+    """Exports the transformer to FP32 ONNX, then writes a dynamically quantized int8 copy."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from app.services.onnx_embedding import ONNX_MODEL_FILENAME, TOKENIZER_FILENAME
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    hub_name = MODEL_NAME if "/" in MODEL_NAME else f"sentence-transformers/{MODEL_NAME}"
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name).eval()
+    tokenizer.backend_tokenizer.save(os.path.join(OUTPUT_DIR, TOKENIZER_FILENAME))
+
+    fp32_path = os.path.join(OUTPUT_DIR, "model_fp32.onnx")
+    dummy = tokenizer(["export"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in
+                          ["input_ids", "attention_mask", "token_type_ids", "last_hidden_state"]},
+            opset_version=14,
+        )
+    quantize_dynamic(fp32_path, os.path.join(OUTPUT_DIR, ONNX_MODEL_FILENAME), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    print(f"Exported int8 model to {OUTPUT_DIR}")
+
+
+def _timed_encode(model, texts, batch_size):
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+    return embeddings, (time.perf_counter() - start) * 1000
+
+
+def compare_models():
+    """Checks the int8 model against SentenceTransformer for accuracy and CPU latency."""
+    from sentence_transformers import SentenceTransformer
+    from app.services.onnx_embedding import OnnxSentenceEncoder
+    from seed_data import DISEASE_SPECIALIST_MAP
+
+    symptoms = list(DISEASE_SPECIALIST_MAP)
+    specialties = [DISEASE_SPECIALIST_MAP[s] for s in symptoms]
+    queries = SAMPLE_QUERIES + symptoms
+    reference = SentenceTransformer(MODEL_NAME, device="cpu")
+    quantized = OnnxSentenceEncoder(OUTPUT_DIR)
+
+    results = {}
+    for label, model in (("sentence-transformers", reference), ("onnx-int8", quantized)):
+        model.encode(queries[:4])  # Warm up
+        symptom_vectors, _ = _timed_encode(model, symptoms, 64)
+        query_vectors, batch_ms = _timed_encode(model, queries, 64)
+        single_ms = [_timed_encode(model, [q], 1)[1] for q in SAMPLE_QUERIES]
+        results[label] = {
+            "queries": query_vectors,
+            "scores": query_vectors @ symptom_vectors.T,
+            "batch_ms": batch_ms,
+            "p50_ms": float(np.percentile(single_ms, 50)),
+            "p95_ms": float(np.percentile(single_ms, 95)),
+        }
+
+    ref, q8 = results["sentence-transformers"], results["onnx-int8"]
+    cosine = np.sum(ref["queries"] * q8["queries"], axis=1)
+    ref_top, q8_top = ref["scores"].argmax(axis=1), q8["scores"].argmax(axis=1)
+    ref_best, q8_best = ref["scores"].max(axis=1), q8["scores"].max(axis=1)
+
+    def decision(best, top):
+        # Mirrors map_disease_to_specialist: no match / did-you-mean / confident match.
+        return [None if b < MATCH_THRESHOLD else (specialties[t], b >= DID_YOU_MEAN_THRESHOLD)
+                for b, t in zip(best, top)]
+
+    decisions_agree = np.mean([a == b for a, b in zip(decision(ref_best, ref_top), decision(q8_best, q8_top))])
+    print(f"Queries compared:          {len(queries)}")
+    print(f"Embedding cosine (min/avg): {cosine.min():.4f} / {cosine.mean():.4f}")
+    print(f"Top-1 symptom agreement:   {np.mean(ref_top == q8_top):.2%}")
+    print(f"Specialist decision match: {decisions_agree:.2%}")
+    print(f"Max best-score drift:      {np.abs(ref_best - q8_best).max():.4f}")
+    for label, result in results.items():
+        print(f"{label:>22}: batch {result['batch_ms']:.1f} ms, "
+              f"single p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms")
+    return decisions_agree == 1.0
+
+
+if __name__ == '__main__':
+    if "--compare-only" not in sys.argv:
+        export_model()
+    if not compare_models():
+        print("WARNING: the int8 model changes some specialist decisions; review before enabling it.")
+        sys.exit(1)
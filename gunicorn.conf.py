@@ -0,0 +1,9 @@
+# --- Gunicorn Settings ---
+# Gunicorn reads this file from the working directory (`gunicorn run:app`).
+
+
+def post_fork(server, worker):
+    # With --preload the app, and its notification threads, were created in the master.
+    # Threads don't survive a fork, so each worker starts its own on its own DB connections.
+    from app.services.notification_service import restart_notification_workers_after_fork
+    restart_notification_workers_after_fork()
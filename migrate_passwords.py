@@ -2,6 +2,7 @@ import os
 from app.main import create_app
 from app.models import Doctor
 from app.extension import db
+from app.services.password_service import is_password_hash
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -17,9 +18,9 @@ def migrate_doctor_passwords():
         doctors_to_update = Doctor.query.all()
         updated_count = 0
         for doctor in doctors_to_update:
-            # A simple check to see if the password is likely un-hashed.
-            # Werkzeug hashes start with 'pbkdf2:sha256:'.
-            if not doctor.password.startswith('pbkdf2:sha256:'):
+            # A simple check to see if the password is likely un-hashed. Werkzeug hashes look
+            # like 'method$salt$hash' ('scrypt:...' by default, 'pbkdf2:sha256:...' before).
+            if not is_password_hash(doctor.password):
                 print(f"Updating password for doctor: {doctor.username}")
                 doctor.set_password(doctor.password) # Hash the existing plain-text password
                 updated_count += 1
@@ -0,0 +1,33 @@
+"""add profile image variants
+
+Revision ID: 2a7b8cd1a8a2
+Revises: cc856ba3916a
+Create Date: 2026-10-17 15:32:08.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a7b8cd1a8a2'
+down_revision = 'cc856ba3916a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing uploads keep working without variants; `flask build-image-variants` fills them in.
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('patients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('patients', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
+
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
@@ -0,0 +1,116 @@
+"""add slots table
+
+Revision ID: 43c3d5aec070
+Revises: 0b044c54f3a0
+Create Date: 2026-10-17 10:12:41.512308
+
+"""
+import json
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '43c3d5aec070'
+down_revision = '0b044c54f3a0'
+branch_labels = None
+depends_on = None
+
+SLOT_TYPES = ('online', 'in-person')
+
+
+def _slot_starts(raw_slots, consultation_types):
+    """Yields (consultation_type, start_at) from both the old flat and the nested slot JSON."""
+    if isinstance(raw_slots, str):
+        try:
+            raw_slots = json.loads(raw_slots)
+        except json.JSONDecodeError:
+            return
+    if not isinstance(raw_slots, dict):
+        return
+    if any(consult_type in raw_slots for consult_type in SLOT_TYPES):
+        nested = {k: v for k, v in raw_slots.items() if k in SLOT_TYPES and isinstance(v, dict)}
+    else:
+        # Old flat {date: [times]} structure: slots belong to the doctor's primary type.
+        nested = {'in-person' if consultation_types in ('In-Person', 'Both') else 'online': raw_slots}
+    for consult_type, date_slots in nested.items():
+        for date_str, times in date_slots.items():
+            if not isinstance(times, list):
+                continue
+            for time_str in times:
+                try:
+                    yield consult_type, datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M')
+                except (ValueError, TypeError):
+                    continue
+
+
+def upgrade():
+    op.create_table('slots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('consultation_type', sa.String(length=20), nullable=False),
+    sa.Column('start_at', sa.DateTime(), nullable=False),
+    sa.Column('appointment_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('appointment_id'),
+    sa.UniqueConstraint('doctor_id', 'consultation_type', 'start_at', name='uq_slots_doctor_type_start')
+    )
+    with op.batch_alter_table('slots', schema=None) as batch_op:
+        batch_op.create_index('ix_slots_start_at_free', ['start_at', 'appointment_id', 'doctor_id'], unique=False)
+
+    # --- Data migration: Doctor.available_slots JSON -> slots rows ---
+    bind = op.get_bind()
+    doctors = sa.table('doctors',
+        sa.column('id', sa.Integer), sa.column('available_slots', sa.JSON), sa.column('consultation_types', sa.String)
+    )
+    appointments = sa.table('appointments',
+        sa.column('id', sa.Integer), sa.column('doctor_id', sa.Integer), sa.column('appointment_date', sa.DateTime),
+        sa.column('consultation_type', sa.String), sa.column('status', sa.String)
+    )
+    slots = sa.table('slots',
+        sa.column('doctor_id', sa.Integer), sa.column('consultation_type', sa.String),
+        sa.column('start_at', sa.DateTime), sa.column('appointment_id', sa.Integer)
+    )
+
+    # Existing bookings (anything not canceled) keep their slot.
+    booked, active = {}, set()
+    for appt in bind.execute(sa.select(appointments).where(appointments.c.status != 'Canceled').order_by(appointments.c.id)):
+        consult_type = 'online' if (appt.consultation_type or '').strip().lower() == 'online' else 'in-person'
+        key = (appt.doctor_id, consult_type, appt.appointment_date)
+        booked.setdefault(key, appt.id)
+        if appt.status in ('Pending', 'Confirmed'):
+            active.add(key)
+
+    rows = []
+    for doctor in bind.execute(sa.select(doctors).where(doctors.c.available_slots.isnot(None))):
+        for consult_type, start_at in sorted(set(_slot_starts(doctor.available_slots, doctor.consultation_types))):
+            rows.append({
+                'doctor_id': doctor.id,
+                'consultation_type': consult_type,
+                'start_at': start_at,
+                'appointment_id': booked.pop((doctor.id, consult_type, start_at), None),
+            })
+    # Many pending and confirmed appointments have no published slot left: free-form bookings
+    # were never in available_slots, and the old slot filter wrote the JSON back without booked
+    # times when the booking committed. They still get a booked row, or nothing would stop
+    # another booking of the same time.
+    for (doctor_id, consult_type, start_at), appointment_id in sorted(booked.items(), key=lambda item: item[1]):
+        if (doctor_id, consult_type, start_at) in active:
+            rows.append({
+                'doctor_id': doctor_id,
+                'consultation_type': consult_type,
+                'start_at': start_at,
+                'appointment_id': appointment_id,
+            })
+    if rows:
+        op.bulk_insert(slots, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('slots', schema=None) as batch_op:
+        batch_op.drop_index('ix_slots_start_at_free')
+
+    op.drop_table('slots')
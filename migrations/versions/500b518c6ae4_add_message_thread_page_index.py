@@ -0,0 +1,30 @@
+"""add message thread page index
+
+Revision ID: 500b518c6ae4
+Revises: 7bd8bffe8cd6
+Create Date: 2026-10-17 14:05:52.731906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '500b518c6ae4'
+down_revision = '7bd8bffe8cd6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The id column makes the index cover the (timestamp, id) keyset used for thread pages.
+    # The new index is created first so the patient_id foreign key always has one to use.
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_patient_doctor_timestamp_id', ['patient_id', 'doctor_id', 'timestamp', 'id'], unique=False)
+        batch_op.drop_index('ix_messages_patient_doctor_timestamp')
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_patient_doctor_timestamp', ['patient_id', 'doctor_id', 'timestamp'], unique=False)
+        batch_op.drop_index('ix_messages_patient_doctor_timestamp_id')
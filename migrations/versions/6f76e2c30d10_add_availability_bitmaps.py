@@ -0,0 +1,79 @@
+"""add availability bitmaps
+
+Revision ID: 6f76e2c30d10
+Revises: 2a7b8cd1a8a2
+Create Date: 2026-10-17 16:20:44.102935
+
+"""
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f76e2c30d10'
+down_revision = '2a7b8cd1a8a2'
+branch_labels = None
+depends_on = None
+
+MINUTES_PER_DAY = 24 * 60
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+
+def _day_bitmap(start_times):
+    bits = bytearray(BITMAP_BYTES)
+    for start_at in start_times:
+        minute = start_at.hour * 60 + start_at.minute
+        bits[minute // 8] |= 0x80 >> (minute % 8) # Same (big-endian) bit order as numpy.packbits
+    return bytes(bits)
+
+
+def upgrade():
+    op.create_table('availability_bitmaps',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('bits', sa.LargeBinary(length=BITMAP_BYTES), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ),
+    sa.PrimaryKeyConstraint('doctor_id', 'day')
+    )
+    with op.batch_alter_table('availability_bitmaps', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_availability_bitmaps_day'), ['day'], unique=False)
+
+    # --- Backfill from today's and future free slots ---
+    bind = op.get_bind()
+    slots = sa.table('slots',
+        sa.column('doctor_id', sa.Integer), sa.column('start_at', sa.DateTime), sa.column('appointment_id', sa.Integer)
+    )
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    free_starts = {}
+    for doctor_id, start_at in bind.execute(
+        sa.select(slots.c.doctor_id, slots.c.start_at).where(slots.c.start_at >= today, slots.c.appointment_id.is_(None))
+    ):
+        free_starts.setdefault((doctor_id, start_at.date()), []).append(start_at)
+
+    bitmaps = sa.table('availability_bitmaps',
+        sa.column('doctor_id', sa.Integer), sa.column('day', sa.Date), sa.column('bits', sa.LargeBinary)
+    )
+    if free_starts:
+        op.bulk_insert(bitmaps, [
+            {'doctor_id': doctor_id, 'day': day, 'bits': _day_bitmap(starts)}
+            for (doctor_id, day), starts in free_starts.items()
+        ])
+
+    # free_slots_7d is now derived from the bitmaps, which count free start times.
+    now = datetime.now().replace(second=0, microsecond=0)
+    doctors = sa.table('doctors', sa.column('id', sa.Integer), sa.column('free_slots_7d', sa.Integer))
+    week_counts = bind.execute(
+        sa.select(slots.c.doctor_id, sa.func.count(sa.distinct(slots.c.start_at)))
+        .where(slots.c.start_at > now, slots.c.start_at < now + timedelta(days=7), slots.c.appointment_id.is_(None))
+        .group_by(slots.c.doctor_id)
+    ).all()
+    for doctor_id, week_count in week_counts:
+        bind.execute(doctors.update().where(doctors.c.id == doctor_id).values(free_slots_7d=week_count))
+
+
+def downgrade():
+    with op.batch_alter_table('availability_bitmaps', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_availability_bitmaps_day'))
+
+    op.drop_table('availability_bitmaps')
@@ -0,0 +1,88 @@
+"""add unread message counters
+
+Revision ID: 7bd8bffe8cd6
+Revises: aa97d8a2b5d6
+Create Date: 2026-10-17 13:20:17.604412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7bd8bffe8cd6'
+down_revision = 'aa97d8a2b5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversation_unread',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('patient_unread', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('doctor_unread', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ),
+    sa.PrimaryKeyConstraint('patient_id', 'doctor_id')
+    )
+    with op.batch_alter_table('conversation_unread', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_conversation_unread_doctor_id'), ['doctor_id'], unique=False)
+
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_messages', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('patients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_messages', sa.Integer(), server_default='0', nullable=False))
+
+    # --- Backfill from the messages table ---
+    bind = op.get_bind()
+    messages = sa.table('messages',
+        sa.column('id', sa.Integer), sa.column('patient_id', sa.Integer), sa.column('doctor_id', sa.Integer),
+        sa.column('sender_type', sa.String), sa.column('is_read', sa.Boolean)
+    )
+    doctors = sa.table('doctors', sa.column('id', sa.Integer), sa.column('unread_messages', sa.Integer))
+    patients = sa.table('patients', sa.column('id', sa.Integer), sa.column('unread_messages', sa.Integer))
+    counters = sa.table('conversation_unread',
+        sa.column('patient_id', sa.Integer), sa.column('doctor_id', sa.Integer),
+        sa.column('patient_unread', sa.Integer), sa.column('doctor_unread', sa.Integer)
+    )
+
+    rows = {}
+    for patient_id, doctor_id, sender_type, unread in bind.execute(
+        sa.select(messages.c.patient_id, messages.c.doctor_id, messages.c.sender_type, sa.func.count(messages.c.id))
+        .where(messages.c.is_read == sa.false())
+        .group_by(messages.c.patient_id, messages.c.doctor_id, messages.c.sender_type)
+    ):
+        if sender_type not in ('patient', 'doctor'):
+            continue
+        row = rows.setdefault((patient_id, doctor_id), {
+            'patient_id': patient_id, 'doctor_id': doctor_id, 'patient_unread': 0, 'doctor_unread': 0
+        })
+        # A message counts as unread for the side that didn't send it.
+        row['doctor_unread' if sender_type == 'patient' else 'patient_unread'] += unread
+    if rows:
+        op.bulk_insert(counters, list(rows.values()))
+
+    doctor_totals = {}
+    patient_totals = {}
+    for row in rows.values():
+        doctor_totals[row['doctor_id']] = doctor_totals.get(row['doctor_id'], 0) + row['doctor_unread']
+        patient_totals[row['patient_id']] = patient_totals.get(row['patient_id'], 0) + row['patient_unread']
+    for table, totals in ((doctors, doctor_totals), (patients, patient_totals)):
+        for owner_id, total in totals.items():
+            if total:
+                bind.execute(table.update().where(table.c.id == owner_id).values(unread_messages=total))
+
+
+def downgrade():
+    with op.batch_alter_table('patients', schema=None) as batch_op:
+        batch_op.drop_column('unread_messages')
+
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.drop_column('unread_messages')
+
+    with op.batch_alter_table('conversation_unread', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_conversation_unread_doctor_id'))
+
+    op.drop_table('conversation_unread')
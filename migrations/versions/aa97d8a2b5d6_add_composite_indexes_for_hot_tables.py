@@ -0,0 +1,58 @@
+"""add composite indexes for hot tables
+
+Revision ID: aa97d8a2b5d6
+Revises: e81c8c7d831a
+Create Date: 2026-10-17 12:30:44.118027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aa97d8a2b5d6'
+down_revision = 'e81c8c7d831a'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'appointments': [
+        ('ix_appointments_doctor_status_date', ['doctor_id', 'status', 'appointment_date']),
+        ('ix_appointments_user_status_date', ['user_id', 'status', 'appointment_date']),
+        ('ix_appointments_user_doctor_status_date', ['user_id', 'doctor_id', 'status', 'appointment_date']),
+    ],
+    'messages': [
+        ('ix_messages_patient_doctor_timestamp', ['patient_id', 'doctor_id', 'timestamp']),
+        ('ix_messages_doctor_patient_timestamp', ['doctor_id', 'patient_id', 'timestamp']),
+        ('ix_messages_doctor_sender_read', ['doctor_id', 'sender_type', 'is_read']),
+        ('ix_messages_patient_sender_read', ['patient_id', 'sender_type', 'is_read']),
+    ],
+    'reviews': [
+        ('ix_reviews_doctor_timestamp', ['doctor_id', 'timestamp']),
+        ('ix_reviews_patient_timestamp', ['patient_id', 'timestamp']),
+    ],
+    'search_history': [
+        ('ix_search_history_patient_id_id', ['patient_id', 'id']),
+        ('ix_search_history_patient_timestamp', ['patient_id', 'timestamp']),
+    ],
+}
+
+
+def upgrade():
+    for table_name, indexes in INDEXES.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for index_name, columns in indexes:
+                batch_op.create_index(index_name, columns, unique=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table_name, indexes in INDEXES.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            if bind.dialect.name == 'mysql':
+                # MySQL drops its implicit foreign-key index once a composite index can serve the
+                # foreign key, and refuses to drop the last index a foreign key relies on.
+                for column in sorted({columns[0] for _, columns in indexes}):
+                    batch_op.create_index(f'ix_{table_name}_{column}', [column], unique=False)
+            for index_name, _ in reversed(indexes):
+                batch_op.drop_index(index_name)
@@ -0,0 +1,29 @@
+"""add doctor search indexes
+
+Revision ID: b3d91f4e7a52
+Revises: 6f76e2c30d10
+Create Date: 2026-10-17 17:05:12.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d91f4e7a52'
+down_revision = '6f76e2c30d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # find_doctor filters by specialization and/or location; without these it scans every doctor.
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.create_index('ix_doctors_specialization_location', ['specialization', 'location'], unique=False)
+        batch_op.create_index('ix_doctors_location', ['location'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.drop_index('ix_doctors_location')
+        batch_op.drop_index('ix_doctors_specialization_location')
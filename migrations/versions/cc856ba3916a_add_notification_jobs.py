@@ -0,0 +1,44 @@
+"""add notification jobs
+
+Revision ID: cc856ba3916a
+Revises: 500b518c6ae4
+Create Date: 2026-10-17 14:48:20.115732
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cc856ba3916a'
+down_revision = '500b518c6ae4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('recipient', sa.String(length=255), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_jobs_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_jobs_status_next_attempt')
+
+    op.drop_table('notification_jobs')
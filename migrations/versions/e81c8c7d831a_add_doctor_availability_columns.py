@@ -0,0 +1,55 @@
+"""add doctor next_available_at and free_slots_7d
+
+Revision ID: e81c8c7d831a
+Revises: 43c3d5aec070
+Create Date: 2026-10-17 11:48:05.209644
+
+"""
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81c8c7d831a'
+down_revision = '43c3d5aec070'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_available_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('free_slots_7d', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_doctors_next_available_at'), ['next_available_at'], unique=False)
+
+    # --- Backfill from the slots table ---
+    bind = op.get_bind()
+    now = datetime.now().replace(second=0, microsecond=0)
+    slots = sa.table('slots',
+        sa.column('id', sa.Integer), sa.column('doctor_id', sa.Integer),
+        sa.column('start_at', sa.DateTime), sa.column('appointment_id', sa.Integer)
+    )
+    doctors = sa.table('doctors',
+        sa.column('id', sa.Integer), sa.column('next_available_at', sa.DateTime), sa.column('free_slots_7d', sa.Integer)
+    )
+    free_after_now = sa.and_(slots.c.start_at > now, slots.c.appointment_id.is_(None))
+    next_at = dict(bind.execute(
+        sa.select(slots.c.doctor_id, sa.func.min(slots.c.start_at)).where(free_after_now).group_by(slots.c.doctor_id)
+    ).all())
+    week_counts = dict(bind.execute(
+        sa.select(slots.c.doctor_id, sa.func.count(slots.c.id))
+        .where(free_after_now, slots.c.start_at < now + timedelta(days=7)).group_by(slots.c.doctor_id)
+    ).all())
+    for doctor_id, next_available_at in next_at.items():
+        bind.execute(
+            doctors.update().where(doctors.c.id == doctor_id)
+            .values(next_available_at=next_available_at, free_slots_7d=week_counts.get(doctor_id, 0))
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('doctors', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_doctors_next_available_at'))
+        batch_op.drop_column('free_slots_7d')
+        batch_op.drop_column('next_available_at')
@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import pytest
+
+# The app reads its settings from the environment when app.config is first imported, so the
+# test database and upload folder are set up before anything imports the app.
+TEST_DIR = tempfile.mkdtemp(prefix='doctorfinder-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ['UPLOAD_FOLDER'] = os.path.join(TEST_DIR, 'static', 'uploads')
+os.environ['EMBEDDING_INDEX_DIR'] = os.path.join(TEST_DIR, 'embedding_index')
+os.environ['PASSWORD_HASH_WORKERS'] = '0'  # hash on the test thread
+os.environ['NOTIFICATION_WORKERS'] = '0'
+os.environ['NOTIFICATION_TRANSPORT'] = 'stand-in'
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app.main import create_app
+    app = create_app()
+    app.config.update(TESTING=True)
+    yield app
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db(app):
+    """A fresh, empty schema for each test, with an app context pushed."""
+    from app.extension import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
@@ -0,0 +1,59 @@
+import random
+from array import array
+import pytest
+from app.services.autocomplete_index import AutocompleteIndex, _RankedRange
+
+
+def _scan(terms, query, limit):
+    """The full scan the index replaced: prefix matches, then substring matches, each in display order."""
+    query = query.lower()
+    starts_with = [term for term in terms if term.lower().startswith(query)]
+    contains = [term for term in terms if query in term.lower() and not term.lower().startswith(query)]
+    return (starts_with + contains)[:limit]
+
+
+def test_contains_matches_are_the_top_ranked_not_the_first_found():
+    # Display order is the reverse of suffix order, so the first `limit` suffixes found are the worst ranked.
+    terms = [f"{letter}ache" for letter in "zyxwvutsrqponmlkjihgfedcb"]
+    index = AutocompleteIndex(terms)
+    assert index.search("ache", limit=5) == terms[:5]
+    assert index.search("ache", limit=5) == _scan(terms, "ache", 5)
+
+
+def test_prefix_matches_are_the_top_ranked_not_the_first_alphabetically():
+    terms = [f"pain {letter}" for letter in "zyxwvutsrqponmlkjihgfedcba"]
+    index = AutocompleteIndex(terms)
+    assert index.search("pain", limit=5) == terms[:5]
+
+
+@pytest.mark.parametrize('limit', [1, 3, 10, 50])
+def test_search_matches_a_full_scan(limit):
+    rng = random.Random(7)
+    terms = list(dict.fromkeys(''.join(rng.choice('abc ') for _ in range(rng.randint(2, 8))) for _ in range(400)))
+    index = AutocompleteIndex(terms)
+    for query in ['a', 'b', 'ab', 'ca', 'bc a', 'A', 'cab', 'zz']:
+        assert index.search(query, limit=limit) == _scan(terms, query, limit), query
+
+
+def test_ranked_range_yields_any_range_in_ascending_order():
+    rng = random.Random(3)
+    ranks = [rng.randrange(500) for _ in range(2000)]
+    ranked = _RankedRange(array('i', ranks))
+    for _ in range(300):
+        lo = rng.randrange(len(ranks))
+        hi = rng.randrange(lo, len(ranks) + 1)
+        assert list(ranked.ascending(lo, hi)) == sorted(ranks[lo:hi]), (lo, hi)
+
+
+def test_lookup_work_depends_on_limit_not_on_the_number_of_matches(monkeypatch):
+    terms = [f"pain {i:05d}" for i in range(20000)]
+    index = AutocompleteIndex(terms)
+    argmin_calls = []
+    original = _RankedRange._argmin
+    monkeypatch.setattr(_RankedRange, '_argmin', lambda self, lo, hi: argmin_calls.append(hi - lo) or original(self, lo, hi))
+
+    assert index.search("pain", limit=10) == terms[:10]
+    assert len(argmin_calls) <= 2 * 10 + 1
+    argmin_calls.clear()
+    assert index.search("ain", limit=10) == terms[:10]
+    assert len(argmin_calls) <= 2 * 10 + 1
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models import Appointment, AvailabilityBitmap, Doctor, Patient, Slot
+from app.services.availability_service import build_day_bitmap, summarize_bitmaps, sweep_doctor_availability
+from app.services.booking_service import book_appointment
+from app.services.slot_service import release_appointment_slot
+
+TOMORROW = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def doctor(db):
+    doctor = Doctor(NMR_ID='NMR1', username='doctor', password='x', doctor_name='Doctor', specialization='Cardiologist',
+                    mobile_no='9000000000', email_id='doctor@example.com', location='Hyderabad', hospital_name='Hospital',
+                    hospital_address='Address', hospital_contact='040000000', consultation_types='Both')
+    db.session.add(doctor)
+    db.session.add(Patient(username='patient', password='x', name='Patient', mobile='9000000000', location='Hyderabad'))
+    db.session.commit()
+    return doctor
+
+
+def _bitmaps(doctor_id):
+    return {bitmap.day: bitmap.bits for bitmap in AvailabilityBitmap.query.filter_by(doctor_id=doctor_id)}
+
+
+def test_slot_edits_rebuild_the_touched_day_bitmaps(db, doctor):
+    starts = [TOMORROW.replace(hour=10, minute=10), TOMORROW.replace(hour=9, minute=45), TOMORROW + timedelta(days=2, hours=9)]
+    db.session.add_all(Slot(doctor_id=doctor.id, consultation_type='in-person', start_at=start) for start in starts)
+    db.session.commit()
+
+    assert _bitmaps(doctor.id) == {
+        TOMORROW.date(): build_day_bitmap(starts[:2]),
+        starts[2].date(): build_day_bitmap(starts[2:])
+    }
+    assert doctor.next_available_at == starts[1]
+    assert doctor.free_slots_7d == 3
+
+    # Moving a slot to another day rebuilds both days; the emptied day loses its row.
+    moved = Slot.query.filter_by(doctor_id=doctor.id, start_at=starts[2]).one()
+    moved.start_at = TOMORROW.replace(hour=11)
+    db.session.commit()
+    assert _bitmaps(doctor.id) == {TOMORROW.date(): build_day_bitmap(starts[:2] + [moved.start_at])}
+
+
+def test_booking_and_cancelling_update_availability(db, doctor):
+    first, second = TOMORROW.replace(hour=10, minute=10), TOMORROW.replace(hour=10, minute=40)
+    db.session.add_all([
+        Slot(doctor_id=doctor.id, consultation_type='in-person', start_at=first),
+        Slot(doctor_id=doctor.id, consultation_type='in-person', start_at=second)
+    ])
+    db.session.commit()
+    patient_id = Patient.query.one().id
+
+    appointment = book_appointment(user_id=patient_id, doctor_id=doctor.id, appointment_date=first, consultation_type='In-Person')
+    assert _bitmaps(doctor.id) == {TOMORROW.date(): build_day_bitmap([second])}
+    assert (doctor.next_available_at, doctor.free_slots_7d) == (second, 1)
+
+    appointment.status = 'Canceled'
+    release_appointment_slot(appointment)
+    db.session.commit()
+    # The freed slot wasn't published in the slot JSON, so it's deleted rather than reopened.
+    assert Slot.query.filter_by(start_at=first).count() == 0
+    assert Appointment.query.count() == 1
+    assert (doctor.next_available_at, doctor.free_slots_7d) == (second, 1)
+
+
+def test_summary_counts_only_future_slots_within_the_window():
+    now = TOMORROW.replace(hour=10, minute=10)
+    rows = [
+        (1, now.date(), build_day_bitmap([now, now.replace(minute=11)])),
+        (1, (now + timedelta(days=7)).date(), build_day_bitmap([now + timedelta(days=7, minutes=-1), now + timedelta(days=7)])),
+        (2, now.date(), build_day_bitmap([now.replace(hour=9)])),
+        (3, (now + timedelta(days=9)).date(), build_day_bitmap([now + timedelta(days=9)]))
+    ]
+
+    assert summarize_bitmaps(rows, now) == {
+        1: (now.replace(minute=11), 2),
+        2: (None, 0),
+        3: (now + timedelta(days=9), 0)
+    }
+    assert summarize_bitmaps([], now) == {}
+
+
+def test_sweep_drops_started_slots_and_past_bitmaps(db, doctor):
+    first, later = TOMORROW.replace(hour=9), TOMORROW + timedelta(days=1, hours=9)
+    db.session.add_all([
+        Slot(doctor_id=doctor.id, consultation_type='online', start_at=first),
+        Slot(doctor_id=doctor.id, consultation_type='online', start_at=later)
+    ])
+    db.session.commit()
+
+    assert sweep_doctor_availability(now=first + timedelta(days=1, minutes=-30)) == 1
+    db.session.expire_all()
+    assert list(_bitmaps(doctor.id)) == [later.date()]
+    assert (doctor.next_available_at, doctor.free_slots_7d) == (later, 1)
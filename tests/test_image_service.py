@@ -0,0 +1,64 @@
+import io
+import os
+import pytest
+from PIL import Image
+from app.services.image_service import InvalidImageError, store_image
+
+
+def _jpeg_bytes(width=800, height=600):
+    # A gradient compresses like a photo rather than like a flat colour.
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _stored_files(upload_folder):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), upload_folder)
+        for root, _, names in os.walk(upload_folder) for name in names
+    )
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    folder = tmp_path / 'static' / 'uploads'
+    folder.mkdir(parents=True)
+    return str(folder)
+
+
+def test_store_image_writes_original_and_thumbnails(upload_folder):
+    image_path, variants = store_image(upload_folder, io.BytesIO(_jpeg_bytes()))
+
+    assert image_path.startswith('uploads/') and image_path.endswith('.jpeg')
+    static_folder = os.path.dirname(upload_folder)
+    for name, size in (('thumb', 128), ('card', 320)):
+        for fmt in ('jpeg', 'webp'):
+            with Image.open(os.path.join(static_folder, variants[name][fmt])) as thumb:
+                assert thumb.size == (size, size)
+
+
+def test_identical_uploads_share_one_file(upload_folder):
+    data = _jpeg_bytes()
+    first, _ = store_image(upload_folder, io.BytesIO(data))
+    second, _ = store_image(upload_folder, io.BytesIO(data))
+
+    assert first == second
+    assert len(_stored_files(upload_folder)) == 5  # original + 2 sizes x 2 formats
+
+
+def test_truncated_jpeg_is_rejected_without_leaving_files(upload_folder):
+    data = _jpeg_bytes()
+    truncated = data[:len(data) // 2]
+    with Image.open(io.BytesIO(truncated)) as img:
+        img.verify()  # The header is intact: only decoding notices the missing data.
+
+    with pytest.raises(InvalidImageError):
+        store_image(upload_folder, io.BytesIO(truncated))
+    assert _stored_files(upload_folder) == []
+
+
+def test_non_image_is_rejected(upload_folder):
+    with pytest.raises(InvalidImageError):
+        store_image(upload_folder, io.BytesIO(b'not an image'))
+    assert _stored_files(upload_folder) == []
@@ -0,0 +1,77 @@
+import pytest
+from app.models import Location, LocationAlias, Specialty, Symptom
+from app.services import doctor_service
+from app.services.autocomplete_index import AutocompleteIndex
+
+
+@pytest.fixture
+def location_data(monkeypatch, db):
+    """Seeded symptom and location tables, loaded the way the warm-up does it."""
+    for name in ('AUTOCOMPLETE_DATA', 'AUTOCOMPLETE_INDEX', 'LOCATION_MATCHER', 'LOCATION_GRAPH'):
+        monkeypatch.setattr(doctor_service, name, getattr(doctor_service, name))
+    monkeypatch.setattr(doctor_service, 'LOCATION_DATA_STATE', {"checked_at": None, "signature": None, "stale": False})
+    cardiologist = Specialty(name='Cardiologist')
+    db.session.add_all([Symptom(name='chest pain', specialty=cardiologist), Symptom(name='palpitations', specialty=cardiologist)])
+    hyderabad = Location(name='Hyderabad')
+    db.session.add_all([hyderabad, Location(name='Secunderabad', parent=hyderabad), LocationAlias(alias='hyd', location=hyderabad)])
+    db.session.commit()
+    assert doctor_service._load_autocomplete()
+    return db
+
+
+def _add_location_from_another_worker(db, name):
+    # A Core insert on its own connection skips this process's session events, like a change
+    # made by another worker.
+    with db.engine.begin() as connection:
+        connection.execute(Location.__table__.insert().values(name=name))
+
+
+def test_unchanged_tables_are_only_rechecked(location_data):
+    graph, indexes = doctor_service.LOCATION_GRAPH, doctor_service.AUTOCOMPLETE_INDEX
+    checked_at = doctor_service.LOCATION_DATA_STATE["checked_at"]
+
+    doctor_service._refresh_location_snapshot()
+
+    assert doctor_service.LOCATION_GRAPH is graph
+    assert doctor_service.AUTOCOMPLETE_INDEX is indexes
+    assert doctor_service.LOCATION_DATA_STATE["checked_at"] > checked_at
+
+
+def test_changes_by_other_workers_rebuild_only_the_location_data(location_data):
+    graph, terms_index = doctor_service.LOCATION_GRAPH, doctor_service.AUTOCOMPLETE_INDEX["terms"]
+    _add_location_from_another_worker(location_data, 'Secunderabad Cantonment')
+
+    doctor_service._refresh_location_snapshot()
+
+    assert doctor_service.LOCATION_GRAPH is not graph
+    assert doctor_service.AUTOCOMPLETE_INDEX["terms"] is terms_index
+    assert doctor_service.get_location_suggestions('cant') == ['Secunderabad Cantonment']
+
+
+def test_local_changes_mark_the_location_data_stale(location_data):
+    location_data.session.add(Location(name='Kukatpally'))
+    location_data.session.commit()
+    assert doctor_service.LOCATION_DATA_STATE["stale"]
+
+    doctor_service._refresh_location_snapshot()
+
+    assert not doctor_service.LOCATION_DATA_STATE["stale"]
+    assert doctor_service.LOCATION_GRAPH.group('Kukatpally')
+
+
+@pytest.mark.parametrize('limit', [1, 2, 10])
+def test_suggestions_merge_terms_and_locations_in_display_order(location_data, limit):
+    combined = AutocompleteIndex(sorted(doctor_service.AUTOCOMPLETE_DATA["terms"] + doctor_service.AUTOCOMPLETE_DATA["locations"]))
+    for query in ['a', 'e', 'hyd', 'pa', 'ches', 'zz']:
+        assert doctor_service.get_autocomplete_suggestions(query, limit) == combined.search(query, limit), query
+
+
+def test_location_names_win_over_aliases_spelled_the_same(location_data):
+    # 'secunderabad' is also an alias of Hyderabad; the Secunderabad location itself must win.
+    hyderabad = Location.query.filter_by(name='Hyderabad').one()
+    location_data.session.add(LocationAlias(alias='secunderabad', location=hyderabad))
+    location_data.session.commit()
+    doctor_service._refresh_location_snapshot()
+
+    assert doctor_service.LOCATION_MATCHER.find('cardiologist in secunderabad') == [(16, 28, 'Secunderabad')]
+    assert doctor_service.LOCATION_GRAPH.canonical_name('secunderabad') == 'Secunderabad'
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import pytest
+from app.config import settings
+from app.extension import db
+from app.main import create_app
+from app.services import notification_service
+from app.services.notification_service import (
+    NotificationWorker, get_notification_worker, restart_notification_workers_after_fork
+)
+
+
+@pytest.fixture
+def idle_workers(monkeypatch):
+    """Worker threads that just wait to be released, so tests can start pools without sending anything."""
+    release = threading.Event()
+    monkeypatch.setattr(NotificationWorker, '_run', lambda self: release.wait(30))
+    monkeypatch.setattr(notification_service, 'NOTIFICATION_WORKER', None)
+    yield
+    release.set()
+
+
+def test_create_app_starts_notification_workers(monkeypatch, idle_workers):
+    monkeypatch.setattr(settings, 'NOTIFICATION_WORKERS', 3)
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI', raising=False)
+    app = create_app()
+
+    worker = get_notification_worker(app)
+    assert len(worker._threads) == 3
+    assert all(thread.is_alive() for thread in worker._threads)
+
+
+@pytest.mark.parametrize('workers,from_cli', [(0, False), (3, True)], ids=['disabled', 'flask cli'])
+def test_create_app_leaves_workers_stopped(monkeypatch, idle_workers, workers, from_cli):
+    monkeypatch.setattr(settings, 'NOTIFICATION_WORKERS', workers)
+    if from_cli:
+        monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+    create_app()
+
+    assert notification_service.NOTIFICATION_WORKER is None
+
+
+def _in_forked_child(app, before_report=None):
+    """Forks, optionally runs `before_report` in the child, and returns what the child saw."""
+    with app.app_context():
+        parent_pool = db.engine.pool
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            if before_report:
+                before_report()
+            with app.app_context():
+                pool_replaced = db.engine.pool is not parent_pool
+            senders = [t.name for t in threading.enumerate() if t.name.startswith('notification-worker')]
+            os.write(write_fd, json.dumps({'senders': senders, 'pool_replaced': pool_replaced}).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as pipe:
+        return json.loads(pipe.read())
+
+
+def test_forked_children_do_not_start_notification_workers(monkeypatch, idle_workers):
+    # e.g. multiprocessing helpers: they must never claim jobs on the parent's connections.
+    monkeypatch.setattr(settings, 'NOTIFICATION_WORKERS', 2)
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI', raising=False)
+    app = create_app()
+    assert len(get_notification_worker(app)._threads) == 2
+
+    assert _in_forked_child(app)['senders'] == []
+
+
+def test_post_fork_hook_restarts_workers_on_fresh_connections(monkeypatch, idle_workers):
+    monkeypatch.setattr(settings, 'NOTIFICATION_WORKERS', 2)
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI', raising=False)
+    app = create_app()
+
+    child = _in_forked_child(app, restart_notification_workers_after_fork)
+    assert child == {'senders': ['notification-worker-0', 'notification-worker-1'], 'pool_replaced': True}
+    assert restart_notification_workers_after_fork() is get_notification_worker(app)  # No-op in the parent
+    assert len(get_notification_worker(app)._threads) == 2
+
+
+def test_send_notifications_uses_notification_workers_by_default(app, monkeypatch):
+    sizes = []
+    monkeypatch.setattr(NotificationWorker, 'join', lambda self: sizes.append(self.size))
+    runner = app.test_cli_runner()
+
+    monkeypatch.setitem(app.config, 'NOTIFICATION_WORKERS', 4)
+    assert runner.invoke(args=['send-notifications']).exit_code == 0
+    assert runner.invoke(args=['send-notifications', '--workers', '1']).exit_code == 0
+    assert sizes == [4, 1]
+
+    monkeypatch.setitem(app.config, 'NOTIFICATION_WORKERS', 0)
+    result = runner.invoke(args=['send-notifications'])
+    assert result.exit_code != 0
+    assert '--workers' in result.output
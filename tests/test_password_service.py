@@ -0,0 +1,37 @@
+import multiprocessing
+import threading
+from types import SimpleNamespace
+import pytest
+from werkzeug.security import generate_password_hash
+from app.services import password_service
+from app.services.password_service import check_and_upgrade, hash_password, verify_password
+
+
+@pytest.fixture
+def hash_workers(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_WORKERS', 2)
+    monkeypatch.setattr(password_service, '_POOL', None)
+    with app.app_context():
+        yield
+
+
+def test_hashing_runs_on_pool_threads_without_forking(hash_workers, monkeypatch):
+    threads = []
+    real_hash = password_service.generate_password_hash
+    monkeypatch.setattr(password_service, 'generate_password_hash',
+                        lambda *args: threads.append(threading.current_thread().name) or real_hash(*args))
+
+    password_hash = hash_password('secret')
+    assert verify_password(password_hash, 'secret')
+    assert not verify_password(password_hash, 'wrong')
+    assert threads and threads[0].startswith('password-hash')
+    assert multiprocessing.active_children() == []
+
+
+def test_login_rehashes_outdated_hash(hash_workers, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    user = SimpleNamespace(password=generate_password_hash('secret', 'scrypt'))
+
+    assert check_and_upgrade(user, 'secret')
+    assert user.password.startswith('pbkdf2:sha256:1000$')
+    assert not check_and_upgrade(user, 'wrong')
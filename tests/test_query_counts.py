@@ -0,0 +1,143 @@
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app.models import Appointment, Doctor, Message, Patient, Prescription, Review
+
+SMALL, LARGE = 3, 30  # conversations, appointments and reviews of the two users each route is loaded as
+
+# Most queries each page may send for the logged-in user. The identity row is loaded once and
+# lists are fetched with a fixed number of queries, so these don't depend on how much the user has.
+PATIENT_ROUTES = {
+    '/home': 3,
+    '/dashboard': 9,
+    '/my_appointments': 8,
+    '/messages': 6,
+    '/messages/{other}': 10,  # marking the chat read writes, then reloads the patient's unread total
+    '/messages/{other}/updates?after=0': 7,
+    '/user_profile': 1,
+    '/browse_doctors': 5,
+}
+DOCTOR_ROUTES = {
+    '/doctor/home': 1,
+    '/doctor_dashboard': 11,
+    '/doctor/messages': 5,
+    '/doctor/messages/{other}': 9,
+    '/doctor/messages/{other}/updates?after=0': 7,
+    '/my_profile': 1,
+    '/doctor/edit_profile': 1,
+    '/doctor/manage_slots': 1,
+}
+
+
+def _doctor(i):
+    return Doctor(NMR_ID=f'NMR{i}', username=f'doctor{i}', password='x', doctor_name=f'Doctor {i}',
+                  specialization='Cardiologist', mobile_no='9000000000', email_id=f'doctor{i}@example.com',
+                  location='Hyderabad', hospital_name='Hospital', hospital_address='Address', hospital_contact='040000000',
+                  consultation_types='Both', rating=4.0, email_verified=True, mobile_verified=True)
+
+
+def _patient(i):
+    return Patient(username=f'patient{i}', password='x', name=f'Patient {i}', mobile='9000000000',
+                   location='Hyderabad', email_verified=True, mobile_verified=True)
+
+
+def _seed_history(db, patient, doctor, i, now):
+    """An appointment, a review and an unread message each way between `patient` and `doctor`."""
+    status = ['Pending', 'Confirmed', 'Completed'][i % 3]
+    appointment = Appointment(user_id=patient.id, doctor_id=doctor.id, status=status,
+                              appointment_date=now + timedelta(days=-2 if status == 'Completed' else 2, hours=i))
+    db.session.add(appointment)
+    db.session.flush()
+    if status == 'Completed':
+        db.session.add(Prescription(appointment_id=appointment.id, doctor_id=doctor.id, patient_id=patient.id,
+                                    medication_details='Rest'))
+    db.session.add(Review(patient_id=patient.id, doctor_id=doctor.id, appointment_id=appointment.id, rating=4, text='Good'))
+    db.session.add_all([
+        Message(patient_id=patient.id, doctor_id=doctor.id, sender_type='patient', content='Hello', timestamp=now - timedelta(minutes=i)),
+        Message(patient_id=patient.id, doctor_id=doctor.id, sender_type='doctor', content='Hi', timestamp=now - timedelta(minutes=i)),
+    ])
+
+
+@pytest.fixture(scope='module')
+def users(app):
+    """{'patient': {SMALL: (id, other_id), LARGE: ...}, 'doctor': {...}}: users with SMALL or LARGE histories."""
+    from app.extension import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        now = datetime.now()
+        doctors = [_doctor(i) for i in range(2 * LARGE + 2)]
+        patients = [_patient(i) for i in range(2 * LARGE + 2)]
+        db.session.add_all(doctors + patients)
+        db.session.flush()
+        users = {'patient': {}, 'doctor': {}}
+        for size, patient, doctor, others in ((SMALL, patients[0], doctors[0], 2), (LARGE, patients[1], doctors[1], 2 + LARGE)):
+            for i in range(size):
+                _seed_history(db, patient, doctors[others + i], i, now)
+                _seed_history(db, patients[others + i], doctor, i, now)
+            users['patient'][size] = (patient.id, doctors[others].id)
+            users['doctor'][size] = (doctor.id, patients[others].id)
+        db.session.commit()
+        db.session.remove()
+    return users
+
+
+@contextmanager
+def _recorded_queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def _load(app, role, user_id, path):
+    """Requests `path` as the given user (outside any app context, like a real request) and returns its SQL."""
+    from app.extension import db
+    with app.app_context():
+        engine = db.engine
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session[f'{role}_id'] = user_id
+    with _recorded_queries(engine) as statements:
+        response = client.get(path)
+    assert response.status_code == 200, path
+    return statements
+
+
+def _identity_loads(statements, role, user_id):
+    """
+    How often the current user's row is loaded before the request first writes. A commit
+    expires it (pages that mark messages read change its unread total), so one reload after
+    that is expected.
+    """
+    table = f'{role}s'
+    pattern = re.compile(rf'FROM {table}\s+WHERE {table}\.id = \?')
+    loads = 0
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            break
+        loads += bool(pattern.search(statement)) and tuple(parameters) == (user_id,)
+    return loads
+
+
+@pytest.mark.parametrize('role,path,budget', [
+    *(('patient', path, budget) for path, budget in PATIENT_ROUTES.items()),
+    *(('doctor', path, budget) for path, budget in DOCTOR_ROUTES.items()),
+])
+def test_route_query_count(app, users, role, path, budget):
+    counts = {}
+    for size, (user_id, other_id) in users[role].items():
+        statements = _load(app, role, user_id, path.format(other=other_id))
+        assert _identity_loads(statements, role, user_id) <= 1, f"{path} loads the current {role} more than once"
+        counts[size] = len(statements)
+
+    assert counts[LARGE] == counts[SMALL], f"{path} sends more queries as the {role}'s history grows: {counts}"
+    assert counts[LARGE] <= budget, f"{path} sends {counts[LARGE]} queries (budget {budget})"
@@ -0,0 +1,130 @@
+import random
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, insert, text
+from app.models import (Appointment, ConversationUnread, Doctor, Message, Patient, Review, SearchHistory,
+                        Slot, Specialty)
+
+# Tables that grow with usage. A query that walks one of them end to end gets slower with every
+# signup, booking and message, so every query the hot routes send must reach their rows through
+# an index. Reference tables (specialties, symptoms, locations) stay small and are left out.
+HOT_TABLES = {'doctors', 'patients', 'appointments', 'slots', 'messages', 'conversation_unread',
+              'reviews', 'search_history'}
+
+SPECIALTIES = ['Cardiologist', 'Dermatologist', 'Neurologist', 'Orthopedist', 'Pediatrician']
+LOCATIONS = ['Hyderabad', 'Mumbai', 'Delhi', 'Chennai', 'Pune', 'Kolkata']
+DOCTORS, PATIENTS = 500, 2000
+
+# (session key, method, path, form data): the pages patients and doctors load most.
+HOT_ROUTES = [
+    (None, 'GET', '/browse_doctors', None),
+    (None, 'GET', '/browse_doctors?available_within=3', None),
+    (None, 'GET', '/find_doctor?disease=Cardiologist', None),
+    ('patient_id', 'POST', '/find_doctor', {'disease': 'Cardiologist', 'location': 'Hyderabad'}),
+    (None, 'POST', '/find_doctor', {'location': 'Hyderabad'}),
+    ('patient_id', 'GET', '/dashboard', None),
+    ('patient_id', 'GET', '/my_appointments', None),
+    ('patient_id', 'GET', '/my_appointments?status=Confirmed', None),
+    ('patient_id', 'GET', '/messages', None),
+    ('patient_id', 'GET', '/messages/1', None),
+    ('patient_id', 'GET', '/messages/1/updates?after=0', None),
+    ('doctor_id', 'GET', '/doctor_dashboard', None),
+    ('doctor_id', 'GET', '/doctor/messages', None),
+    ('doctor_id', 'GET', '/doctor/messages/1', None),
+]
+
+
+def _seed(db, rng):
+    """A few tens of thousands of rows, so the planner's statistics look like a live site's."""
+    now = datetime.now()
+    db.session.add_all([Specialty(name=name) for name in SPECIALTIES])
+    db.session.execute(insert(Doctor), [dict(
+        NMR_ID=f'NMR{i}', username=f'doctor{i}', password='x', doctor_name=f'Doctor {i}',
+        specialization=SPECIALTIES[i % len(SPECIALTIES)], mobile_no='9000000000', email_id=f'doctor{i}@example.com',
+        location=LOCATIONS[i % len(LOCATIONS)], hospital_name='Hospital', hospital_address='Address',
+        hospital_contact='040000000', consultation_types='Both', rating=round(rng.uniform(1, 5), 1),
+        next_available_at=now + timedelta(hours=rng.randint(-48, 240))
+    ) for i in range(1, DOCTORS + 1)])
+    db.session.execute(insert(Patient), [dict(
+        username=f'patient{i}', password='x', name=f'Patient {i}', mobile='9000000000', location=rng.choice(LOCATIONS)
+    ) for i in range(1, PATIENTS + 1)])
+    db.session.execute(insert(Appointment), [dict(
+        user_id=rng.randint(1, PATIENTS), doctor_id=rng.randint(1, DOCTORS),
+        appointment_date=now + timedelta(hours=rng.randint(-2000, 500)),
+        status=rng.choice(['Pending', 'Confirmed', 'Completed', 'Canceled'])
+    ) for _ in range(20000)])
+    db.session.execute(insert(Slot), [dict(
+        doctor_id=doctor_id, consultation_type=consultation_type, start_at=now + timedelta(hours=hour)
+    ) for doctor_id in range(1, DOCTORS + 1, 5) for consultation_type in ('online', 'in-person') for hour in range(1, 40, 4)])
+    db.session.execute(insert(Message), [dict(
+        patient_id=rng.randint(1, PATIENTS), doctor_id=rng.randint(1, DOCTORS), sender_type=rng.choice(['patient', 'doctor']),
+        content='Hello', is_read=rng.random() < 0.5, timestamp=now - timedelta(minutes=i)
+    ) for i in range(40000)])
+    db.session.execute(insert(ConversationUnread), [dict(
+        patient_id=patient_id, doctor_id=doctor_id, patient_unread=1, doctor_unread=1
+    ) for patient_id, doctor_id in {(rng.randint(1, PATIENTS), rng.randint(1, DOCTORS)) for _ in range(5000)}])
+    db.session.execute(insert(Review), [dict(
+        patient_id=rng.randint(1, PATIENTS), doctor_id=rng.randint(1, DOCTORS), rating=rng.randint(1, 5),
+        text='Good', timestamp=now - timedelta(minutes=i)
+    ) for i in range(5000)])
+    db.session.execute(insert(SearchHistory), [dict(
+        patient_id=rng.randint(1, PATIENTS), disease='fever', location=rng.choice(LOCATIONS), timestamp=now - timedelta(minutes=i)
+    ) for i in range(10000)])
+    # Messages and appointments for the conversation the routes above open (patient 1, doctor 1).
+    db.session.add(Appointment(user_id=1, doctor_id=1, appointment_date=now + timedelta(days=1), status='Confirmed'))
+    db.session.add_all([Message(patient_id=1, doctor_id=1, sender_type='patient', content='Hi', timestamp=now - timedelta(seconds=i))
+                        for i in range(60)])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def seeded(app):
+    from app.extension import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        _seed(db, random.Random(16))
+        yield db
+        db.session.remove()
+
+
+def _full_scans(connection, statement, parameters):
+    """The hot tables that `statement` reads with a full scan, from SQLite's EXPLAIN QUERY PLAN."""
+    plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    scans = (re.match(r'SCAN (?:TABLE )?(\w+)', detail) for _, _, _, detail in plan)
+    return [match.group(1) for match in scans if match and match.group(1) in HOT_TABLES]
+
+
+def _route_id(route):
+    _, method, path, data = route
+    return ' '.join([method, path, *(data or ())])
+
+
+@pytest.mark.parametrize('session_key,method,path,data', HOT_ROUTES, ids=[_route_id(route) for route in HOT_ROUTES])
+def test_hot_route_queries_use_indexes(app, seeded, session_key, method, path, data):
+    client = app.test_client()
+    if session_key:
+        with client.session_transaction() as session:
+            session[session_key] = 1
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(seeded.engine, 'before_cursor_execute', capture)
+    try:
+        response = client.open(path, method=method, data=data)
+    finally:
+        event.remove(seeded.engine, 'before_cursor_execute', capture)
+
+    assert response.status_code == 200
+    assert statements
+    with seeded.engine.connect() as connection:
+        scans = {statement: tables for statement, parameters in statements
+                 if (tables := _full_scans(connection, statement, parameters))}
+    assert not scans, f"{method} {path} scans {scans}"
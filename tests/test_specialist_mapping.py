@@ -0,0 +1,76 @@
+import pytest
+from app.models import Specialty, Symptom
+from app.services import cache, doctor_service
+from app.services.cache import LRUCache
+from app.services.doctor_service import map_disease_to_specialist
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def semantic_search(monkeypatch, db):
+    """Semantic search switched on, with find_similar_symptoms() replaced by `semantic_search.answer`."""
+    db.session.add(Symptom(name='chest pain', specialty=Specialty(name='Cardiologist')))
+    db.session.commit()
+
+    class Semantic:
+        calls = 0
+        answer = None
+
+    def find_similar_symptoms(term, top_k=1):
+        Semantic.calls += 1
+        if isinstance(Semantic.answer, Exception):
+            raise Semantic.answer
+        return Semantic.answer
+
+    monkeypatch.setattr(doctor_service, 'AI_MODELS_LOADED', True)
+    monkeypatch.setattr(doctor_service, 'SEMANTIC_DATA', {'symptoms': ['chest pain']})
+    monkeypatch.setattr(doctor_service, 'find_similar_symptoms', find_similar_symptoms)
+    monkeypatch.setattr(doctor_service, 'SPECIALIST_CACHE', LRUCache(max_size=16, ttl_seconds=3600))
+    return Semantic
+
+
+def test_keyword_fallback_after_semantic_failure_is_cached_briefly(app, clock, semantic_search):
+    semantic_search.answer = TimeoutError("embedding batch timed out")
+    assert map_disease_to_specialist('Chest Pain')['specialist'] == 'Cardiologist'  # keyword fallback
+    assert map_disease_to_specialist('chest pain')['specialist'] == 'Cardiologist'
+    assert semantic_search.calls == 1
+
+    clock.now += app.config['SPECIALIST_FALLBACK_CACHE_TTL'] + 1
+    semantic_search.answer = [{'symptom': 'chest pain', 'specialist': 'Cardiologist', 'score': 0.95}]
+    map_disease_to_specialist('chest pain')
+    assert semantic_search.calls == 2  # The model is asked again once the fallback expires
+
+    clock.now += app.config['SPECIALIST_FALLBACK_CACHE_TTL'] + 1
+    map_disease_to_specialist('chest pain')
+    assert semantic_search.calls == 2  # A semantic answer keeps the normal TTL
+
+
+def test_keyword_fallback_is_not_cached_when_fallback_ttl_is_zero(app, monkeypatch, clock, semantic_search):
+    monkeypatch.setitem(app.config, 'SPECIALIST_FALLBACK_CACHE_TTL', 0)
+    semantic_search.answer = TimeoutError("embedding batch timed out")
+    map_disease_to_specialist('chest pain')
+    map_disease_to_specialist('chest pain')
+    assert semantic_search.calls == 2
+
+
+def test_per_entry_ttl_overrides_cache_ttl(clock):
+    lru = LRUCache(max_size=4, ttl_seconds=3600)
+    lru.set('long', 1)
+    lru.set('short', 2, ttl_seconds=5)
+    clock.now += 10
+    assert lru.get('long') == 1
+    assert lru.get('short') is None